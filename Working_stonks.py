@@ -1,7 +1,7 @@
 import tkinter as tk
-from tkinter import ttk, messagebox
-import yfinance as yf
+from tkinter import ttk, messagebox, filedialog, simpledialog
 import pandas as pd
+import argparse
 import json
 import os
 from datetime import datetime, timedelta
@@ -12,6 +12,28 @@ from matplotlib.dates import DateFormatter, DayLocator
 import numpy as np
 import matplotlib.dates as mdates
 import mplfinance as mpf
+import analytics
+import auto_trader
+import backtest
+import clock
+import events
+import execution
+import export
+import history_query
+import lots
+import market_data
+import memory_profile
+import metrics
+import montecarlo
+import nav
+import order_book
+import portfolio_store
+import replay
+import risk
+from scheduler import HeapScheduler
+import signals
+import stall_watchdog
+import strategies
 
 class FakeStockTradingApp:
     def __init__(self, root):
@@ -22,17 +44,61 @@ class FakeStockTradingApp:
         # Initialize user portfolio data
         self.initial_balance = 100000.00  # Start with $100,000
         self.portfolio_file = "portfolio.json"
+        self.store = portfolio_store.PortfolioStore(self.portfolio_file, self.initial_balance)
+        
+        # Quotes, signals, fills and portfolio changes are passed around on one event bus
+        self.bus = events.EventBus()
+        
+        # Every trade (manual, auto or resting order) goes through one execution engine
+        self.risk = risk.RiskManager()
+        self.lots = lots.LotTracker()
+        self.analytics = analytics.PerformanceTracker()
+        self.history_index = history_query.TransactionIndex()
+        self.executor = execution.ExecutionEngine(None, risk=self.risk, bus=self.bus, lots=self.lots)
+        
+        # Auto trading engines, one per symbol, all driven by one scheduler
+        self.strategy = strategies.MACrossoverStrategy()
+        self.auto_traders = {}
+        self.trade_scheduler = HeapScheduler()
+        self.scheduler_running = False
+        
+        # Resting limit and stop orders
+        self.order_book = order_book.OrderBook(self.executor)
+        
+        # Historical replay, trading a scratch portfolio while it runs
+        self.replay = None
+        self.replay_trader = None
+        self.replay_subscriptions = []
+        self.live_portfolio = None
+        self.live_clock = None
+        self.live_analytics = None
+        
+        # Trading and persistence handle events as soon as they are published
+        self.bus.subscribe(events.QuoteTick, self.on_quote_tick, name="trading")
+        self.bus.subscribe(events.PortfolioChanged, lambda event: self.save_portfolio(), name="persist")
+        
+        # Performance statistics follow every fill and valuation
+        self.bus.subscribe(events.OrderFilled, lambda event: self.analytics.on_fill(event.transaction), name="analytics")
+        self.bus.subscribe(events.PortfolioChanged, lambda event: self.record_value(), name="valuation")
+        self.bus.subscribe(events.PortfolioChanged, lambda event: self.history_index.update(), name="history-index")
+        
+        # The UI drains its own small queues from a Tk timer, dropping stale updates,
+        # so a slow redraw never holds up trading
+        self.ui_events = [
+            self.bus.subscribe(events.PortfolioChanged, self.on_trades_executed, events.POLL,
+                               maxsize=1, policy=events.DROP_OLDEST, name="ui-portfolio"),
+            self.bus.subscribe(events.OrderFilled, self.on_order_filled, events.POLL,
+                               maxsize=100, policy=events.DROP_OLDEST, name="ui-notifications"),
+            self.bus.subscribe(events.QuoteTick, self.on_quote_display, events.POLL,
+                               maxsize=1, policy=events.DROP_OLDEST, name="ui-quotes"),
+        ]
+        
         self.load_portfolio()
         
         # Current stock data
         self.current_stock = None
         self.current_price = 0.0
         
-        # Auto trading variables
-        self.buy_trade_count = 0
-        self.sell_trade_count = 0
-        self.last_trade_time = datetime.now()
-        
         # Create main frames
         self.create_frames()
         
@@ -50,34 +116,68 @@ class FakeStockTradingApp:
         
         # Start periodic chart updates
         self.update_chart_periodically()  # New method to update the chart
+        
+        # Pick up trades written by the headless auto-trader
+        self.watch_portfolio_file()
+        
+        # Apply queued events to the UI
+        self.pump_events()
+        
+        # Show and log how much the app asks of the data source
+        self.update_data_status()
+        self.root.after(60000, self.log_data_calls)
 
     def load_portfolio(self):
         """Load portfolio from file or create a new one"""
-        if os.path.exists(self.portfolio_file):
-            try:
-                with open(self.portfolio_file, 'r') as f:
-                    self.portfolio = json.load(f)
-            except:
-                self.initialize_portfolio()
-        else:
-            self.initialize_portfolio()
+        self.portfolio = self.store.load()
+        self.attach_portfolio()
     
     def initialize_portfolio(self):
         """Create a new portfolio with default values"""
-        self.portfolio = {
-            "cash_balance": self.initial_balance,
-            "stocks": {},
-            "transaction_history": []
-        }
+        self.portfolio = portfolio_store.new_portfolio(self.initial_balance)
+        self.analytics = analytics.PerformanceTracker()
+        self.attach_portfolio()
         self.save_portfolio()
     
+    def attach_portfolio(self):
+        """Point the execution engine and the order book at the current portfolio"""
+        self.executor.set_portfolio(self.portfolio)
+        self.order_book.load(self.portfolio.get('open_orders', []))
+        self.analytics.rebuild(self.portfolio)
+        self.history_index.rebuild(self.portfolio['transaction_history'])
+        if hasattr(self, 'lot_method_var'):
+            self.lot_method_var.set(self.lots.method)
+    
     def save_portfolio(self):
         """Save portfolio to file"""
-        with open(self.portfolio_file, 'w') as f:
-            json.dump(self.portfolio, f, indent=4)
+        if self.replay is not None:
+            return  # The replay portfolio is never written over the real one
+        
+        self.portfolio['open_orders'] = self.order_book.to_dicts()
+        if self.store.save(self.portfolio):
+            # Trades the headless auto-trader saved meanwhile were merged in
+            self.attach_portfolio()
+    
+    def pump_events(self):
+        """Handle the events queued for the UI since the last call"""
+        for subscription in self.ui_events:
+            subscription.drain()
+        self.root.after(100, self.pump_events)
+
+    def watch_portfolio_file(self):
+        """Reload the portfolio when another process (the headless auto-trader) has written it"""
+        if self.replay is None and self.store.changed():
+            print("Portfolio file changed on disk, reloading.")
+            self.load_portfolio()
+            self.update_portfolio_display()
+        self.root.after(5000, self.watch_portfolio_file)
 
     def create_frames(self):
         """Create the main frames for the app"""
+        # Status bar with the data source calls of the last minute, packed first so it always shows
+        self.status_bar = ttk.Label(self.root, text="Data calls (last min): 0", relief=tk.SUNKEN, anchor=tk.W, padding=(5, 2))
+        self.status_bar.pack(side=tk.BOTTOM, fill=tk.X)
+        
         # Main container frame
         self.main_container = ttk.Frame(self.root)
         self.main_container.pack(fill=tk.BOTH, expand=True)
@@ -154,9 +254,17 @@ class FakeStockTradingApp:
         ttk.Checkbutton(self.top_frame, text="MACD", variable=self.show_macd, 
                        command=self.update_chart).pack(side=tk.LEFT)
         
+        # Account value over time, drawn next to the price chart
+        self.show_equity = tk.BooleanVar(value=False)
+        ttk.Checkbutton(self.top_frame, text="Equity", variable=self.show_equity, 
+                       command=self.update_chart).pack(side=tk.LEFT)
+        
         # Add reset button
         self.reset_button = ttk.Button(self.top_frame, text="Reset Account", command=self.reset_account)
         self.reset_button.pack(side=tk.LEFT, padx=10)
+        
+        # Add Monte Carlo stress test button
+        ttk.Button(self.top_frame, text="Stress Test", command=self.run_stress_test).pack(side=tk.LEFT, padx=5)
 
         # Middle frame widgets - Stock info and trading
         self.stock_info_frame = ttk.LabelFrame(self.middle_frame, text="Stock Information", padding="10")
@@ -171,6 +279,9 @@ class FakeStockTradingApp:
         self.stock_change_label = ttk.Label(self.stock_info_frame, text="Change: N/A")
         self.stock_change_label.grid(row=2, column=0, sticky=tk.W, padx=5, pady=2)
         
+        self.recommendation_label = ttk.Label(self.stock_info_frame, text="RECOMMENDATION: N/A")
+        self.recommendation_label.grid(row=3, column=0, sticky=tk.W, padx=5, pady=2)
+        
         # Trading controls
         self.trading_frame = ttk.LabelFrame(self.middle_frame, text="Trade", padding="10")
         self.trading_frame.pack(fill=tk.X, pady=5)
@@ -217,10 +328,66 @@ class FakeStockTradingApp:
         self.auto_status_label = ttk.Label(auto_trade_frame, text="Auto Trading: Disabled", foreground="gray")
         self.auto_status_label.grid(row=0, column=5, padx=5, pady=5)
         
+        ttk.Button(auto_trade_frame, text="Add Symbol", command=self.add_auto_trade_symbol).grid(row=0, column=6, padx=5, pady=5)
+        ttk.Button(auto_trade_frame, text="Remove Symbol", command=self.remove_auto_trade_symbol).grid(row=0, column=7, padx=5, pady=5)
+        
+        # Replay a local file of historical bars through the auto-trader
+        self.replay_button = ttk.Button(auto_trade_frame, text="Replay File...", command=self.toggle_replay)
+        self.replay_button.grid(row=1, column=0, padx=5, pady=5)
+        
+        ttk.Label(auto_trade_frame, text="Speed:").grid(row=1, column=1, padx=5, pady=5)
+        self.replay_speed_var = tk.StringVar(value="1000x")
+        ttk.Combobox(auto_trade_frame, textvariable=self.replay_speed_var,
+                     values=["100x", "1000x", "10000x", "Max"],
+                     width=7, state="readonly").grid(row=1, column=2, padx=5, pady=5)
+        
+        self.replay_status_label = ttk.Label(auto_trade_frame, text="Replay: Off", foreground="gray")
+        self.replay_status_label.grid(row=1, column=3, columnspan=4, sticky=tk.W, padx=5, pady=5)
+        
+        # Resting order controls (Buy and Sell place these unless the type is Market)
+        order_frame = ttk.LabelFrame(self.trading_frame, text="Order Type", padding="5")
+        order_frame.grid(row=3, column=0, columnspan=6, sticky="ew", pady=5)
+        
+        self.order_type_var = tk.StringVar(value="Market")
+        ttk.Combobox(order_frame, textvariable=self.order_type_var,
+                     values=["Market", "Limit", "Stop", "Stop-Limit"],
+                     width=10, state="readonly").grid(row=0, column=0, padx=5, pady=5)
+        
+        ttk.Label(order_frame, text="Limit Price:").grid(row=0, column=1, padx=5, pady=5)
+        self.limit_price_entry = ttk.Entry(order_frame, width=10)
+        self.limit_price_entry.grid(row=0, column=2, padx=5, pady=5)
+        
+        ttk.Label(order_frame, text="Stop Price:").grid(row=0, column=3, padx=5, pady=5)
+        self.stop_price_entry = ttk.Entry(order_frame, width=10)
+        self.stop_price_entry.grid(row=0, column=4, padx=5, pady=5)
+        
+        self.open_orders_label = ttk.Label(order_frame, text="Open Orders: 0")
+        self.open_orders_label.grid(row=0, column=5, padx=5, pady=5)
+        
+        ttk.Button(order_frame, text="Cancel Orders", command=self.cancel_orders).grid(row=0, column=6, padx=5, pady=5)
+        
+        # Which tax lots sells take shares from
+        ttk.Label(order_frame, text="Lots:").grid(row=0, column=7, padx=5, pady=5)
+        self.lot_method_var = tk.StringVar(value=self.lots.method)
+        lot_combo = ttk.Combobox(order_frame, textvariable=self.lot_method_var,
+                                 values=list(lots.METHODS), width=9, state="readonly")
+        lot_combo.grid(row=0, column=8, padx=5, pady=5)
+        lot_combo.bind("<<ComboboxSelected>>", self.change_lot_method)
+        
+        # Performance analytics, kept up to date as trades and quotes arrive
+        analytics_frame = ttk.LabelFrame(self.middle_frame, text="Performance", padding="10")
+        analytics_frame.pack(fill=tk.X, pady=5)
+        self.analytics_label = ttk.Label(analytics_frame, font=("Courier", 9), justify=tk.LEFT,
+                                         text=analytics.format_summary(self.analytics.summary()))
+        self.analytics_label.pack(anchor=tk.W)
+        
         # Create candlestick chart
         self.setup_chart()
         
         # Portfolio display with scrollbar
+        self.pnl_label = ttk.Label(self.portfolio_frame, text="Realized P&L: $0.00   Unrealized P&L: $0.00")
+        self.pnl_label.pack(anchor=tk.W)
+        
         portfolio_container = ttk.Frame(self.portfolio_frame)
         portfolio_container.pack(fill=tk.BOTH, expand=True)
 
@@ -248,6 +415,35 @@ class FakeStockTradingApp:
         self.portfolio_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
 
         # Transaction history display with scrollbar
+        # History filters, answered from the transaction index
+        history_filter = ttk.Frame(self.history_frame)
+        history_filter.pack(fill=tk.X)
+        
+        ttk.Label(history_filter, text="Symbol:").pack(side=tk.LEFT)
+        self.history_symbol_entry = ttk.Entry(history_filter, width=7)
+        self.history_symbol_entry.pack(side=tk.LEFT, padx=2)
+        
+        ttk.Label(history_filter, text="Type:").pack(side=tk.LEFT)
+        self.history_type_var = tk.StringVar(value="All")
+        self.history_type_combo = ttk.Combobox(history_filter, textvariable=self.history_type_var,
+                                               values=["All"], width=10, state="readonly")
+        self.history_type_combo.pack(side=tk.LEFT, padx=2)
+        
+        ttk.Label(history_filter, text="From:").pack(side=tk.LEFT)
+        self.history_from_entry = ttk.Entry(history_filter, width=10)
+        self.history_from_entry.pack(side=tk.LEFT, padx=2)
+        
+        ttk.Label(history_filter, text="To:").pack(side=tk.LEFT)
+        self.history_to_entry = ttk.Entry(history_filter, width=10)
+        self.history_to_entry.pack(side=tk.LEFT, padx=2)
+        
+        ttk.Button(history_filter, text="Filter", command=self.update_history_display).pack(side=tk.LEFT, padx=2)
+        ttk.Button(history_filter, text="Clear", command=self.clear_history_filter).pack(side=tk.LEFT, padx=2)
+        ttk.Button(history_filter, text="Export...", command=self.export_history).pack(side=tk.LEFT, padx=2)
+        
+        self.history_summary_label = ttk.Label(self.history_frame, text="")
+        self.history_summary_label.pack(anchor=tk.W)
+        
         history_container = ttk.Frame(self.history_frame)
         history_container.pack(fill=tk.BOTH, expand=True)
 
@@ -302,209 +498,127 @@ class FakeStockTradingApp:
                     return
                     
                 # Enable auto trading
-                self.auto_status_label.config(text="Auto Trading: Enabled", foreground="green")
                 messagebox.showinfo("Auto Trading", "Auto trading has been enabled. The system will automatically execute trades based on technical indicators.")
                 
-                # Start monitoring for signals
-                self.check_for_trading_signals()
+                # Start monitoring the current stock for signals
+                if self.current_stock:
+                    self.add_auto_trade_symbol()
+                self.update_auto_status()
+                self.run_trade_scheduler()
                 
             except ValueError:
                 messagebox.showerror("Error", "Please enter valid numbers for auto quantity and max investment")
                 self.auto_trade_var.set(False)
         else:
-            # Disable auto trading
-            self.auto_status_label.config(text="Auto Trading: Disabled", foreground="gray")
+            # Disable auto trading for every symbol
+            self.trade_scheduler.clear()
+            self.auto_traders.clear()
+            self.update_auto_status()
             messagebox.showinfo("Auto Trading", "Auto trading has been disabled.")
 
-    def check_for_trading_signals(self):
-        """Check for trading signals and execute trades if auto trading is enabled"""
-        if not self.auto_trade_var.get():
-            return
-        
-        # Only proceed if we have a current stock
-        if self.current_stock:
-            # Get the latest recommendation
-            if hasattr(self, 'recommendation_label'):
-                recommendation = self.recommendation_label.cget('text')
-                
-                # Execute trade based on recommendation
-                if "BUY" in recommendation:
-                    self.execute_auto_trade("BUY")
-                elif "SELL" in recommendation:
-                    self.execute_auto_trade("SELL")
-        
-        # Schedule next check based on selected frequency
-        frequency_mapping = {
-            "1m": 60000,  # 1 minute
-            "5m": 300000,  # 5 minutes
-            "10m": 600000,  # 10 minutes
-            "15m": 900000,  # 15 minutes
-            "30m": 1800000,  # 30 minutes
-            "1h": 3600000,  # 1 hour
-        }
-        
-        frequency = frequency_mapping.get(self.frequency_var.get(), 300000)  # Default to 5 minutes
-        self.root.after(frequency, self.check_for_trading_signals)
-
-    def execute_auto_trade(self, trade_type):
-        """Execute an automatic trade based on signals"""
+    def add_auto_trade_symbol(self):
+        """Auto trade the current stock with the quantity, limit and frequency entered now"""
         if not self.current_stock:
+            messagebox.showerror("Error", "No stock selected.")
             return
         
-        # Check if 24 hours have passed since the last trade
-        if (datetime.now() - self.last_trade_time).total_seconds() >= 86400:
-            self.buy_trade_count = 0
-            self.sell_trade_count = 0
-        
         try:
             auto_quantity = int(self.auto_quantity_entry.get())
             max_investment = float(self.max_investment_entry.get())
-            
-            # Calculate potential cost
-            potential_cost = auto_quantity * self.current_price
-            
-            if trade_type == "BUY":
-                # Check if we have enough cash and if the investment is within limits
-                if potential_cost > self.portfolio['cash_balance']:
-                    print(f"Auto Trade: Not enough cash for {auto_quantity} shares of {self.current_stock}")
-                    return
-                    
-                if potential_cost > max_investment:
-                    print(f"Auto Trade: Cost exceeds max investment limit (${potential_cost:.2f} > ${max_investment:.2f})")
-                    return
-                
-                # Check if buy limit is reached
-                if self.buy_trade_count >= 10:
-                    print("Auto Trade: Buy limit reached for the day.")
-                    return
-                
-                # Execute buy
-                self.execute_auto_buy(auto_quantity)
-                self.buy_trade_count += 1
-                
-            elif trade_type == "SELL":
-                # Check if we own the stock
-                if self.current_stock not in self.portfolio['stocks']:
-                    print(f"Auto Trade: You don't own any shares of {self.current_stock}")
-                    return
-                    
-                # Get owned shares
-                owned_shares = self.portfolio['stocks'][self.current_stock]['shares']
-                
-                # Adjust quantity if needed
-                sell_quantity = min(auto_quantity, owned_shares)
-                
-                if sell_quantity <= 0:
-                    return
-                
-                # Check if sell limit is reached
-                if self.sell_trade_count >= 10:
-                    print("Auto Trade: Sell limit reached for the day.")
-                    return
-                
-                # Execute sell
-                self.execute_auto_sell(sell_quantity)
-                self.sell_trade_count += 1
-                
-            # Update last trade time
-            self.last_trade_time = datetime.now()
-            
         except ValueError:
-            print("Auto Trade: Invalid quantity or max investment values")
-
-    def execute_auto_buy(self, quantity):
-        """Execute an automatic buy trade"""
-        total_cost = quantity * self.current_price
+            messagebox.showerror("Error", "Please enter valid numbers for auto quantity and max investment")
+            return
         
-        # Update portfolio
-        if self.current_stock in self.portfolio['stocks']:
-            # Update existing position
-            current_shares = self.portfolio['stocks'][self.current_stock]['shares']
-            current_avg_price = self.portfolio['stocks'][self.current_stock]['avg_price']
-            
-            # Calculate new average price
-            new_shares = current_shares + quantity
-            new_avg_price = ((current_shares * current_avg_price) + total_cost) / new_shares
-            
-            self.portfolio['stocks'][self.current_stock]['shares'] = new_shares
-            self.portfolio['stocks'][self.current_stock]['avg_price'] = new_avg_price
-        else:
-            # Add new position
-            self.portfolio['stocks'][self.current_stock] = {
-                'shares': quantity,
-                'avg_price': self.current_price
-            }
-        
-        # Deduct cash
-        self.portfolio['cash_balance'] -= total_cost
-        
-        # Add transaction to history
-        transaction = {
-            'date': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            'type': 'AUTO BUY',
-            'symbol': self.current_stock,
-            'shares': quantity,
-            'price': self.current_price,
-            'total': total_cost,
-            'commission': 0.0
-        }
-        self.portfolio['transaction_history'].append(transaction)
-        
-        # Save portfolio
-        self.save_portfolio()
+        if auto_quantity <= 0 or max_investment <= 0:
+            messagebox.showerror("Error", "Auto quantity and max investment must be positive")
+            return
         
-        # Update displays
-        self.update_portfolio_display()
-        self.balance_label.config(text=f"Cash Balance: ${self.portfolio['cash_balance']:.2f}")
+        symbol = self.current_stock
+        trader = self.auto_traders.get(symbol)
+        if trader is None:
+            trader = auto_trader.AutoTrader(self.executor, symbol, strategy=self.strategy)
+            self.auto_traders[symbol] = trader
         
-        # Log the auto trade
-        print(f"Auto Trade: Bought {quantity} shares of {self.current_stock} for ${total_cost:.2f}")
+        # Updating an existing symbol keeps its daily trade counts
+        trader.auto_quantity = auto_quantity
+        trader.max_investment = max_investment
         
-        # Show notification
-        self.show_auto_trade_notification("BUY", quantity, total_cost)
-
-    def execute_auto_sell(self, quantity):
-        """Execute an automatic sell trade"""
-        total_value = quantity * self.current_price
+        frequency = auto_trader.FREQUENCY_SECONDS.get(self.frequency_var.get(), 300)  # Default to 5 minutes
+        self.trade_scheduler.schedule(symbol, frequency, lambda: self.check_for_trading_signals(symbol))
         
-        # Update portfolio
-        if quantity == self.portfolio['stocks'][self.current_stock]['shares']:
-            # Remove the stock if selling all shares
-            del self.portfolio['stocks'][self.current_stock]
+        if not self.auto_trade_var.get():
+            self.auto_trade_var.set(True)
+            self.run_trade_scheduler()
+        self.update_auto_status()
+
+    def remove_auto_trade_symbol(self):
+        """Stop auto trading the current stock"""
+        if self.current_stock in self.auto_traders:
+            del self.auto_traders[self.current_stock]
+            self.trade_scheduler.cancel(self.current_stock)
+        self.update_auto_status()
+
+    def update_auto_status(self):
+        """Show how many symbols are being auto traded"""
+        if self.auto_trade_var.get():
+            self.auto_status_label.config(text=f"Auto Trading: Enabled ({len(self.auto_traders)} symbols)", foreground="green")
         else:
-            # Update shares count
-            self.portfolio['stocks'][self.current_stock]['shares'] -= quantity
-        
-        # Add cash
-        self.portfolio['cash_balance'] += total_value
-        
-        # Add transaction to history
-        transaction = {
-            'date': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            'type': 'AUTO SELL',
-            'symbol': self.current_stock,
-            'shares': quantity,
-            'price': self.current_price,
-            'total': total_value,
-            'commission': 0.0
-        }
-        self.portfolio['transaction_history'].append(transaction)
-        
-        # Save portfolio
-        self.save_portfolio()
+            self.auto_status_label.config(text="Auto Trading: Disabled", foreground="gray")
+
+    def run_trade_scheduler(self):
+        """Run due auto-trading checks for all symbols from a single Tk timer"""
+        if not self.auto_trade_var.get():
+            self.scheduler_running = False
+            return
         
-        # Update displays
-        self.update_portfolio_display()
-        self.balance_label.config(text=f"Cash Balance: ${self.portfolio['cash_balance']:.2f}")
+        if self.scheduler_running:
+            return
+        self.scheduler_running = True
+        self.pump_trade_scheduler()
+
+    def pump_trade_scheduler(self):
+        """Run the checks that are due and wake up again for the next one"""
+        if not self.auto_trade_var.get():
+            self.scheduler_running = False
+            return
         
-        # Log the auto trade
-        print(f"Auto Trade: Sold {quantity} shares of {self.current_stock} for ${total_value:.2f}")
+        # Live checks pause while a replay is trading the scratch portfolio
+        if self.replay is None:
+            self.trade_scheduler.run_pending()
+        delay = self.trade_scheduler.next_delay()
+        delay_ms = 1000 if delay is None else int(min(delay, 1.0) * 1000)
+        self.root.after(max(delay_ms, 10), self.pump_trade_scheduler)
+
+    def check_for_trading_signals(self, symbol):
+        """Check one auto-traded symbol for trading signals and execute trades"""
+        if not self.auto_trade_var.get():
+            return
+        
+        trader = self.auto_traders.get(symbol)
+        if trader is None:
+            return
         
-        # Show notification
-        self.show_auto_trade_notification("SELL", quantity, total_value)
+        # Reuse the displayed price for the current stock, others are fetched
+        price = self.current_price if symbol == self.current_stock else None
+        trader.check_for_trading_signals(price=price)
 
-    def show_auto_trade_notification(self, trade_type, quantity, amount):
+    def on_trades_executed(self, event):
+        """Refresh the displays once after a batch of trades"""
+        self.update_portfolio_display()
+        self.balance_label.config(text=f"Cash Balance: ${self.portfolio['cash_balance']:.2f}")
+
+    def on_order_filled(self, event):
+        """Notify the user after the auto-trader made a trade"""
+        transaction = event.transaction
+        if not transaction['type'].startswith("AUTO"):
+            return
+        trade_type = "BUY" if transaction['type'] == "AUTO BUY" else "SELL"
+        self.show_auto_trade_notification(trade_type, transaction['shares'], transaction['total'], transaction['symbol'])
+
+    def show_auto_trade_notification(self, trade_type, quantity, amount, symbol=None):
         """Show a notification for an auto trade"""
+        symbol = symbol or self.current_stock
+        
         # Create a popup that automatically closes after a few seconds
         notification = tk.Toplevel(self.root)
         notification.title("Auto Trade Executed")
@@ -513,19 +627,137 @@ class FakeStockTradingApp:
         
         # Add notification content
         if trade_type == "BUY":
-            message = f"Auto Trading Bot purchased {quantity} shares of {self.current_stock} for ${amount:.2f}"
+            message = f"Auto Trading Bot purchased {quantity} shares of {symbol} for ${amount:.2f}"
             color = "green"
         else:
-            message = f"Auto Trading Bot sold {quantity} shares of {self.current_stock} for ${amount:.2f}"
+            message = f"Auto Trading Bot sold {quantity} shares of {symbol} for ${amount:.2f}"
             color = "red"
         
         ttk.Label(notification, text="Auto Trade Executed", font=("Helvetica", 12, "bold")).pack(pady=10)
         ttk.Label(notification, text=message, foreground=color).pack(pady=10)
-        ttk.Label(notification, text=datetime.now().strftime("%Y-%m-%d %H:%M:%S")).pack(pady=5)
+        ttk.Label(notification, text=clock.now().strftime("%Y-%m-%d %H:%M:%S")).pack(pady=5)
         
         # Auto close after 5 seconds
         notification.after(5000, notification.destroy)
 
+    def toggle_replay(self):
+        """Start a replay from a file, or stop the one that is running"""
+        if self.replay is None:
+            self.start_replay()
+        else:
+            self.stop_replay()
+
+    def start_replay(self):
+        """Replay historical bars from a CSV file through the auto-trader on a scratch portfolio"""
+        try:
+            auto_quantity = int(self.auto_quantity_entry.get())
+            max_investment = float(self.max_investment_entry.get())
+        except ValueError:
+            messagebox.showerror("Error", "Please enter valid numbers for auto quantity and max investment")
+            return
+        
+        path = filedialog.askopenfilename(title="Replay historical bars",
+                                          filetypes=[("CSV files", "*.csv"), ("All files", "*.*")])
+        if not path:
+            return
+        
+        try:
+            bars = backtest.load_csv(path)
+        except Exception as e:
+            messagebox.showerror("Error", f"Could not read {path}: {e}")
+            return
+        
+        symbol = self.symbol_entry.get().strip().upper() or "REPLAY"
+        speed = None if self.replay_speed_var.get() == "Max" else float(self.replay_speed_var.get().rstrip("x"))
+        
+        # Keep the real portfolio (and its resting orders) aside until the replay stops
+        self.save_portfolio()
+        self.live_portfolio = self.portfolio
+        self.portfolio = portfolio_store.new_portfolio(self.initial_balance)
+        self.live_analytics = self.analytics
+        self.analytics = analytics.PerformanceTracker()
+        
+        # Trades are dated, and daily limits counted, in the replayed market time
+        market_clock = clock.SteppedClock(backtest.bar_seconds(bars.index, len(bars))[0])
+        self.live_clock = clock.set_clock(market_clock)
+        self.attach_portfolio()
+        
+        self.replay = replay.Replay(self.bus, symbol, bars, speed=speed, market_clock=market_clock)
+        self.replay_trader = auto_trader.AutoTrader(self.executor, symbol, auto_quantity=auto_quantity,
+                                                    max_investment=max_investment, strategy=self.strategy)
+        self.replay_subscriptions = [
+            self.bus.subscribe(events.BarClosed, self.replay_trader.on_bar, name="replay-trader"),
+            self.bus.subscribe(events.BarClosed, self.on_replay_bar, events.POLL,
+                               maxsize=1, policy=events.DROP_OLDEST, name="ui-replay-chart"),
+        ]
+        self.ui_events.append(self.replay_subscriptions[-1])
+        
+        self.current_stock = symbol
+        self.stock_name_label.config(text=f"Stock: {symbol} (replay)")
+        self.replay_button.config(text="Stop Replay")
+        self.update_portfolio_display()
+        self.pump_replay()
+
+    def pump_replay(self):
+        """Publish the bars that are due, in chunks small enough to keep the window responsive"""
+        if self.replay is None:
+            return
+        
+        self.replay.step(max_ticks=500)
+        self.replay_status_label.config(
+            text=f"Replay: {self.replay.position:,}/{len(self.replay.times):,} bars, "
+                 f"{self.replay.ticks_per_second():,.0f} ticks/s",
+            foreground="green" if not self.replay.done else "black")
+        if self.replay.done:
+            print(f"Replay finished: {self.replay.position:,} bars at {self.replay.ticks_per_second():,.0f} ticks/s")
+            return
+        
+        delay_ms = int(min(self.replay.next_delay(), 0.1) * 1000)
+        self.root.after(max(delay_ms, 1), self.pump_replay)
+
+    def on_replay_bar(self, event):
+        """Show the latest replayed bar in the price labels and the chart"""
+        if self.replay is None:
+            return
+        
+        self.current_price = event.close
+        self.stock_price_label.config(text=f"Current Price: ${event.close:.2f} ({event.bar_time})")
+        
+        end = self.replay.position
+        ohlc_data = self.replay.bars.iloc[max(0, end - 90):end][['Open', 'High', 'Low', 'Close']]
+        equity = None
+        if self.show_equity.get():
+            start = max(0, end - 90)
+            closes = self.replay.columns[3][start:end]
+            equity = nav.equity_curve(self.portfolio['transaction_history'], self.portfolio['cash_balance'],
+                                      closes[None, :], self.replay.bars.index[start:end], [event.symbol])
+        self.draw_chart(ohlc_data, f"{event.symbol} - {event.close:.2f} (replay)", equity)
+        self.update_portfolio_display()
+
+    def stop_replay(self):
+        """Stop the replay and go back to the real portfolio"""
+        for subscription in self.replay_subscriptions:
+            self.bus.unsubscribe(subscription)
+            if subscription in self.ui_events:
+                self.ui_events.remove(subscription)
+        self.replay_subscriptions = []
+        
+        ticks_per_second = self.replay.ticks_per_second()
+        self.replay = None
+        self.replay_trader = None
+        clock.set_clock(self.live_clock)
+        self.live_clock = None
+        self.portfolio = self.live_portfolio
+        self.live_portfolio = None
+        self.analytics = self.live_analytics
+        self.live_analytics = None
+        self.attach_portfolio()
+        
+        self.replay_button.config(text="Replay File...")
+        self.replay_status_label.config(text=f"Replay: Off (last run {ticks_per_second:,.0f} ticks/s)", foreground="gray")
+        self.update_portfolio_display()
+        self.update_open_orders_label()
+
     def search_stock(self):
         """Search for the stock and update the stock information"""
         stock_symbol = self.symbol_entry.get().strip().upper()
@@ -535,13 +767,13 @@ class FakeStockTradingApp:
             return
         
         try:
-            stock = yf.Ticker(stock_symbol)
+            self.current_price = market_data.get_price(stock_symbol)
             self.current_stock = stock_symbol
-            self.current_price = stock.info['regularMarketPrice']
             
             # Update stock information labels
             self.stock_name_label.config(text=f"Stock: {self.current_stock}")
             self.stock_price_label.config(text=f"Current Price: ${self.current_price:.2f}")
+            self.process_quote(self.current_stock, self.current_price)
             
             # Update the chart with the latest data
             self.update_chart()
@@ -576,8 +808,7 @@ class FakeStockTradingApp:
         
         try:
             # Get historical data based on selected period
-            stock = yf.Ticker(self.current_stock)
-            hist_data = stock.history(period="90d")
+            hist_data = market_data.get_history(self.current_stock, period="90d")
             
             if hist_data.empty:
                 print("No historical data available.")
@@ -585,117 +816,172 @@ class FakeStockTradingApp:
                 return
             
             # Update current price and change information
-            current_price = stock.info['regularMarketPrice']
+            current_price = market_data.get_price(self.current_stock)
             self.current_price = current_price
             self.stock_price_label.config(text=f"Current Price: ${current_price:.2f}")
+            self.process_quote(self.current_stock, current_price)
+            self.recommendation_label.config(text=self.generate_trading_recommendation(hist_data))
+            
+            equity = None
+            if self.show_equity.get():
+                equity = nav.portfolio_equity(self.portfolio, period="90d")
+            self.draw_chart(hist_data, f"{self.current_stock} - {self.current_price:.2f}", equity)
+            print("Chart updated successfully.")
+            
+        except Exception as e:
+            print(f"Error updating chart: {e}")
+            # Create error display
+            for widget in self.chart_frame.winfo_children():
+                widget.destroy()
+            
+            self.fig = Figure(figsize=(10, 5))
+            self.ax = self.fig.add_subplot(111)
+            self.ax.set_title(f"{self.current_stock} - Error Updating Chart")
             
+            self.canvas = FigureCanvasTkAgg(self.fig, master=self.chart_frame)
+            self.canvas.draw()
+            self.canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+
+    def draw_chart(self, bars, title, equity=None):
+        """Draw a candlestick chart of the bars in the chart frame, with the equity curve beside it if given"""
+        with metrics.span("render", view="chart"):
             # Prepare data for candlestick chart
-            ohlc_data = hist_data[['Open', 'High', 'Low', 'Close']].copy()
+            ohlc_data = bars[['Open', 'High', 'Low', 'Close']].copy()
             ohlc_data.index = pd.to_datetime(ohlc_data.index)
-            
+        
             # Clear any existing widgets in the chart frame
             for widget in self.chart_frame.winfo_children():
                 widget.destroy()
-            
+        
             # Create a new figure
             self.fig = Figure(figsize=(10, 5), dpi=100)
-            self.ax = self.fig.add_subplot(111)
-            
+            self.ax = self.fig.add_subplot(121 if equity is not None else 111)
+        
             # Plot candlestick chart using mplfinance
             mpf.plot(ohlc_data, type='candle', style='charles',
                     ylabel='Price ($)',
                     datetime_format='%Y-%m-%d',
                     ax=self.ax,
                     volume=False)
-            self.ax.set_title(f"{self.current_stock} - {self.current_price:.2f}")
-            
+            self.ax.set_title(title)
+        
+            if equity is not None:
+                equity_ax = self.fig.add_subplot(122)
+                equity_ax.plot(pd.to_datetime(equity.times), equity.nav, color="tab:blue")
+                equity_ax.set_title("Account Value")
+                equity_ax.set_ylabel("Value ($)")
+                equity_ax.grid(True)
+                equity_ax.xaxis.set_major_formatter(DateFormatter('%m-%d'))
+                self.fig.autofmt_xdate()
+        
             # Create and pack the canvas
             self.canvas = FigureCanvasTkAgg(self.fig, master=self.chart_frame)
             self.canvas.draw()
             self.canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
-            
-            print("Chart updated successfully.")
-            
-        except Exception as e:
-            print(f"Error updating chart: {e}")
-            # Create error display
-            for widget in self.chart_frame.winfo_children():
-                widget.destroy()
-            
-            self.fig = Figure(figsize=(10, 5))
-            self.ax = self.fig.add_subplot(111)
-            self.ax.set_title(f"{self.current_stock} - Error Updating Chart")
-            
-            self.canvas = FigureCanvasTkAgg(self.fig, master=self.chart_frame)
-            self.canvas.draw()
-            self.canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
 
     def reset_account(self):
         """Reset the portfolio to its initial state"""
-        self.portfolio = {
-            "cash_balance": self.initial_balance,  # Reset to initial balance
-            "stocks": {},
-            "transaction_history": []
-        }
-        self.save_portfolio()
+        self.initialize_portfolio()  # Reset to initial balance
         self.update_portfolio_display()
         messagebox.showinfo("Account Reset", "Your account has been reset to the initial state.")
 
+    def run_stress_test(self):
+        """Simulate the portfolio over the next 10 trading days and show the risk figures"""
+        horizon = 10
+        try:
+            result = montecarlo.simulate_portfolio(self.portfolio, paths=100000, horizon=horizon)
+        except ValueError as e:
+            # Too little price history to estimate the returns from
+            messagebox.showwarning("Stress Test", f"Not enough price history to run the simulation.\n\n{e}")
+            return
+        except Exception as e:
+            messagebox.showerror("Error", f"Could not run the simulation: {e}")
+            return
+        
+        messagebox.showinfo("Stress Test", montecarlo.format_result(result, horizon))
+
+    def place_order(self, side):
+        """Place a resting limit, stop or stop-limit order for the current stock"""
+        order_types = {"Limit": order_book.LIMIT, "Stop": order_book.STOP, "Stop-Limit": order_book.STOP_LIMIT}
+        order_type = order_types[self.order_type_var.get()]
+        
+        try:
+            quantity = int(self.quantity_entry.get())
+            limit_price = float(self.limit_price_entry.get()) if order_type != order_book.STOP else None
+            stop_price = float(self.stop_price_entry.get()) if order_type != order_book.LIMIT else None
+            order = self.order_book.place(self.current_stock, side, order_type, quantity, limit_price, stop_price)
+        except ValueError as e:
+            messagebox.showerror("Error", f"Could not place order: {e}")
+            return
+        
+        self.save_portfolio()
+        self.update_open_orders_label()
+        messagebox.showinfo("Order Placed", f"Order {order.id}: {self.order_type_var.get()} {side} {quantity} shares of {self.current_stock}")
+        
+        # The order may already be crossed by the current price
+        self.process_quote(self.current_stock, self.current_price)
+
+    def cancel_orders(self):
+        """Cancel all open orders for the current stock"""
+        for order in self.order_book.open_orders(self.current_stock):
+            self.order_book.cancel(order.id)
+        self.save_portfolio()
+        self.update_open_orders_label()
+
+    def update_open_orders_label(self):
+        """Show how many orders are resting for the current stock and in total"""
+        total = len(self.order_book.orders)
+        current = len(self.order_book.open_orders(self.current_stock)) if self.current_stock else 0
+        self.open_orders_label.config(text=f"Open Orders: {current} ({total} total)")
+
+    def process_quote(self, symbol, price):
+        """Publish a new quote to the event bus"""
+        if not price or self.replay is not None:
+            return
+        
+        self.bus.publish(events.QuoteTick(symbol, price, clock.timestamp()))
+
+    def on_quote_tick(self, event):
+        """Revalue exposure and fill resting orders crossed by a quote"""
+        self.risk.on_price(event.symbol, event.price)
+        self.lots.on_price(event.symbol, event.price)
+        self.record_value()
+        self.order_book.on_quote(event.symbol, event.price)
+
+    def record_value(self):
+        """Feed the current account value (cash plus lots at their last prices) to the analytics"""
+        self.analytics.on_value(self.portfolio['cash_balance'] + self.lots.value_total, clock.timestamp())
+
+    def on_quote_display(self, event):
+        """Refresh the widgets that change with every quote"""
+        self.update_open_orders_label()
+        self.update_analytics_panel()
+
+    def update_analytics_panel(self):
+        """Show the latest performance statistics"""
+        self.analytics_label.config(text=analytics.format_summary(self.analytics.summary()))
+
     def buy_stock(self):
         """Execute a buy order for the current stock"""
         if not self.current_stock:
             messagebox.showerror("Error", "No stock selected.")
             return
         
+        if self.order_type_var.get() != "Market":
+            self.place_order("BUY")
+            return
+        
         try:
             quantity = int(self.quantity_entry.get())
             total_cost = quantity * self.current_price
             
-            # Check if user has enough cash
-            if total_cost > self.portfolio['cash_balance']:
-                messagebox.showerror("Error", "Not enough cash for this purchase")
+            # Validate, update the portfolio, save and refresh in one step
+            order = execution.OrderRequest(self.current_stock, "BUY", quantity, self.current_price, "BUY")
+            result = self.executor.execute([order])
+            if result.rejected:
+                messagebox.showerror("Error", result.rejected[0][1])
                 return
             
-            # Update portfolio
-            if self.current_stock in self.portfolio['stocks']:
-                # Update existing position
-                current_shares = self.portfolio['stocks'][self.current_stock]['shares']
-                current_avg_price = self.portfolio['stocks'][self.current_stock]['avg_price']
-                
-                # Calculate new average price
-                new_shares = current_shares + quantity
-                new_avg_price = ((current_shares * current_avg_price) + total_cost) / new_shares
-                
-                self.portfolio['stocks'][self.current_stock]['shares'] = new_shares
-                self.portfolio['stocks'][self.current_stock]['avg_price'] = new_avg_price
-            else:
-                # Add new position
-                self.portfolio['stocks'][self.current_stock] = {
-                    'shares': quantity,
-                    'avg_price': self.current_price
-                }
-            
-            # Deduct cash
-            self.portfolio['cash_balance'] -= total_cost
-            
-            # Add transaction to history
-            transaction = {
-                'date': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                'type': 'BUY',
-                'symbol': self.current_stock,
-                'shares': quantity,
-                'price': self.current_price,
-                'total': total_cost
-            }
-            self.portfolio['transaction_history'].append(transaction)
-            
-            # Save portfolio
-            self.save_portfolio()
-            
-            # Update displays
-            self.update_portfolio_display()
-            self.balance_label.config(text=f"Cash Balance: ${self.portfolio['cash_balance']:.2f}")
-            
             # Log the trade
             print(f"Bought {quantity} shares of {self.current_stock} for ${total_cost:.2f}")
             
@@ -711,106 +997,160 @@ class FakeStockTradingApp:
             messagebox.showerror("Error", "No stock selected.")
             return
         
+        if self.order_type_var.get() != "Market":
+            self.place_order("SELL")
+            return
+        
         try:
             quantity = int(self.quantity_entry.get())
-            
-            # Check if the stock is in the portfolio
-            if self.current_stock not in self.portfolio['stocks']:
-                messagebox.showerror("Error", "You do not own any shares of this stock.")
-                return
-            
-            current_shares = self.portfolio['stocks'][self.current_stock]['shares']
-            
-            # Check if user has enough shares to sell
-            if quantity > current_shares:
-                messagebox.showerror("Error", "Not enough shares to sell.")
-                return
-            
             total_value = quantity * self.current_price
             
-            # Update portfolio
-            if quantity == current_shares:
-                # Remove the stock if selling all shares
-                del self.portfolio['stocks'][self.current_stock]
-            else:
-                # Update shares count
-                self.portfolio['stocks'][self.current_stock]['shares'] -= quantity
-            
-            # Add cash
-            self.portfolio['cash_balance'] += total_value
-            
-            # Add transaction to history
-            transaction = {
-                'date': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                'type': 'SELL',
-                'symbol': self.current_stock,
-                'shares': quantity,
-                'price': self.current_price,
-                'total': total_value
-            }
-            self.portfolio['transaction_history'].append(transaction)
-            
-            # Save portfolio
-            self.save_portfolio()
+            # With specific-lot selling, ask which lots to sell first
+            lot_ids = None
+            if self.lots.method == lots.SPECIFIC:
+                lot_ids = self.choose_lots(self.current_stock)
+                if lot_ids is None:
+                    return
             
-            # Update displays
-            self.update_portfolio_display()
-            self.balance_label.config(text=f"Cash Balance: ${self.portfolio['cash_balance']:.2f}")
+            # Validate, update the portfolio, save and refresh in one step
+            order = execution.OrderRequest(self.current_stock, "SELL", quantity, self.current_price, "SELL",
+                                           lot_ids=lot_ids)
+            result = self.executor.execute([order])
+            if result.rejected:
+                messagebox.showerror("Error", result.rejected[0][1])
+                return
+            realized = result.transactions[0].get('realized_pnl', 0.0)
             
             # Log the trade
-            print(f"Sold {quantity} shares of {self.current_stock} for ${total_value:.2f}")
+            print(f"Sold {quantity} shares of {self.current_stock} for ${total_value:.2f} (realized ${realized:.2f})")
             
             # Show notification
-            messagebox.showinfo("Success", f"Sold {quantity} shares of {self.current_stock} for ${total_value:.2f}")
+            messagebox.showinfo("Success", f"Sold {quantity} shares of {self.current_stock} for ${total_value:.2f}\n"
+                                           f"Realized P&L: ${realized:.2f}")
             
         except ValueError:
             messagebox.showerror("Error", "Please enter a valid quantity.")
 
     
 
+    def change_lot_method(self, event):
+        """Use the selected lot method for future sells (past sells keep the method they used)"""
+        self.lots.method = self.lot_method_var.get()
+        self.portfolio['lot_method'] = self.lots.method
+        self.save_portfolio()
+
+    def choose_lots(self, symbol):
+        """Ask which lots of a symbol to sell from, returns a list of lot ids or None if cancelled"""
+        open_lots = self.lots.open_lots(symbol)
+        if not open_lots:
+            return []
+        
+        choices = "\n".join(f"#{lot.id}: {lot.shares} @ ${lot.price:.2f} ({lot.date})" for lot in open_lots)
+        answer = simpledialog.askstring("Choose Lots", f"Open lots of {symbol}:\n{choices}\n\n"
+                                                       "Lot numbers to sell from, in order (the rest come from the oldest):")
+        if answer is None:
+            return None
+        try:
+            return [int(part.strip().lstrip("#")) for part in answer.split(",") if part.strip()]
+        except ValueError:
+            messagebox.showerror("Error", "Please enter lot numbers separated by commas.")
+            return None
+
     def update_portfolio_display(self):
         """Update the portfolio display with current data"""
-        # Update cash balance label
-        self.balance_label.config(text=f"Cash Balance: ${self.portfolio['cash_balance']:.2f}")
-        
-        # Clear the portfolio tree
-        for item in self.portfolio_tree.get_children():
-            self.portfolio_tree.delete(item)
-        
-        # Populate the portfolio tree with current stocks
-        for symbol, data in self.portfolio['stocks'].items():
-            shares = data['shares']
-            avg_price = data['avg_price']
-            current_price = self.get_current_price(symbol)  # You may need to implement this method
-            value = shares * current_price
-            gain_loss = value - (shares * avg_price)
+        with metrics.span("render", view="portfolio"):
+            # Update cash balance label
+            self.balance_label.config(text=f"Cash Balance: ${self.portfolio['cash_balance']:.2f}")
+            self.pnl_label.config(text=f"Realized P&L: ${self.lots.realized_total:.2f}   "
+                                       f"Unrealized P&L: ${self.lots.unrealized():.2f}")
+            self.update_analytics_panel()
+        
+            # Clear the portfolio tree
+            for item in self.portfolio_tree.get_children():
+                self.portfolio_tree.delete(item)
+        
+            # Populate the portfolio tree with current stocks
+            for symbol, data in self.portfolio['stocks'].items():
+                shares = data['shares']
+                avg_price = data['avg_price']
+                current_price = self.get_current_price(symbol)  # You may need to implement this method
+                value = shares * current_price
+                gain_loss = value - (shares * avg_price)
             
-            self.portfolio_tree.insert("", "end", values=(symbol, shares, f"${avg_price:.2f}", f"${current_price:.2f}", f"${value:.2f}", f"${gain_loss:.2f}"))
+                self.portfolio_tree.insert("", "end", values=(symbol, shares, f"${avg_price:.2f}", f"${current_price:.2f}", f"${value:.2f}", f"${gain_loss:.2f}"))
         
-        # Clear the transaction history tree
-        for item in self.history_tree.get_children():
-            self.history_tree.delete(item)
+            self.update_history_display()
+
+    def filtered_history(self):
+        """Transactions matching the history panel's filters"""
+        symbol = self.history_symbol_entry.get().strip().upper() or None
+        trade_type = self.history_type_var.get()
+        trade_type = None if trade_type == "All" else trade_type
+        start = self.history_from_entry.get().strip() or None
+        end = self.history_to_entry.get().strip() or None
+        return self.history_index.query(symbol, trade_type, start, end, inclusive_end=True)
+
+    def update_history_display(self):
+        """Show the transactions matching the history filters, with their totals"""
+        with metrics.span("render", view="history"):
+            transactions = self.filtered_history()
+            self.history_type_combo.config(values=["All"] + self.history_index.types())
+        
+            # Clear the transaction history tree
+            for item in self.history_tree.get_children():
+                self.history_tree.delete(item)
+        
+            # Populate the transaction history tree
+            for transaction in transactions:
+                self.history_tree.insert("", "end", values=(transaction['date'], transaction['type'], transaction['symbol'], transaction['shares'], f"${transaction['price']:.2f}", f"${transaction['total']:.2f}", f"${transaction.get('commission') or 0.0:.2f}"))
+        
+            totals = history_query.aggregate(transactions, by=())
+            total = totals.get((), {"count": 0, "volume": 0.0, "commission": 0.0})
+            self.history_summary_label.config(text=f"{total['count']} trades, volume ${total['volume']:,.2f}, "
+                                                   f"commission ${total['commission']:,.2f}")
+
+    def export_history(self):
+        """Save the transactions matching the history filters to a CSV or Parquet file"""
+        path = filedialog.asksaveasfilename(title="Export transactions", defaultextension=".csv",
+                                            filetypes=[("CSV files", "*.csv"), ("Parquet files", "*.parquet")])
+        if not path:
+            return
         
-        # Populate the transaction history tree
-        for transaction in self.portfolio['transaction_history']:
-            self.history_tree.insert("", "end", values=(transaction['date'], transaction['type'], transaction['symbol'], transaction['shares'], f"${transaction['price']:.2f}", f"${transaction['total']:.2f}"))
+        try:
+            count = export.export_transactions(self.filtered_history(), path)
+        except (OSError, RuntimeError) as e:
+            messagebox.showerror("Error", f"Could not export: {e}")
+            return
+        messagebox.showinfo("Export", f"Exported {count} transactions to {path}")
+
+    def clear_history_filter(self):
+        """Show the whole history again"""
+        for entry in (self.history_symbol_entry, self.history_from_entry, self.history_to_entry):
+            entry.delete(0, tk.END)
+        self.history_type_var.set("All")
+        self.update_history_display()
 
     def get_current_price(self, symbol):
         """Get the current price of the stock"""
+        if self.replay is not None and symbol == self.replay.symbol:
+            return self.replay.price or 0.0
+        
         try:
-            stock = yf.Ticker(symbol)
-            return stock.info['regularMarketPrice']
+            return market_data.get_price(symbol)
         except Exception as e:
             print(f"Error fetching current price for {symbol}: {e}")
             return 0.0
 
     def update_stock_prices(self):
         """Update the current prices of stocks in the portfolio"""
-        for symbol in self.portfolio['stocks']:
+        # Quote held symbols and symbols with resting orders (prices come from the file during a replay)
+        symbols = set() if self.replay is not None else set(self.portfolio['stocks']) | self.order_book.symbols()
+        for symbol in symbols:
             try:
-                stock = yf.Ticker(symbol)
-                current_price = stock.info['regularMarketPrice']
-                self.portfolio['stocks'][symbol]['current_price'] = current_price
+                current_price = market_data.get_price(symbol)
+                if symbol in self.portfolio['stocks']:
+                    self.portfolio['stocks'][symbol]['current_price'] = current_price
+                self.process_quote(symbol, current_price)
             except Exception as e:
                 print(f"Error fetching price for {symbol}: {e}")
         
@@ -823,40 +1163,96 @@ class FakeStockTradingApp:
     def generate_trading_recommendation(self, data):
         """Generate a simple trading recommendation based on technical indicators"""
         try:
-            # Calculate simple moving averages
-            data['MA20'] = data['Close'].rolling(window=20).mean()
-            data['MA50'] = data['Close'].rolling(window=50).mean()
-            
-            # Get the latest values
-            current_close = data['Close'].iloc[-1]
-            ma20 = data['MA20'].iloc[-1]
-            ma50 = data['MA50'].iloc[-1]
-            
-            # Simple crossover strategy
-            if ma20 > ma50 and data['MA20'].iloc[-2] <= data['MA50'].iloc[-2]:
-                return "RECOMMENDATION: BUY (MA20 crossed above MA50)"
-            elif ma20 < ma50 and data['MA20'].iloc[-2] >= data['MA50'].iloc[-2]:
-                return "RECOMMENDATION: SELL (MA20 crossed below MA50)"
-            elif current_close > ma20 and ma20 > ma50:
-                return "RECOMMENDATION: HOLD/BUY (Bullish trend)"
-            elif current_close < ma20 and ma20 < ma50:
-                return "RECOMMENDATION: HOLD/SELL (Bearish trend)"
-            else:
-                return "RECOMMENDATION: HOLD (Neutral trend)"
-        except:
+            return signals.describe_signal(self.strategy.latest(data))
+        except Exception:
             return "RECOMMENDATION: Insufficient data for analysis"
 
     def update_chart_periodically(self):
         """Update the chart with the latest stock data every minute."""
         print("Checking if chart needs to be updated...")
-        if self.current_stock:
+        if self.replay is not None:
+            print("Replay running, live chart paused.")
+        elif self.current_stock:
             self.update_chart()  # Call the existing update_chart method
         else:
             print("No current stock to update chart for.")
         self.root.after(60000, self.update_chart_periodically)  # Schedule next update in 60 seconds
 
+    def update_data_status(self):
+        """Show the last minute of data source calls in the status bar"""
+        self.status_bar.config(text=market_data.format_window(market_data.get_accounting().last_window()))
+        self.root.after(5000, self.update_data_status)
+
+    def log_data_calls(self):
+        """Print the last minute of data source calls every minute"""
+        market_data.log_window()
+        self.root.after(60000, self.log_data_calls)
+
+    def profile_memory_periodically(self, profiler, interval_ms=60000):
+        """Take a memory snapshot and warn about anything that keeps growing"""
+        warnings = profiler.sample()
+        print(memory_profile.format_sample(profiler.samples[-1]))
+        if warnings:
+            print(memory_profile.format_warnings(warnings))
+        self.root.after(interval_ms, self.profile_memory_periodically, profiler, interval_ms)
+
+    def write_metrics_periodically(self, path, interval_ms=15000):
+        """Write the timing metrics to a Prometheus text file every few seconds"""
+        try:
+            metrics.get_metrics().write(path)
+        except OSError as e:
+            print(f"Could not write metrics to {path}: {e}")
+        self.root.after(interval_ms, self.write_metrics_periodically, path, interval_ms)
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake stock trading app")
+    parser.add_argument("--metrics-file", help="Write timing metrics in Prometheus text format to this file")
+    parser.add_argument("--metrics-port", type=int, help="Serve timing metrics at http://127.0.0.1:PORT/metrics")
+    parser.add_argument("--watchdog", action="store_true", help="Report what blocks the UI when the app closes")
+    parser.add_argument("--stall-ms", type=int, default=200, help="How long the UI may freeze before it counts as a stall")
+    parser.add_argument("--watchdog-report", help="Also save the stall report to this JSON file")
+    parser.add_argument("--memory-profile", action="store_true",
+                        help="Track memory, figures and widgets and warn about anything that keeps growing")
+    parser.add_argument("--memory-interval", type=int, default=60, help="Seconds between memory snapshots")
+    parser.add_argument("--memory-report", help="Also save the memory report to this JSON file")
+    args = parser.parse_args()
+    
+    # The watchdog has to wrap Tk callbacks before any widget registers one
+    watchdog = None
+    if args.watchdog:
+        watchdog = stall_watchdog.StallWatchdog(threshold=args.stall_ms / 1000)
+        watchdog.install()
+    
     # Create main window
     root = tk.Tk()
     app = FakeStockTradingApp(root)
+    if args.metrics_port:
+        metrics.get_metrics().serve(args.metrics_port)
+    if args.metrics_file:
+        app.write_metrics_periodically(args.metrics_file)
+    if watchdog is not None:
+        watchdog.start(root)
+    profiler = None
+    if args.memory_profile:
+        profiler = memory_profile.MemoryProfiler(root=root)
+        profiler.track("transactions", lambda: len(app.portfolio['transaction_history']), threshold=1000)
+        profiler.start()
+        root.after(args.memory_interval * 1000, app.profile_memory_periodically, profiler, args.memory_interval * 1000)
+        
+        def close_window():
+            # The last snapshot needs the widgets, so take it before the window is destroyed
+            profiler.sample()
+            print(memory_profile.format_report(profiler.report()))
+            if args.memory_report:
+                profiler.save(args.memory_report)
+            root.destroy()
+        root.protocol("WM_DELETE_WINDOW", close_window)
     root.mainloop()
+    
+    if watchdog is not None:
+        watchdog.stop()
+        report = watchdog.report()
+        print(stall_watchdog.format_report(report))
+        if args.watchdog_report:
+            with open(args.watchdog_report, 'w') as f:
+                json.dump(report, f, indent=4)
@@ -0,0 +1,163 @@
+import math
+
+
+class RunningStats:
+    """Mean and variance of a stream of numbers with Welford's method, plus downside deviation"""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.downside_sq = 0.0   # Sum of squared returns below the target
+
+    def add(self, value, target=0.0):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        if value < target:
+            self.downside_sq += (value - target) ** 2
+
+    @property
+    def variance(self):
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def std(self):
+        return math.sqrt(self.variance)
+
+    @property
+    def downside_std(self):
+        return math.sqrt(self.downside_sq / self.count) if self.count else 0.0
+
+
+class PerformanceTracker:
+    """Return, risk and trading statistics updated one valuation or fill at a time.
+
+    Valuations are sampled into periods (daily by default) and each closed
+    period's return goes into running statistics, so nothing is rescanned when
+    the numbers are shown. Drawdown is tracked on every valuation.
+    """
+
+    def __init__(self, period_seconds=86400, periods_per_year=252, risk_free_rate=0.0):
+        self.period_seconds = period_seconds
+        self.periods_per_year = periods_per_year
+        self.risk_free_rate = risk_free_rate
+        self._reset()
+
+    def _reset(self):
+        self.initial_value = None
+        self.value = None
+        self.peak = None
+        self.max_drawdown = 0.0
+        self.returns = RunningStats()
+        self.values = RunningStats()     # For the average account value in turnover
+        self._period = None
+        self._period_start_value = None
+        self._reset_trades()
+
+    def _reset_trades(self):
+        self.trades = 0
+        self.closed_trades = 0
+        self.wins = 0
+        self.traded_value = 0.0
+
+    def on_value(self, value, when):
+        """Record the account value at a point in time (seconds)"""
+        if self.initial_value is None:
+            self.initial_value = value
+        period = int(when // self.period_seconds)
+        if self._period is None:
+            self._period = period
+            self._period_start_value = value
+        elif period != self._period:
+            # The last value seen closes the previous period
+            if self._period_start_value:
+                self.returns.add(self.value / self._period_start_value - 1, self.risk_free_rate / self.periods_per_year)
+            self.values.add(self.value)
+            self._period = period
+            self._period_start_value = self.value
+
+        self.value = value
+        if self.peak is None or value > self.peak:
+            self.peak = value
+        if self.peak:
+            self.max_drawdown = min(self.max_drawdown, value / self.peak - 1)
+
+    def on_fill(self, transaction):
+        """Count a trade for turnover and, once it realizes P&L, for the win rate"""
+        self.trades += 1
+        self.traded_value += transaction['total']
+        if 'realized_pnl' in transaction:
+            self.closed_trades += 1
+            if transaction['realized_pnl'] > 0:
+                self.wins += 1
+
+    def rebuild(self, portfolio):
+        """Recount the trade statistics from a portfolio's history, e.g. after it was reloaded or merged.
+
+        Valuations, drawdown and period returns are kept, use a new tracker
+        for an unrelated portfolio.
+        """
+        self._reset_trades()
+        cash_change = 0.0
+        for transaction in portfolio['transaction_history']:
+            self.on_fill(transaction)
+            cash_change += transaction['total'] if transaction['type'].endswith("SELL") else -transaction['total']
+        if portfolio['transaction_history']:
+            self.initial_value = portfolio['cash_balance'] - cash_change
+
+    def cumulative_return(self):
+        if not self.initial_value or self.value is None:
+            return 0.0
+        return self.value / self.initial_value - 1
+
+    def volatility(self):
+        """Annualized standard deviation of period returns"""
+        return self.returns.std * math.sqrt(self.periods_per_year)
+
+    def sharpe(self):
+        excess = self.returns.mean - self.risk_free_rate / self.periods_per_year
+        if self.returns.std == 0:
+            return 0.0
+        return excess / self.returns.std * math.sqrt(self.periods_per_year)
+
+    def sortino(self):
+        excess = self.returns.mean - self.risk_free_rate / self.periods_per_year
+        if self.returns.downside_std == 0:
+            return 0.0
+        return excess / self.returns.downside_std * math.sqrt(self.periods_per_year)
+
+    def win_rate(self):
+        return self.wins / self.closed_trades if self.closed_trades else 0.0
+
+    def turnover(self):
+        """Value traded divided by the average account value"""
+        average = self.values.mean if self.values.count else self.value
+        return self.traded_value / average if average else 0.0
+
+    def summary(self):
+        return {
+            "cumulative_return": self.cumulative_return(),
+            "volatility": self.volatility(),
+            "sharpe": self.sharpe(),
+            "sortino": self.sortino(),
+            "max_drawdown": self.max_drawdown,
+            "win_rate": self.win_rate(),
+            "turnover": self.turnover(),
+            "periods": self.returns.count,
+            "trades": self.trades,
+        }
+
+
+def format_summary(summary):
+    """Summary as lines of text for the GUI and the command line"""
+    return "\n".join([
+        f"Return:        {summary['cumulative_return']:.2%}",
+        f"Volatility:    {summary['volatility']:.2%}",
+        f"Sharpe:        {summary['sharpe']:.2f}",
+        f"Sortino:       {summary['sortino']:.2f}",
+        f"Max Drawdown:  {summary['max_drawdown']:.2%}",
+        f"Win Rate:      {summary['win_rate']:.0%}",
+        f"Turnover:      {summary['turnover']:.2f}x",
+    ])
@@ -0,0 +1,296 @@
+import argparse
+import json
+from collections import deque
+import events
+import execution
+import lots
+import market_data
+import memory_profile
+import metrics
+import portfolio_store
+import risk
+from scheduler import HeapScheduler
+import signals
+import strategies
+
+# How often to check for signals, in seconds
+FREQUENCY_SECONDS = {
+    "1m": 60,
+    "5m": 300,
+    "10m": 600,
+    "15m": 900,
+    "30m": 1800,
+    "1h": 3600,
+}
+
+# How often the daemon rewrites its metrics file, in seconds
+METRICS_INTERVAL = 15
+
+# Top level config keys. Every key except portfolio_file can also be set per
+# symbol under "symbols", e.g. {"symbols": {"AAPL": {"frequency": "1m"}, "MSFT": {}}}
+DEFAULT_CONFIG = {
+    "portfolio_file": portfolio_store.DEFAULT_FILE,
+    "symbol": "AAPL",
+    "auto_quantity": 10,
+    "max_investment": 10000.0,
+    "max_daily_buys": 10,
+    "max_daily_sells": 10,
+    "frequency": "5m",
+    "strategy": "ma_crossover",
+    "strategy_params": {},
+    "history_period": "90d",
+    "risk": {},  # Portfolio-level limits, see risk.RiskLimits
+}
+
+
+class AutoTrader:
+    """Auto-trading rules without any Tk dependency, shared by the GUI and the daemon"""
+
+    def __init__(self, executor, symbol=None, auto_quantity=10, max_investment=10000.0,
+                 strategy=None, on_trade=None, history_period="90d",
+                 max_daily_buys=10, max_daily_sells=10):
+        self.executor = executor      # ExecutionEngine that applies and persists the trades
+        if executor.risk is None:
+            executor.risk = risk.RiskManager()
+            executor.risk.rebuild(executor.portfolio)
+        self.symbol = symbol
+        self.auto_quantity = auto_quantity
+        self.max_investment = max_investment
+        self.strategy = strategy or strategies.MACrossoverStrategy()
+        self.history_period = history_period
+        self.on_trade = on_trade      # Called with the transaction dict after every trade
+
+        # Daily trade caps, counted over a rolling 24 hours by the risk manager
+        self.max_daily_buys = max_daily_buys
+        self.max_daily_sells = max_daily_sells
+        self.last_signal = None  # Last signal acted on, so one bar is not traded twice
+        self.closes = None       # Recent closes when bars are pushed in with on_bar
+
+    @property
+    def portfolio(self):
+        return self.executor.portfolio
+
+    @property
+    def risk(self):
+        return self.executor.risk
+
+    def check_for_trading_signals(self, price=None):
+        """Evaluate the strategy on the latest bars and trade on BUY or SELL signals"""
+        if not self.symbol:
+            return None
+
+        try:
+            data = market_data.get_history(self.symbol, period=self.history_period)
+            signal = self.strategy.latest(data)
+            if signal.action != signals.HOLD and price is None:
+                price = market_data.get_price(self.symbol)
+        except Exception as e:
+            print(f"Auto Trade: Could not evaluate signals for {self.symbol}: {e}")
+            return None
+
+        if signal.action != signals.HOLD:
+            if self.executor.bus is not None:
+                self.executor.bus.publish(events.SignalEvent(self.symbol, signal))
+            return self.execute_auto_trade(signal, price)
+        return None
+
+    def on_bar(self, event):
+        """Evaluate the strategy when a BarClosed event arrives (used by historical replay)"""
+        if event.symbol != self.symbol:
+            return None
+
+        if self.closes is None or self.closes.maxlen != self.strategy.lookback:
+            self.closes = deque(self.closes or (), maxlen=self.strategy.lookback)
+        self.closes.append(event.close)
+
+        signal = self.strategy.latest_closes(self.closes, event.bar_time)
+        if signal.action == signals.HOLD:
+            return None
+        if self.executor.bus is not None:
+            self.executor.bus.publish(events.SignalEvent(self.symbol, signal))
+        return self.execute_auto_trade(signal, event.close)
+
+    def execute_auto_trade(self, signal, price):
+        """Execute an automatic trade based on a signal, returning the transaction if one was made"""
+        # A crossover stays on the last bar until a new bar arrives, only act on it once
+        signal_key = (self.symbol, signal.action, signal.bar_time)
+        if signal_key == self.last_signal:
+            return None
+
+        potential_cost = self.auto_quantity * price
+        self.risk.on_price(self.symbol, price)
+
+        if signal.action == signals.BUY:
+            # Check if we have enough cash
+            if potential_cost > self.portfolio['cash_balance']:
+                print(f"Auto Trade: Not enough cash for {self.auto_quantity} shares of {self.symbol}")
+                return None
+
+            # The engine checks our investment limit and daily cap on top of the portfolio-level limits
+            order = execution.OrderRequest(self.symbol, "BUY", self.auto_quantity, price, "AUTO BUY", 0.0,
+                                           max_order_value=self.max_investment, max_trades=self.max_daily_buys)
+
+        elif signal.action == signals.SELL:
+            # Check if we own the stock
+            if self.symbol not in self.portfolio['stocks']:
+                print(f"Auto Trade: You don't own any shares of {self.symbol}")
+                return None
+
+            sell_quantity = min(self.auto_quantity, self.portfolio['stocks'][self.symbol]['shares'])
+            if sell_quantity <= 0:
+                return None
+
+            order = execution.OrderRequest(self.symbol, "SELL", sell_quantity, price, "AUTO SELL", 0.0,
+                                           max_trades=self.max_daily_sells)
+
+        else:
+            return None
+
+        result = self.executor.execute([order])
+        if result.rejected:
+            print(f"Auto Trade: {result.rejected[0][1]}")
+            return None
+        transaction = result.transactions[0]
+
+        if order.side == "BUY":
+            print(f"Auto Trade: Bought {order.quantity} shares of {self.symbol} for ${transaction['total']:.2f}")
+        else:
+            print(f"Auto Trade: Sold {order.quantity} shares of {self.symbol} for ${transaction['total']:.2f}")
+
+        self.last_signal = signal_key
+
+        if self.on_trade:
+            self.on_trade(transaction)
+        return transaction
+
+
+def load_config(path):
+    """Read a JSON config file on top of the defaults"""
+    config = dict(DEFAULT_CONFIG)
+    if path:
+        with open(path, 'r') as f:
+            config.update(json.load(f))
+
+    # Validate every symbol's settings up front
+    symbol_settings(config)
+    return config
+
+
+def symbol_settings(config):
+    """Merge the top level settings into each symbol's own settings"""
+    symbols = config.get("symbols") or [config["symbol"]]
+    if isinstance(symbols, list):
+        symbols = {symbol: {} for symbol in symbols}
+
+    settings = {}
+    for symbol, overrides in symbols.items():
+        merged = {key: value for key, value in config.items() if key not in ("symbols", "portfolio_file", "risk")}
+        merged.update(overrides or {})
+        merged["symbol"] = symbol.upper()
+
+        if merged['frequency'] not in FREQUENCY_SECONDS:
+            raise ValueError(f"Unknown frequency {merged['frequency']} for {symbol}, "
+                             f"use one of {', '.join(FREQUENCY_SECONDS)}")
+        if int(merged['auto_quantity']) <= 0 or float(merged['max_investment']) <= 0:
+            raise ValueError(f"Auto quantity and max investment must be positive for {symbol}")
+        settings[merged["symbol"]] = merged
+    return settings
+
+
+def create_trader(executor, settings):
+    """Create an AutoTrader for one symbol's merged settings"""
+    return AutoTrader(
+        executor,
+        symbol=settings['symbol'],
+        auto_quantity=int(settings['auto_quantity']),
+        max_investment=float(settings['max_investment']),
+        strategy=strategies.get_strategy(settings['strategy'], **settings['strategy_params']),
+        history_period=settings['history_period'],
+        max_daily_buys=int(settings['max_daily_buys']),
+        max_daily_sells=int(settings['max_daily_sells']),
+    )
+
+
+def run_daemon(config, once=False, metrics_file=None, memory_interval=None):
+    """Run one auto-trader per symbol on a shared scheduler until interrupted"""
+    store = portfolio_store.PortfolioStore(config['portfolio_file'])
+    limits = risk.RiskLimits(**config['risk'])
+    bus = events.EventBus()
+    executor = execution.ExecutionEngine(store.load(), risk=risk.RiskManager(limits), bus=bus,
+                                         lots=lots.LotTracker())
+
+    def persist(event):
+        # Persist every batch of fills before the next trade is considered
+        if store.save(executor.portfolio):
+            # Trades made in the GUI meanwhile were merged in, rebuild the risk totals and lots
+            executor.set_portfolio(executor.portfolio)
+
+    bus.subscribe(events.PortfolioChanged, persist, name="persist")
+    scheduler = HeapScheduler()
+
+    def reload_if_changed():
+        # Pick up trades made in the GUI since our last write
+        if store.changed():
+            executor.set_portfolio(store.load())
+
+    def make_job(trader):
+        def tick():
+            reload_if_changed()
+            trader.check_for_trading_signals()
+        return tick
+
+    for symbol, settings in symbol_settings(config).items():
+        trader = create_trader(executor, settings)
+        scheduler.schedule(symbol, FREQUENCY_SECONDS[settings['frequency']], make_job(trader))
+        print(f"Auto trading {symbol} every {settings['frequency']} with {trader.strategy.name}")
+
+    if metrics_file:
+        scheduler.schedule("metrics", METRICS_INTERVAL, lambda: metrics.get_metrics().write(metrics_file))
+    scheduler.schedule("data-calls", 60, market_data.log_window, first_delay=60)
+
+    profiler = None
+    if memory_interval:
+        profiler = memory_profile.MemoryProfiler()
+        profiler.track("transactions", lambda: len(executor.portfolio['transaction_history']), threshold=1000)
+        profiler.start()
+
+        def profile_memory():
+            warnings = profiler.sample()
+            print(memory_profile.format_sample(profiler.samples[-1]))
+            if warnings:
+                print(memory_profile.format_warnings(warnings))
+        scheduler.schedule("memory", memory_interval, profile_memory, first_delay=memory_interval)
+
+    if once:
+        scheduler.run_pending()
+        return
+
+    try:
+        scheduler.run()
+    except KeyboardInterrupt:
+        print("Auto trading stopped. Data source calls by call site:")
+        print(market_data.format_report(market_data.get_accounting().report("site")))
+        if profiler is not None:
+            print(memory_profile.format_report(profiler.report()))
+    finally:
+        bus.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the auto-trader without the GUI")
+    parser.add_argument("--config", help="JSON config file (see DEFAULT_CONFIG for the keys)")
+    parser.add_argument("--once", action="store_true", help="Check for signals once and exit")
+    parser.add_argument("--metrics-file", help="Write timing metrics in Prometheus text format to this file")
+    parser.add_argument("--metrics-port", type=int, help="Serve timing metrics at http://127.0.0.1:PORT/metrics")
+    parser.add_argument("--memory-profile", type=int, metavar="SECONDS",
+                        help="Take a memory snapshot every SECONDS and warn about anything that keeps growing")
+    args = parser.parse_args()
+
+    if args.metrics_port:
+        metrics.get_metrics().serve(args.metrics_port)
+    run_daemon(load_config(args.config), once=args.once, metrics_file=args.metrics_file,
+               memory_interval=args.memory_profile)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+import argparse
+import time
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+import signals
+import strategies
+
+# Outcome of a backtest run. The per-bar arrays line up with the input closes.
+BacktestResult = namedtuple("BacktestResult", [
+    "equity",        # account value after each bar
+    "cash",          # cash balance after each bar
+    "positions",     # shares held after each bar
+    "trades",        # dict of arrays: index, side (+1 buy / -1 sell), shares, price
+    "total_return",  # final equity / initial cash - 1
+    "max_drawdown",  # worst peak-to-trough drop of the equity curve (negative)
+    "trade_count",
+])
+
+
+def bar_seconds(times, count):
+    """Convert bar timestamps into seconds since the epoch as floats (daily spacing when no times are given).
+
+    Timestamps without a timezone are read as local time, like clock.now()
+    and the dates in the transaction history.
+    """
+    if times is None:
+        return np.arange(count, dtype=float) * 86400.0
+    if isinstance(times, np.ndarray) and times.dtype.kind == "f":
+        return times  # Already in seconds
+    times = pd.DatetimeIndex(times)
+    if times.tz is not None:
+        return times.tz_convert("UTC").tz_localize(None).values.astype("datetime64[ns]").astype(np.int64) / 1e9
+
+    wall = times.values.astype("datetime64[ns]").astype(np.int64) / 1e9
+    valid = ~np.asarray(times.isna())
+    if not valid.any():
+        return wall
+
+    # The UTC offset is looked up once per distinct day rather than once per bar
+    days, day_of_bar = np.unique(wall[valid] // 86400, return_inverse=True)
+    noons = days * 86400 + 43200
+    offsets = np.array([time.mktime(time.gmtime(noon)[:8] + (-1,)) - noon for noon in noons])
+    wall[valid] += offsets[day_of_bar.ravel()]
+    return wall
+
+
+def run_backtest(closes, times=None, short_window=20, long_window=50, auto_quantity=10,
+                 max_investment=10000.0, max_daily_buys=10, max_daily_sells=10,
+                 initial_cash=100000.0, strategy=None):
+    """Replay the auto-trading rules over a series of closing prices.
+
+    Uses the MA crossover strategy with the given windows unless another
+    strategy is passed in.
+    """
+    closes = np.asarray(closes, dtype=float)
+    seconds = bar_seconds(times, len(closes))
+    if strategy is None:
+        strategy = strategies.MACrossoverStrategy(short_window, long_window)
+
+    # Indicators and signals for every bar at once
+    codes = strategy.run({'Close': closes}).codes
+
+    # Rules that do not depend on the account state are applied to the whole array
+    cost = auto_quantity * closes
+    buy_ok = (codes == signals.BUY_CODE) & (cost <= max_investment)
+    sell_ok = codes == signals.SELL_CODE
+    events = np.flatnonzero(buy_ok | sell_ok)
+
+    # Cash, holdings and the daily caps depend on earlier fills, so they are
+    # resolved on the (sparse) signal bars only, never on every bar
+    cash = initial_cash
+    shares = 0
+    buy_count = 0
+    sell_count = 0
+    last_trade_time = seconds[0] if len(seconds) else 0.0
+    fill_index = []
+    fill_shares = []
+
+    for i in events.tolist():
+        # Same reset rule as the app: counters clear 24h after the last trade
+        if seconds[i] - last_trade_time >= 86400:
+            buy_count = 0
+            sell_count = 0
+
+        price = closes[i]
+        if buy_ok[i]:
+            if cost[i] > cash or buy_count >= max_daily_buys:
+                continue
+            quantity = auto_quantity
+            buy_count += 1
+        else:
+            quantity = min(auto_quantity, shares)
+            if quantity <= 0 or sell_count >= max_daily_sells:
+                continue
+            quantity = -quantity
+            sell_count += 1
+
+        shares += quantity
+        cash -= quantity * price
+        last_trade_time = seconds[i]
+        fill_index.append(i)
+        fill_shares.append(quantity)
+
+    fill_index = np.asarray(fill_index, dtype=np.int64)
+    fill_shares = np.asarray(fill_shares, dtype=float)
+    fill_prices = closes[fill_index]
+
+    # Spread the fills back over the bars with cumulative sums
+    share_delta = np.zeros(len(closes))
+    share_delta[fill_index] = fill_shares
+    positions = np.cumsum(share_delta)
+    cash_curve = initial_cash - np.cumsum(share_delta * closes)
+    equity = cash_curve + positions * closes
+
+    if len(equity):
+        total_return = equity[-1] / initial_cash - 1
+        peaks = np.maximum.accumulate(equity)
+        max_drawdown = float(np.min(equity / peaks - 1))
+    else:
+        total_return = 0.0
+        max_drawdown = 0.0
+
+    trades = {
+        "index": fill_index,
+        "side": np.sign(fill_shares).astype(np.int8),
+        "shares": np.abs(fill_shares),
+        "price": fill_prices,
+    }
+    return BacktestResult(equity, cash_curve, positions, trades, float(total_return),
+                          max_drawdown, len(fill_index))
+
+
+def load_csv(path):
+    """Load bars from a CSV file with a date column and a Close column"""
+    data = pd.read_csv(path, index_col=0, parse_dates=True)
+    return data.sort_index()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backtest the auto-trading rules")
+    parser.add_argument("symbol", nargs="?", help="Stock symbol to download bars for")
+    parser.add_argument("--csv", help="Read bars from a local CSV file instead")
+    parser.add_argument("--period", default="10y")
+    parser.add_argument("--interval", default="1d")
+    parser.add_argument("--strategy", default="ma_crossover", choices=sorted(strategies.STRATEGIES))
+    parser.add_argument("--short", type=int, default=20)
+    parser.add_argument("--long", type=int, default=50)
+    parser.add_argument("--quantity", type=int, default=10)
+    parser.add_argument("--max-investment", type=float, default=10000.0)
+    parser.add_argument("--cash", type=float, default=100000.0)
+    args = parser.parse_args()
+
+    if args.csv:
+        data = load_csv(args.csv)
+    elif args.symbol:
+        import market_data
+        data = market_data.get_history(args.symbol.upper(), period=args.period, interval=args.interval)
+    else:
+        parser.error("Give a symbol or --csv")
+
+    if args.strategy == "ma_crossover":
+        strategy = strategies.MACrossoverStrategy(args.short, args.long)
+    else:
+        strategy = strategies.get_strategy(args.strategy)
+
+    start = time.perf_counter()
+    result = run_backtest(data['Close'].to_numpy(), data.index, auto_quantity=args.quantity,
+                          max_investment=args.max_investment, initial_cash=args.cash,
+                          strategy=strategy)
+    elapsed = time.perf_counter() - start
+
+    print(f"Bars:          {len(data)}")
+    print(f"Trades:        {result.trade_count}")
+    print(f"Final equity:  ${result.equity[-1]:.2f}")
+    print(f"Total return:  {result.total_return * 100:.2f}%")
+    print(f"Max drawdown:  {result.max_drawdown * 100:.2f}%")
+    print(f"Backtest time: {elapsed:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
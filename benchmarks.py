@@ -0,0 +1,226 @@
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import tempfile
+import time
+from datetime import datetime
+import clock
+import events
+import execution
+import lots
+import market_data
+import portfolio_store
+import risk
+import strategies
+
+DEFAULT_SIZES = (10, 1000, 100000)
+DEFAULT_GUI_SIZES = (10, 1000)
+DEFAULT_OUTPUT = "benchmark_results.json"
+
+# A benchmark is a regression when its median is this much slower than the previous run's
+DEFAULT_THRESHOLD = 0.20
+
+# Fixed start time and data seed so every run works on the same portfolios and bars
+START_TIME = datetime(2024, 1, 2, 9, 30)
+SEED = 1
+
+
+def synthetic_portfolio(size, seed=SEED):
+    """Portfolio with size positions, each opened by one buy, so size transactions in all"""
+    rng = random.Random(seed)
+    stepped = clock.SteppedClock(START_TIME.timestamp())
+    portfolio = portfolio_store.new_portfolio(10000000.0)
+    with clock.use(stepped):
+        for i in range(size):
+            symbol = f"S{i:06d}"
+            price = round(rng.uniform(10, 500), 2)
+            portfolio_store.record_buy(portfolio, symbol, rng.randint(1, 100), price)
+            portfolio['stocks'][symbol]['current_price'] = price
+            stepped.advance(60)
+    portfolio['cash_balance'] = 10000000.0
+    return portfolio
+
+
+def timed(func, repeat):
+    """Run func repeat times and return its timings in milliseconds"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append((time.perf_counter() - start) * 1000)
+    return {"runs": repeat, "min_ms": min(times), "median_ms": statistics.median(times)}
+
+
+def bench_store(size, repeat, workdir):
+    """Save and load a portfolio file"""
+    portfolio = synthetic_portfolio(size)
+    store = portfolio_store.PortfolioStore(os.path.join(workdir, f"portfolio_{size}.json"))
+    results = {"save_portfolio": timed(lambda: store.save(portfolio), repeat),
+               "load_portfolio": timed(store.load, repeat)}
+    results["save_portfolio"]["bytes"] = os.path.getsize(store.path)
+    return results
+
+
+def bench_execution(size, repeat, batch=100):
+    """Execute a batch of buys and sells against a portfolio with size positions"""
+    portfolio = synthetic_portfolio(size)
+    symbols = list(portfolio['stocks'])
+    executor = execution.ExecutionEngine(portfolio, risk=risk.RiskManager(), bus=events.EventBus(),
+                                         lots=lots.LotTracker())
+    rng = random.Random(SEED)
+
+    def run():
+        orders = []
+        for _ in range(batch):
+            symbol = rng.choice(symbols)
+            price = portfolio['stocks'][symbol]['current_price']
+            orders.append(execution.OrderRequest(symbol, "BUY", 2, price))
+            orders.append(execution.OrderRequest(symbol, "SELL", 1, price))
+        executor.execute(orders)
+
+    result = timed(run, repeat)
+    result["orders"] = batch * 2
+    return {"execute_trades": result}
+
+
+def bench_recommendation(repeat, strategy=None):
+    """Recommendation from 90 days of synthetic bars, as shown under the chart"""
+    import signals
+
+    strategy = strategy or strategies.MACrossoverStrategy()
+    bars = market_data.get_history("BENCH", period="90d")
+    return {"generate_trading_recommendation":
+            timed(lambda: signals.describe_signal(strategy.latest(bars)), repeat)}
+
+
+def has_display():
+    if os.name == "nt" or platform.system() == "Darwin":
+        return True
+    return bool(os.environ.get("DISPLAY") or os.environ.get("WAYLAND_DISPLAY"))
+
+
+def bench_gui(size, repeat, workdir):
+    """Redraw the portfolio tables and the chart of a running app (needs a display)"""
+    import tkinter as tk
+    from Working_stonks import FakeStockTradingApp
+
+    old_dir = os.getcwd()
+    os.chdir(workdir)  # The app keeps its portfolio.json in the working directory
+    root = tk.Tk()
+    root.withdraw()
+    try:
+        app = FakeStockTradingApp(root)
+        app.portfolio = synthetic_portfolio(size)
+        app.attach_portfolio()
+        app.current_stock = next(iter(app.portfolio['stocks']))
+        return {"update_portfolio_display": timed(app.update_portfolio_display, repeat),
+                "update_chart": timed(app.update_chart, repeat)}
+    finally:
+        root.destroy()
+        os.chdir(old_dir)
+
+
+def run(sizes=DEFAULT_SIZES, gui_sizes=DEFAULT_GUI_SIZES, repeat=5, gui=True):
+    """Run every benchmark on synthetic data, returns the results as a dict"""
+    old_source = market_data.set_source(market_data.SyntheticSource(seed=SEED, end=START_TIME))
+    workdir = tempfile.mkdtemp(prefix="stonks-bench-")
+    results = {}
+    try:
+        with clock.use(clock.SteppedClock(START_TIME.timestamp())):
+            results.update(_sized("", bench_recommendation(repeat)))
+            for size in sizes:
+                print(f"Benchmarking {size:,} positions and transactions...")
+                results.update(_sized(size, bench_store(size, repeat, workdir)))
+                results.update(_sized(size, bench_execution(size, repeat)))
+            if gui and has_display():
+                for size in gui_sizes:
+                    print(f"Benchmarking the GUI with {size:,} positions...")
+                    results.update(_sized(size, bench_gui(size, repeat, workdir)))
+            elif gui:
+                print("No display, skipping the GUI benchmarks.")
+    finally:
+        market_data.set_source(old_source)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        "created": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": repeat,
+        "results": results,
+    }
+
+
+def _sized(size, results):
+    return {f"{name}[{size}]" if size != "" else name: result for name, result in results.items()}
+
+
+def compare(current, previous, threshold=DEFAULT_THRESHOLD):
+    """Compare two runs' medians, returns the names of benchmarks that got slower than the threshold"""
+    regressions = []
+    for name, result in sorted(current['results'].items()):
+        old = previous['results'].get(name)
+        if old is None:
+            print(f"{name:<45} {result['median_ms']:>10.2f} ms   (new)")
+            continue
+        change = result['median_ms'] / old['median_ms'] - 1 if old['median_ms'] else 0.0
+        flag = ""
+        if change > threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        elif change < -threshold:
+            flag = "  faster"
+        print(f"{name:<45} {result['median_ms']:>10.2f} ms   was {old['median_ms']:>10.2f} ms   {change:+.0%}{flag}")
+    return regressions
+
+
+def print_results(report):
+    for name, result in sorted(report['results'].items()):
+        print(f"{name:<45} median {result['median_ms']:>10.2f} ms   min {result['min_ms']:>10.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the app's hot paths on synthetic data, without a network")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)),
+                        help="Portfolio sizes (positions and transactions), comma separated")
+    parser.add_argument("--gui-sizes", default=",".join(map(str, DEFAULT_GUI_SIZES)))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--no-gui", action="store_true", help="Skip the GUI benchmarks even with a display")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="Where to save the results as JSON")
+    parser.add_argument("--compare", help="Previous results file (defaults to the output file if it exists)")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Slowdown that counts as a regression (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+    gui_sizes = [int(size) for size in args.gui_sizes.split(",") if size.strip()]
+    previous_path = args.compare or (args.output if os.path.exists(args.output) else None)
+    previous = None
+    if previous_path:
+        with open(previous_path, 'r') as f:
+            previous = json.load(f)
+
+    report = run(sizes, gui_sizes, args.repeat, not args.no_gui)
+
+    if previous is None:
+        print_results(report)
+        regressions = []
+    else:
+        print(f"Compared with {previous_path} ({previous['created']}):")
+        regressions = compare(report, previous, args.threshold)
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=4)
+    print(f"Results saved to {args.output}")
+
+    if regressions:
+        print(f"{len(regressions)} benchmark(s) slower than the previous run by more than {args.threshold:.0%}")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
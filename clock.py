@@ -0,0 +1,92 @@
+import time as _time
+from contextlib import contextmanager
+from datetime import datetime
+
+
+class WallClock:
+    """The real time"""
+
+    def time(self):
+        return _time.time()
+
+    def sleep(self, seconds):
+        _time.sleep(seconds)
+
+
+class SimulatedClock:
+    """Time that runs speed times faster than real time from a chosen start"""
+
+    def __init__(self, start=None, speed=1.0):
+        self.start = _time.time() if start is None else start
+        self.speed = speed
+        self._origin = _time.perf_counter()
+
+    def time(self):
+        return self.start + (_time.perf_counter() - self._origin) * self.speed
+
+    def sleep(self, seconds):
+        _time.sleep(seconds / self.speed)
+
+
+class SteppedClock:
+    """Time that only moves when told to, so simulations run as fast as the CPU allows.
+
+    Sleeping jumps straight to the wake-up time instead of waiting.
+    """
+
+    def __init__(self, start=None):
+        self.now = _time.time() if start is None else start
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.advance(seconds)
+
+    def advance(self, seconds):
+        self.now += max(0.0, seconds)
+
+    def set(self, when):
+        """Move to a point in time, e.g. the time of the bar being replayed"""
+        self.now = when
+
+
+# The clock used by trading, scheduling and persistence
+_clock = WallClock()
+
+
+def get_clock():
+    return _clock
+
+
+def set_clock(new_clock):
+    """Replace the clock everywhere and return the previous one"""
+    global _clock
+    old_clock = _clock
+    _clock = new_clock
+    return old_clock
+
+
+@contextmanager
+def use(new_clock):
+    """Use another clock inside a with block"""
+    old_clock = set_clock(new_clock)
+    try:
+        yield new_clock
+    finally:
+        set_clock(old_clock)
+
+
+def timestamp():
+    """Seconds since the epoch on the current clock"""
+    return _clock.time()
+
+
+def sleep(seconds):
+    """Wait on the current clock"""
+    _clock.sleep(seconds)
+
+
+def now():
+    """The current clock's time as a datetime"""
+    return datetime.fromtimestamp(_clock.time())
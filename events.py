@@ -0,0 +1,159 @@
+import queue
+import threading
+import time
+from collections import namedtuple
+
+# Typed events passed between the stages of the app
+QuoteTick = namedtuple("QuoteTick", ["symbol", "price", "time"])
+BarClosed = namedtuple("BarClosed", ["symbol", "bar_time", "open", "high", "low", "close", "volume"])
+SignalEvent = namedtuple("SignalEvent", ["symbol", "signal"])  # signal is a signals.Signal
+OrderFilled = namedtuple("OrderFilled", ["transaction"])
+PortfolioChanged = namedtuple("PortfolioChanged", ["transactions"])
+
+# How a subscriber receives events
+INLINE = "inline"   # Called by the publisher, on the publisher's thread
+THREAD = "thread"   # Queued and handled by the subscriber's own worker thread
+POLL = "poll"       # Queued until the owner calls drain() (e.g. from a Tk timer)
+
+# What publish does when a subscriber's queue is full
+BLOCK = "block"              # Wait for room, slowing the publisher down
+DROP_OLDEST = "drop_oldest"  # Throw away the oldest queued event (fine for display updates)
+DROP_NEWEST = "drop_newest"  # Throw away the event being published
+
+
+class Subscription:
+    """One handler subscribed to one event type, with its own bounded queue and counters"""
+
+    def __init__(self, bus, event_type, handler, mode, maxsize, policy, name):
+        self.bus = bus
+        self.event_type = event_type
+        self.handler = handler
+        self.mode = mode
+        self.policy = policy
+        self.name = name or getattr(handler, "__qualname__", repr(handler))
+        self.queue = queue.Queue(maxsize) if mode != INLINE else None
+
+        # Counters for profiling each stage
+        self.handled = 0
+        self.dropped = 0
+        self.errors = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.max_queue = 0
+
+        self.thread = None
+        if mode == THREAD:
+            self.thread = threading.Thread(target=self._work, name=f"bus-{self.name}", daemon=True)
+            self.thread.start()
+
+    def deliver(self, event):
+        if self.mode == INLINE:
+            self._handle(event)
+            return
+
+        if self.policy == BLOCK:
+            self.queue.put(event)
+        else:
+            try:
+                self.queue.put_nowait(event)
+            except queue.Full:
+                self.dropped += 1
+                if self.policy == DROP_OLDEST:
+                    try:
+                        self.queue.get_nowait()
+                    except queue.Empty:
+                        pass
+                    try:
+                        self.queue.put_nowait(event)
+                    except queue.Full:
+                        pass
+        self.max_queue = max(self.max_queue, self.queue.qsize())
+
+    def drain(self, limit=None):
+        """Handle queued events on the calling thread, returns how many were handled"""
+        count = 0
+        while limit is None or count < limit:
+            try:
+                event = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            self._handle(event)
+            count += 1
+        return count
+
+    def _work(self):
+        while True:
+            event = self.queue.get()
+            if event is None:
+                break
+            self._handle(event)
+
+    def _handle(self, event):
+        start = time.perf_counter()
+        try:
+            self.handler(event)
+        except Exception as e:
+            self.errors += 1
+            print(f"Event handler {self.name} failed on {type(event).__name__}: {e}")
+        elapsed = time.perf_counter() - start
+        self.handled += 1
+        self.total_seconds += elapsed
+        self.max_seconds = max(self.max_seconds, elapsed)
+
+    def stats(self):
+        return {
+            "event": self.event_type.__name__,
+            "mode": self.mode,
+            "handled": self.handled,
+            "dropped": self.dropped,
+            "errors": self.errors,
+            "queued": self.queue.qsize() if self.queue else 0,
+            "max_queue": self.max_queue,
+            "avg_ms": self.total_seconds / self.handled * 1000 if self.handled else 0.0,
+            "max_ms": self.max_seconds * 1000,
+        }
+
+
+class EventBus:
+    """In-process publish/subscribe between quotes, indicators, signals, orders and persistence"""
+
+    def __init__(self):
+        self.subscriptions = {}   # event type -> list of Subscription
+        self.published = {}       # event type name -> count
+        self._lock = threading.Lock()
+
+    def subscribe(self, event_type, handler, mode=INLINE, maxsize=1000, policy=BLOCK, name=None):
+        """Call handler for every published event of event_type"""
+        subscription = Subscription(self, event_type, handler, mode, maxsize, policy, name)
+        with self._lock:
+            self.subscriptions.setdefault(event_type, []).append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self.subscriptions.get(subscription.event_type, []).remove(subscription)
+        if subscription.thread is not None:
+            subscription.queue.put(None)
+
+    def publish(self, event):
+        """Hand an event to every subscriber of its type"""
+        event_type = type(event)
+        self.published[event_type.__name__] = self.published.get(event_type.__name__, 0) + 1
+        for subscription in self.subscriptions.get(event_type, ()):
+            subscription.deliver(event)
+
+    def stats(self):
+        """Per-subscriber counters and timings, for finding the slow stage"""
+        return {subscription.name: subscription.stats()
+                for subscriptions in self.subscriptions.values()
+                for subscription in subscriptions}
+
+    def close(self):
+        """Stop all worker threads"""
+        with self._lock:
+            subscriptions = [s for subs in self.subscriptions.values() for s in subs]
+            self.subscriptions = {}
+        for subscription in subscriptions:
+            if subscription.thread is not None:
+                subscription.queue.put(None)
+                subscription.thread.join(timeout=1)
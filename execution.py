@@ -0,0 +1,150 @@
+from collections import namedtuple
+import events
+import metrics
+import portfolio_store
+import risk
+
+# One order to execute at a known price.
+#   side       - "BUY" or "SELL"
+#   trade_type - what goes in the transaction history ("BUY", "AUTO SELL", "LIMIT BUY", ...)
+#   commission - recorded with the transaction when not None
+#   lot_ids    - tax lots a sell should take shares from first (specific-lot method)
+#   max_order_value, max_trades - the placer's own risk limits (e.g. one auto-trader's), checked on top of
+#                portfolio-level limits; max_trades counts trades of trade_type in the symbol
+OrderRequest = namedtuple("OrderRequest", ["symbol", "side", "quantity", "price", "trade_type", "commission",
+                                           "lot_ids", "max_order_value", "max_trades"])
+OrderRequest.__new__.__defaults__ = (None, None, None, None, None)
+
+# Outcome of a batch: transactions that were made and (order, reason) pairs that were not
+ExecutionResult = namedtuple("ExecutionResult", ["transactions", "rejected"])
+
+
+class ExecutionEngine:
+    """Executes batches of orders against the portfolio with one save and one refresh per batch"""
+
+    def __init__(self, portfolio, save=None, refresh=None, risk=None, bus=None, lots=None):
+        self.portfolio = portfolio
+        self.save = save          # Called once after a batch that made trades
+        self.refresh = refresh    # Called once with the batch's transactions
+        self.risk = risk          # RiskManager that checks every order and is kept up to date with every fill
+        self.bus = bus            # EventBus that gets OrderFilled and PortfolioChanged events
+        self.lots = lots          # LotTracker that records realized P&L on every sell
+        if risk is not None and portfolio is not None:
+            risk.rebuild(portfolio)
+        if lots is not None and portfolio is not None:
+            lots.rebuild(portfolio)
+
+    def set_portfolio(self, portfolio):
+        """Switch to another portfolio (e.g. reloaded from disk) and rebuild the risk totals"""
+        self.portfolio = portfolio
+        if self.risk is not None:
+            self.risk.rebuild(portfolio)
+        if self.lots is not None:
+            self.lots.rebuild(portfolio)
+
+    def execute(self, orders):
+        """Validate a batch against risk limits, cash and holdings, apply what passes, then persist once.
+
+        Sells are checked before buys so a rebalance can spend the cash it frees.
+        """
+        with metrics.span("execution"):
+            cash = self.portfolio['cash_balance']
+            holdings = {}
+            lot_shares = {}   # Shares the lot tracker can sell, so a sell never fails after the portfolio changed
+            pending = risk.PendingOrders()   # Accepted so far, the risk totals only move on fills
+            accepted = []
+            rejected = []
+
+            for order in sorted(orders, key=lambda order: order.side != "SELL"):
+                if order.quantity <= 0:
+                    rejected.append((order, "Please enter a valid quantity."))
+                    continue
+
+                if self.risk is not None:
+                    ok, reason = self.risk.check(order.symbol, order.side, order.quantity, order.price,
+                                                 order.trade_type, order.max_order_value, order.max_trades,
+                                                 pending)
+                    if not ok:
+                        rejected.append((order, reason))
+                        continue
+
+                if order.symbol not in holdings:
+                    holdings[order.symbol] = self.portfolio['stocks'].get(order.symbol, {}).get('shares', 0)
+                    if self.lots is not None:
+                        lot_shares[order.symbol] = self.lots.available(order.symbol)
+                amount = order.quantity * order.price
+
+                if order.side == "BUY":
+                    if amount > cash:
+                        rejected.append((order, "Not enough cash for this purchase"))
+                        continue
+                    cash -= amount
+                    holdings[order.symbol] += order.quantity
+                    if self.lots is not None:
+                        lot_shares[order.symbol] += order.quantity
+                elif order.side == "SELL":
+                    if holdings[order.symbol] <= 0:
+                        rejected.append((order, "You do not own any shares of this stock."))
+                        continue
+                    if order.quantity > holdings[order.symbol]:
+                        rejected.append((order, "Not enough shares to sell."))
+                        continue
+                    if self.lots is not None and order.quantity > lot_shares[order.symbol]:
+                        rejected.append((order, "Not enough shares in open lots to sell."))
+                        continue
+                    cash += amount
+                    holdings[order.symbol] -= order.quantity
+                    if self.lots is not None:
+                        lot_shares[order.symbol] -= order.quantity
+                else:
+                    rejected.append((order, f"Unknown side: {order.side}"))
+                    continue
+                if self.risk is not None:
+                    self.risk.reserve(pending, order.symbol, order.side, order.quantity, order.price, order.trade_type)
+                accepted.append(order)
+
+            transactions = []
+            for order in accepted:
+                trade_type = order.trade_type or order.side
+                if order.side == "BUY":
+                    transactions.append(portfolio_store.record_buy(self.portfolio, order.symbol, order.quantity,
+                                                                   order.price, trade_type, order.commission))
+                else:
+                    transactions.append(portfolio_store.record_sell(self.portfolio, order.symbol, order.quantity,
+                                                                    order.price, trade_type, order.commission))
+
+            if self.lots is not None:
+                for order, transaction in zip(accepted, transactions):
+                    self.lots.on_fill(transaction, order.lot_ids)
+
+            if self.risk is not None:
+                for transaction in transactions:
+                    self.risk.on_fill(transaction)
+
+        # Persisting, rendering and subscribers are timed in their own spans, not as execution
+        if transactions:
+            if self.save:
+                self.save()
+            if self.refresh:
+                self.refresh(transactions)
+            if self.bus is not None:
+                for transaction in transactions:
+                    self.bus.publish(events.OrderFilled(transaction))
+                self.bus.publish(events.PortfolioChanged(transactions))
+
+        metrics.inc("orders_total", len(transactions), result="filled")
+        metrics.inc("orders_total", len(rejected), result="rejected")
+        return ExecutionResult(transactions, rejected)
+
+    def rebalance(self, target_shares, prices, trade_type="REBALANCE"):
+        """Trade every symbol to its target share count in a single batch"""
+        orders = []
+        symbols = set(target_shares) | set(self.portfolio['stocks'])
+        for symbol in sorted(symbols):
+            current = self.portfolio['stocks'].get(symbol, {}).get('shares', 0)
+            difference = target_shares.get(symbol, 0) - current
+            if difference > 0:
+                orders.append(OrderRequest(symbol, "BUY", difference, prices[symbol], f"{trade_type} BUY"))
+            elif difference < 0:
+                orders.append(OrderRequest(symbol, "SELL", -difference, prices[symbol], f"{trade_type} SELL"))
+        return self.execute(orders)
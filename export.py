@@ -0,0 +1,208 @@
+import argparse
+import csv
+import itertools
+import json
+import re
+import time
+import numpy as np
+import portfolio_store
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet export is optional
+    pa = None
+    pq = None
+
+TRANSACTION_COLUMNS = ["date", "type", "symbol", "shares", "price", "total", "commission",
+                       "realized_pnl", "lot_method"]
+POSITION_COLUMNS = ["symbol", "shares", "avg_price", "current_price"]
+NAV_COLUMNS = ["time", "cash", "holdings", "nav"]
+
+# Parquet type of every column, so a chunk where a column is always empty still has the right type
+COLUMN_TYPES = {
+    "date": "string", "type": "string", "symbol": "string", "lot_method": "string", "time": "string",
+    "shares": "int64",
+    "price": "float64", "total": "float64", "commission": "float64", "realized_pnl": "float64",
+    "avg_price": "float64", "current_price": "float64", "cash": "float64", "holdings": "float64", "nav": "float64",
+}
+
+DEFAULT_CHUNK_SIZE = 50000
+
+
+def iter_json_array(path, key, read_size=1 << 20):
+    """Yield the items of a top-level array in a JSON file one at a time, without loading the file"""
+    decoder = json.JSONDecoder()
+    start = re.compile(r'"%s"\s*:\s*\[' % re.escape(key))
+    separator = re.compile(r'[\s,]*')
+
+    with open(path, 'r') as f:
+        # Find where the array starts, keeping a little of each read in case the key is split
+        buffer = ""
+        while True:
+            data = f.read(read_size)
+            if not data:
+                return
+            buffer = buffer[-len(key) - 16:] + data
+            match = start.search(buffer)
+            if match:
+                buffer = buffer[match.end():]
+                break
+
+        position = 0
+        while True:
+            position = separator.match(buffer, position).end()
+            if position < len(buffer) and buffer[position] == "]":
+                return
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                # The next item runs past the end of what has been read
+                data = f.read(read_size)
+                if not data:
+                    raise
+                buffer = buffer[position:] + data
+                position = 0
+                continue
+            yield item
+
+
+def read_json_value(path, key, read_size=1 << 20):
+    """Read one small top-level value (like cash_balance) from a JSON file without loading the file"""
+    decoder = json.JSONDecoder()
+    start = re.compile(r'"%s"\s*:\s*' % re.escape(key))
+    with open(path, 'r') as f:
+        buffer = ""
+        while True:
+            data = f.read(read_size)
+            if not data:
+                raise KeyError(key)
+            buffer = buffer[-len(key) - 16:] + data
+            match = start.search(buffer)
+            if match:
+                buffer = buffer[match.end():]
+                break
+        at_eof = False
+        while True:
+            buffer = buffer.lstrip()
+            if buffer or at_eof:
+                try:
+                    value, end = decoder.raw_decode(buffer)
+                    # A number cut by the end of the read ("1234.") decodes short, only trust
+                    # a value once the separator after it has been read
+                    if at_eof or (end < len(buffer) and buffer[end] in " \t\r\n,}]"):
+                        return value
+                except json.JSONDecodeError:
+                    if at_eof:
+                        raise
+            data = f.read(read_size)
+            at_eof = not data
+            buffer += data
+
+
+def chunked(rows, size):
+    """Split an iterable of rows into lists of at most size rows"""
+    rows = iter(rows)
+    while True:
+        chunk = list(itertools.islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def write_rows(rows, path, columns, file_format=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Write dict rows to CSV or Parquet one chunk at a time, returns the number of rows written"""
+    file_format = file_format or ("parquet" if path.endswith(".parquet") else "csv")
+    count = 0
+
+    if file_format == "csv":
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(columns)
+            for chunk in chunked(rows, chunk_size):
+                writer.writerows([[row.get(column) for column in columns] for row in chunk])
+                count += len(chunk)
+        return count
+
+    if file_format != "parquet":
+        raise ValueError(f"Unknown export format: {file_format}")
+    if pq is None:
+        raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow)")
+
+    schema = parquet_schema(columns)
+    with pq.ParquetWriter(path, schema) as writer:
+        for chunk in chunked(rows, chunk_size):
+            table = pa.Table.from_pydict({column: [row.get(column) for row in chunk] for column in columns},
+                                         schema=schema)
+            writer.write_table(table)
+            count += len(chunk)
+    return count
+
+
+def parquet_schema(columns):
+    """Arrow schema for the columns, from COLUMN_TYPES"""
+    return pa.schema([(column, getattr(pa, COLUMN_TYPES[column])()) for column in columns])
+
+
+def export_transactions(transactions, path, file_format=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Export transaction dicts (a list or a stream from iter_json_array)"""
+    return write_rows(transactions, path, TRANSACTION_COLUMNS, file_format, chunk_size)
+
+
+def export_positions(stocks, path, file_format=None):
+    """Export the positions of a portfolio's stocks dict"""
+    rows = ({"symbol": symbol, **position} for symbol, position in stocks.items())
+    return write_rows(rows, path, POSITION_COLUMNS, file_format)
+
+
+def export_nav(curve, path, file_format=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Export an equity curve from nav.equity_curve"""
+    times = [str(when) for when in curve.times]
+    rows = ({"time": when, "cash": float(cash), "holdings": float(holdings), "nav": float(value)}
+            for when, cash, holdings, value in zip(times, curve.cash, curve.holdings, curve.nav))
+    return write_rows(rows, path, NAV_COLUMNS, file_format, chunk_size)
+
+
+def nav_from_file(path, period="1y", interval="1d", chunk_size=DEFAULT_CHUNK_SIZE):
+    """Equity curve of a portfolio file, reading its history in chunks into arrays"""
+    import nav
+
+    parts = [nav.history_arrays(chunk) for chunk in chunked(iter_json_array(path, "transaction_history"), chunk_size)]
+    if not parts:
+        return None
+    arrays = tuple(np.concatenate(column) for column in zip(*parts))
+    symbols = sorted(set(arrays[1]))
+    closes, index = nav.price_matrix(symbols, period, interval)
+    return nav.equity_curve_from_arrays(arrays, read_json_value(path, "cash_balance"), closes, index, symbols)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the portfolio to CSV or Parquet without loading it all")
+    parser.add_argument("what", choices=["transactions", "positions", "nav"])
+    parser.add_argument("output", help="Output file, .csv or .parquet")
+    parser.add_argument("--portfolio", default=portfolio_store.DEFAULT_FILE)
+    parser.add_argument("--format", choices=["csv", "parquet"], help="Defaults to the output file's extension")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--period", default="1y", help="Price history for the NAV export")
+    parser.add_argument("--interval", default="1d")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.what == "transactions":
+        rows = iter_json_array(args.portfolio, "transaction_history")
+        count = export_transactions(rows, args.output, args.format, args.chunk_size)
+    elif args.what == "positions":
+        count = export_positions(read_json_value(args.portfolio, "stocks"), args.output, args.format)
+    else:
+        curve = nav_from_file(args.portfolio, args.period, args.interval, args.chunk_size)
+        if curve is None:
+            print("No transactions yet.")
+            return
+        count = export_nav(curve, args.output, args.format, args.chunk_size)
+
+    elapsed = time.perf_counter() - start
+    print(f"Exported {count:,} rows to {args.output} in {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
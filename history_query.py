@@ -0,0 +1,161 @@
+import argparse
+import bisect
+import json
+from datetime import datetime, timedelta
+import clock
+
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Parts of a transaction that results can be grouped by
+GROUP_KEYS = {
+    "symbol": lambda transaction: transaction['symbol'],
+    "type": lambda transaction: transaction['type'],
+    "day": lambda transaction: transaction['date'][:10],
+    "month": lambda transaction: transaction['date'][:7],
+}
+
+
+class TransactionIndex:
+    """Secondary indexes over the transaction history for fast filtering and aggregation.
+
+    Every index (all transactions, by symbol, by type, by symbol and type)
+    keeps its entries sorted by date. Dates are stored as the history's
+    "YYYY-MM-DD HH:MM:SS" strings, which sort in time order, so a date range
+    is two bisects and a query costs O(log n + matches).
+    """
+
+    def __init__(self, history=None):
+        self.rebuild(history or [])
+
+    def rebuild(self, history):
+        """Index a full history"""
+        self.history = history
+        self.indexes = {}   # (symbol, type) with None for any -> (sorted dates, positions in history)
+        self.indexed = 0
+        self.update()
+
+    def update(self):
+        """Index the transactions appended to the history since the last call"""
+        for position in range(self.indexed, len(self.history)):
+            self._insert(position, self.history[position])
+        self.indexed = len(self.history)
+
+    def query(self, symbol=None, trade_type=None, start=None, end=None, inclusive_end=False):
+        """Transactions matching every given filter, oldest first.
+
+        start and end may be datetimes or date strings. end is exclusive unless
+        inclusive_end is set, in which case an end date without a time covers
+        that whole day.
+        """
+        positions, low, high = self._range(symbol, trade_type, start, end, inclusive_end)
+        return [self.history[position] for position in positions[low:high]]
+
+    def count(self, symbol=None, trade_type=None, start=None, end=None, inclusive_end=False):
+        """Number of transactions matching the filters, without building the list"""
+        _, low, high = self._range(symbol, trade_type, start, end, inclusive_end)
+        return max(0, high - low)
+
+    def _range(self, symbol, trade_type, start, end, inclusive_end=False):
+        index = self.indexes.get((symbol or None, trade_type or None))
+        if index is None:
+            return [], 0, 0
+        dates, positions = index
+        low = bisect.bisect_left(dates, _date_key(start)) if start else 0
+        if not end:
+            high = len(dates)
+        elif not inclusive_end:
+            high = bisect.bisect_left(dates, _date_key(end))
+        else:
+            day_after = _day_after(end)
+            if day_after is not None:
+                high = bisect.bisect_left(dates, day_after)
+            else:
+                high = bisect.bisect_right(dates, _date_key(end))
+        return positions, low, high
+
+    def symbols(self):
+        return sorted(symbol for symbol, trade_type in self.indexes if symbol and not trade_type)
+
+    def types(self):
+        return sorted(trade_type for symbol, trade_type in self.indexes if trade_type and not symbol)
+
+    def _insert(self, position, transaction):
+        date = transaction.get('date', "")
+        symbol = transaction.get('symbol')
+        trade_type = transaction.get('type')
+        for key in ((None, None), (symbol, None), (None, trade_type), (symbol, trade_type)):
+            dates, positions = self.indexes.setdefault(key, ([], []))
+            if not dates or dates[-1] <= date:
+                dates.append(date)          # The usual case, trades arrive in time order
+                positions.append(position)
+            else:
+                at = bisect.bisect_right(dates, date)
+                dates.insert(at, date)
+                positions.insert(at, position)
+
+
+def aggregate(transactions, by=("symbol", "day")):
+    """Count, shares, value and commission of transactions grouped by the given keys"""
+    key_funcs = [GROUP_KEYS[name] for name in by]
+    groups = {}
+    for transaction in transactions:
+        key = tuple(func(transaction) for func in key_funcs)
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = {"count": 0, "shares": 0, "volume": 0.0, "commission": 0.0}
+        group["count"] += 1
+        group["shares"] += transaction['shares']
+        group["volume"] += transaction['total']
+        group["commission"] += transaction.get('commission') or 0.0
+    return groups
+
+
+def last_days(days):
+    """Start date for a query covering the last few days on the current clock"""
+    return clock.now() - timedelta(days=days)
+
+
+def _date_key(value):
+    if isinstance(value, datetime):
+        return value.strftime(DATE_FORMAT)
+    return str(value)
+
+
+def _day_after(value):
+    """Start of the next day for an end given as a bare "YYYY-MM-DD" date, otherwise None"""
+    if isinstance(value, datetime):
+        return None
+    try:
+        day = datetime.strptime(str(value), "%Y-%m-%d")
+    except ValueError:
+        return None
+    return _date_key(day + timedelta(days=1))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Filter and summarize the transaction history")
+    parser.add_argument("portfolio", nargs="?", default="portfolio.json")
+    parser.add_argument("--symbol")
+    parser.add_argument("--type", help='Transaction type, e.g. "AUTO BUY"')
+    parser.add_argument("--since", help="Start date (YYYY-MM-DD)")
+    parser.add_argument("--until", help="End date, exclusive (YYYY-MM-DD)")
+    parser.add_argument("--days", type=int, help="Only the last N days")
+    parser.add_argument("--group-by", default="symbol,day", help=f"Comma separated, from {', '.join(GROUP_KEYS)}")
+    args = parser.parse_args()
+
+    with open(args.portfolio, 'r') as f:
+        portfolio = json.load(f)
+
+    index = TransactionIndex(portfolio['transaction_history'])
+    start = last_days(args.days) if args.days else args.since
+    rows = index.query(args.symbol and args.symbol.upper(), args.type, start, args.until)
+    by = [name.strip() for name in args.group_by.split(",") if name.strip()]
+
+    print(f"{len(rows)} matching transactions")
+    for key, group in sorted(aggregate(rows, by).items()):
+        print(f"{' '.join(key):<30} count {group['count']:>5}  shares {group['shares']:>8}  "
+              f"volume ${group['volume']:>12,.2f}  commission ${group['commission']:,.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+import argparse
+import contextlib
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+from collections import deque
+from datetime import datetime
+import numpy as np
+import auto_trader
+import clock
+import events
+import execution
+import lots
+import market_data
+import metrics
+import portfolio_store
+import risk
+
+DEFAULT_RATES = (100, 500, 2000, 0)
+
+# Market time the run starts at, moved on one second per order or bar
+START_TIME = datetime(2024, 1, 2, 9, 30)
+
+# A step counts as saturated when it gets less than this share of its target rate
+SATURATED = 0.9
+
+
+class LoadTest:
+    """Drives the trading core without a display: manual market orders and bars for auto-traders.
+
+    Quotes start from market_data's SyntheticSource and move as random walks.
+    Manual orders go straight to the execution engine, auto-trader bars go
+    through the event bus to AutoTrader.on_bar, as during a replay. Fills are
+    persisted after every batch as in the app, unless persistence is off.
+    Latency is measured from when an event was due, so time spent queued
+    behind a slow event counts and saturation shows in p99.
+    """
+
+    def __init__(self, symbols=100, auto_symbols=20, auto_share=0.3, portfolio_file=None,
+                 strategy="ma_crossover", seed=1, initial_balance=10000000.0):
+        self.rng = random.Random(seed)
+        self.auto_share = auto_share
+        self.market_clock = clock.SteppedClock(START_TIME.timestamp())
+        self.portfolio = portfolio_store.new_portfolio(initial_balance)
+        self.bus = events.EventBus()
+        self.executor = execution.ExecutionEngine(self.portfolio, risk=risk.RiskManager(), bus=self.bus,
+                                                  lots=lots.LotTracker())
+        self.store = None
+        if portfolio_file:
+            self.store = portfolio_store.PortfolioStore(portfolio_file, initial_balance)
+            self.bus.subscribe(events.PortfolioChanged, lambda event: self.store.save(self.portfolio), name="persist")
+
+        self.symbols = [f"L{i:04d}" for i in range(symbols)]
+        self.prices = {}
+        self.traders = {}
+        config = dict(auto_trader.DEFAULT_CONFIG, strategy=strategy, max_daily_buys=10 ** 9, max_daily_sells=10 ** 9)
+        for i, symbol in enumerate(self.symbols):
+            closes = market_data.get_history(symbol, period="90d")['Close'].to_numpy(dtype=float)
+            self.prices[symbol] = float(closes[-1])
+            if i >= auto_symbols:
+                continue
+            trader = auto_trader.create_trader(self.executor, dict(config, symbol=symbol))
+            # Start from the history so the strategy can signal on the first bar
+            trader.closes = deque(closes[-trader.strategy.lookback:], maxlen=trader.strategy.lookback)
+            self.bus.subscribe(events.BarClosed, trader.on_bar, name=f"auto-{symbol}")
+            self.traders[symbol] = trader
+
+    def manual_order(self):
+        symbol = self.rng.choice(self.symbols)
+        price = self._move(symbol)
+        held = self.portfolio['stocks'].get(symbol, {}).get('shares', 0)
+        if held and self.rng.random() < 0.4:
+            order = execution.OrderRequest(symbol, "SELL", self.rng.randint(1, held), price)
+        else:
+            order = execution.OrderRequest(symbol, "BUY", self.rng.randint(1, 20), price)
+        self.executor.execute([order])
+
+    def auto_bar(self):
+        symbol = self.rng.choice(list(self.traders))
+        price = self._move(symbol)
+        self.bus.publish(events.BarClosed(symbol, clock.now(), price, price, price, price, 0))
+
+    def _move(self, symbol):
+        price = self.prices[symbol] * (1 + self.rng.gauss(0, 0.01))
+        self.prices[symbol] = price
+        return price
+
+    def run_step(self, rate, seconds):
+        """Send events at rate per second (0 for as fast as possible) for some seconds, returns the results"""
+        metrics.get_metrics().reset()
+        latencies = {"manual": [], "auto": []}
+        trades_before = len(self.portfolio['transaction_history'])
+        size_before = self._file_size()
+        sent = 0
+        start = time.perf_counter()
+
+        with clock.use(self.market_clock):
+            while True:
+                now = time.perf_counter()
+                if now - start >= seconds:
+                    break
+                due = now
+                if rate:
+                    due = start + sent / rate
+                    if due > now:
+                        time.sleep(due - now)
+
+                stream = "auto" if self.traders and self.rng.random() < self.auto_share else "manual"
+                self.market_clock.advance(1)
+                if stream == "auto":
+                    self.auto_bar()
+                else:
+                    self.manual_order()
+                latencies[stream].append(time.perf_counter() - due)
+                sent += 1
+
+        elapsed = time.perf_counter() - start
+        trades = len(self.portfolio['transaction_history']) - trades_before
+        size = self._file_size()
+        result = {
+            "target_rate": rate,
+            "events": sent,
+            "events_per_second": sent / elapsed,
+            "trades": trades,
+            "trades_per_second": trades / elapsed,
+            "history_length": len(self.portfolio['transaction_history']),
+            "file_bytes": size,
+            "bytes_per_trade": (size - size_before) / trades if trades and size is not None else None,
+            "latency_ms": {stream: _percentiles(values) for stream, values in latencies.items() if values},
+            "stages": {metrics.stage_name(labels): row
+                       for labels, row in metrics.get_metrics().summary().items()},
+        }
+        result["saturated"] = bool(rate) and result["events_per_second"] < SATURATED * rate
+        return result
+
+    def _file_size(self):
+        if self.store is None:
+            return None
+        return os.path.getsize(self.store.path) if os.path.exists(self.store.path) else 0
+
+
+def _percentiles(values):
+    values = np.asarray(values) * 1000
+    return {"p50": float(np.percentile(values, 50)), "p99": float(np.percentile(values, 99)),
+            "max": float(values.max())}
+
+
+def format_step(result):
+    target = f"{result['target_rate']:,}/s" if result['target_rate'] else "max"
+    lines = [f"Target {target:>9}: {result['events_per_second']:>9,.0f} events/s, "
+             f"{result['trades_per_second']:>9,.0f} trades/s, {result['history_length']:,} transactions"
+             + (f", file {result['file_bytes'] / 1048576:,.1f} MB" if result['file_bytes'] is not None else "")
+             + ("  SATURATED" if result['saturated'] else "")]
+    for stream, latency in result['latency_ms'].items():
+        lines.append(f"    {stream:<8} latency p50 {latency['p50']:>8.3f} ms   p99 {latency['p99']:>8.3f} ms   "
+                     f"max {latency['max']:>8.3f} ms")
+    for name, row in sorted(result['stages'].items()):
+        lines.append(f"    {name:<40} {row['count']:>7} runs   p50 {row['p50'] * 1000:>8.3f} ms   "
+                     f"p99 {row['p99'] * 1000:>8.3f} ms")
+    if result['bytes_per_trade'] is not None:
+        lines.append(f"    storage grew {result['bytes_per_trade']:,.0f} bytes per trade")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the trading core headless, on synthetic quotes")
+    parser.add_argument("--symbols", type=int, default=100)
+    parser.add_argument("--auto-symbols", type=int, default=20, help="Symbols that also have an auto-trader")
+    parser.add_argument("--auto-share", type=float, default=0.3, help="Share of events that are auto-trader bars")
+    parser.add_argument("--rates", default=",".join(map(str, DEFAULT_RATES)),
+                        help="Events per second for each step, comma separated, 0 for as fast as possible")
+    parser.add_argument("--step-seconds", type=float, default=5.0)
+    parser.add_argument("--strategy", default="ma_crossover")
+    parser.add_argument("--no-persist", action="store_true", help="Keep the portfolio in memory only")
+    parser.add_argument("--portfolio", help="Portfolio file to write (default: a temporary file)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="Save the results as JSON")
+    parser.add_argument("--verbose", action="store_true", help="Show the auto-trader's messages")
+    args = parser.parse_args()
+
+    rates = [int(rate) for rate in args.rates.split(",") if rate.strip()]
+    workdir = None
+    portfolio_file = None
+    if not args.no_persist:
+        portfolio_file = args.portfolio
+        if portfolio_file is None:
+            workdir = tempfile.mkdtemp(prefix="stonks-load-")
+            portfolio_file = os.path.join(workdir, "portfolio.json")
+
+    market_data.set_source(market_data.SyntheticSource(seed=args.seed, end=START_TIME))
+    results = []
+    test = None
+    try:
+        test = LoadTest(args.symbols, args.auto_symbols, args.auto_share, portfolio_file, args.strategy, args.seed)
+        for rate in rates:
+            with contextlib.ExitStack() as stack:
+                if not args.verbose:
+                    devnull = stack.enter_context(open(os.devnull, 'w'))
+                    stack.enter_context(contextlib.redirect_stdout(devnull))
+                result = test.run_step(rate, args.step_seconds)
+            results.append(result)
+            print(format_step(result))
+    finally:
+        if test is not None:
+            test.bus.close()
+        if workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    saturated = [result for result in results if result['saturated']]
+    if saturated:
+        print(f"Saturated at {saturated[0]['target_rate']:,} events/s "
+              f"(reached {saturated[0]['events_per_second']:,.0f}/s)")
+    best = max(results, key=lambda result: result['trades_per_second'])
+    print(f"Peak throughput: {best['trades_per_second']:,.0f} trades/s")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=4)
+        print(f"Results saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+import time
+from collections import deque
+
+# Which lots a sell takes shares from
+FIFO = "FIFO"          # Oldest lots first
+LIFO = "LIFO"          # Newest lots first
+SPECIFIC = "SPECIFIC"  # Lots chosen by id, then oldest first for any remainder
+METHODS = (FIFO, LIFO, SPECIFIC)
+
+
+class Lot:
+    """Shares bought in one fill, still held"""
+
+    __slots__ = ("id", "symbol", "shares", "price", "date")
+
+    def __init__(self, lot_id, symbol, shares, price, date=None):
+        self.id = lot_id
+        self.symbol = symbol
+        self.shares = shares
+        self.price = price
+        self.date = date
+
+    def to_dict(self):
+        return {"id": self.id, "symbol": self.symbol, "shares": self.shares,
+                "price": self.price, "date": self.date}
+
+
+class LotTracker:
+    """Tax lots per symbol with realized and unrealized P&L kept up to date on every fill and quote.
+
+    Lots of a symbol sit in a deque in purchase order, so FIFO and LIFO sells
+    take from either end in O(1) per lot consumed. Totals are adjusted by the
+    change each fill or quote makes, the history is only walked by rebuild().
+    """
+
+    def __init__(self, method=FIFO):
+        if method not in METHODS:
+            raise ValueError(f"Unknown lot method: {method}")
+        self.method = method
+        self._reset()
+
+    def _reset(self):
+        self.lots = {}          # symbol -> deque of Lot
+        self.shares = {}        # symbol -> shares held
+        self.cost = {}          # symbol -> cost basis of the shares held
+        self.prices = {}        # symbol -> last price
+        self.realized = {}      # symbol -> realized P&L
+        self.realized_total = 0.0
+        self.cost_total = 0.0
+        self.value_total = 0.0
+        self._next_id = 1
+
+    def on_fill(self, transaction, lot_ids=None):
+        """Apply a BUY or SELL transaction and return the P&L it realized.
+
+        Sells record what they realized, which lots they used and the method in
+        the transaction itself, so a rebuild reproduces the same lots.
+        """
+        symbol = transaction['symbol']
+        shares = transaction['shares']
+        price = transaction['price']
+
+        if transaction['type'].endswith("BUY"):
+            lot = Lot(self._next_id, symbol, shares, price, transaction.get('date'))
+            self._next_id += 1
+            self.lots.setdefault(symbol, deque()).append(lot)
+            self.on_price(symbol, price)
+            self._change(symbol, shares, shares * price)
+            return 0.0
+
+        method = transaction.get('lot_method', self.method)
+        if lot_ids is None:
+            lot_ids = transaction.get('lot_ids')
+        used, cost = self._take(symbol, shares, method, lot_ids)
+        realized = shares * price - cost
+
+        self.realized[symbol] = self.realized.get(symbol, 0.0) + realized
+        self.realized_total += realized
+        self.on_price(symbol, price)
+        self._change(symbol, -shares, -cost)
+
+        transaction['realized_pnl'] = realized
+        transaction['lot_method'] = method
+        if method == SPECIFIC:
+            transaction['lot_ids'] = used
+        return realized
+
+    def on_price(self, symbol, price):
+        """Revalue one symbol's lots at a new price"""
+        old_value = self.shares.get(symbol, 0) * self.prices.get(symbol, price)
+        self.prices[symbol] = price
+        self.value_total += self.shares.get(symbol, 0) * price - old_value
+
+    def unrealized(self, symbol=None):
+        """Unrealized P&L of one symbol, or of every position"""
+        if symbol is None:
+            return self.value_total - self.cost_total
+        return self.shares.get(symbol, 0) * self.prices.get(symbol, 0.0) - self.cost.get(symbol, 0.0)
+
+    def open_lots(self, symbol=None):
+        """Lots still held, optionally for one symbol, oldest first"""
+        if symbol is not None:
+            return list(self.lots.get(symbol, ()))
+        return [lot for lots in self.lots.values() for lot in lots]
+
+    def rebuild(self, portfolio):
+        """Recompute every lot and total from the full transaction history"""
+        self.method = portfolio.get('lot_method', self.method)
+        self._reset()
+        for transaction in portfolio['transaction_history']:
+            try:
+                self.on_fill(transaction)
+            except ValueError as e:
+                print(f"Skipping transaction from {transaction.get('date')}: {e}")
+        self._reconcile(portfolio['stocks'])
+        for symbol, position in portfolio['stocks'].items():
+            price = position.get('current_price')
+            if price:
+                self.on_price(symbol, price)
+
+    def available(self, symbol):
+        """Shares of a symbol held in open lots"""
+        return self.shares.get(symbol, 0)
+
+    def _reconcile(self, stocks):
+        """Make the lots hold exactly the shares of each position.
+
+        Shares the history does not account for (a hand-edited or imported
+        portfolio, skipped transactions) get an opening lot at the position's
+        average price; lots the positions no longer hold are dropped.
+        """
+        for symbol in set(self.shares) | set(stocks):
+            position = stocks.get(symbol)
+            missing = (position['shares'] if position else 0) - self.shares.get(symbol, 0)
+            if missing > 0:
+                price = position['avg_price']
+                lot = Lot(self._next_id, symbol, missing, price)
+                self._next_id += 1
+                self.lots.setdefault(symbol, deque()).appendleft(lot)
+                self.on_price(symbol, price)
+                self._change(symbol, missing, missing * price)
+            elif missing < 0:
+                _, cost = self._take(symbol, -missing, self.method, None)
+                self._change(symbol, missing, -cost)
+
+    def _take(self, symbol, shares, method, lot_ids):
+        """Remove shares from a symbol's lots, returns (ids of lots used, their cost)"""
+        lots = self.lots.get(symbol)
+        if not lots or shares > self.shares.get(symbol, 0):
+            raise ValueError(f"Not enough shares of {symbol} in open lots")
+
+        used = []
+        cost = 0.0
+
+        if method == SPECIFIC and lot_ids:
+            by_id = {lot.id: lot for lot in lots}
+            for lot_id in lot_ids:
+                lot = by_id.get(lot_id)
+                if lot is None or shares == 0:
+                    continue
+                taken = min(shares, lot.shares)
+                lot.shares -= taken
+                shares -= taken
+                cost += taken * lot.price
+                used.append(lot.id)
+                if lot.shares == 0:
+                    lots.remove(lot)
+
+        # FIFO, LIFO, or the rest of a specific-lot sell from the oldest lots
+        while shares > 0:
+            lot = lots[-1] if method == LIFO else lots[0]
+            taken = min(shares, lot.shares)
+            lot.shares -= taken
+            shares -= taken
+            cost += taken * lot.price
+            used.append(lot.id)
+            if lot.shares == 0:
+                if method == LIFO:
+                    lots.pop()
+                else:
+                    lots.popleft()
+
+        if not lots:
+            del self.lots[symbol]
+        return used, cost
+
+    def _change(self, symbol, shares, cost):
+        self.shares[symbol] = self.shares.get(symbol, 0) + shares
+        self.cost[symbol] = self.cost.get(symbol, 0.0) + cost
+        self.cost_total += cost
+        self.value_total += shares * self.prices[symbol]
+        if self.shares[symbol] == 0:
+            self.cost_total -= self.cost.pop(symbol)
+            del self.shares[symbol]
+
+
+def benchmark(fill_count=1000000, symbol_count=100, seed=1):
+    """Time a full rebuild from a history of a million fills"""
+    import random
+
+    rng = random.Random(seed)
+    symbols = [f"SYM{i}" for i in range(symbol_count)]
+    held = dict.fromkeys(symbols, 0)
+    history = []
+    for _ in range(fill_count):
+        symbol = rng.choice(symbols)
+        price = rng.uniform(50, 150)
+        if held[symbol] and rng.random() < 0.45:
+            shares = rng.randint(1, held[symbol])
+            held[symbol] -= shares
+            trade_type = "SELL"
+        else:
+            shares = rng.randint(1, 100)
+            held[symbol] += shares
+            trade_type = "BUY"
+        history.append({'date': "2024-01-02 10:00:00", 'type': trade_type, 'symbol': symbol,
+                        'shares': shares, 'price': price, 'total': shares * price})
+    stocks = {symbol: {'shares': shares, 'avg_price': 100.0} for symbol, shares in held.items() if shares}
+    portfolio = {'stocks': stocks, 'transaction_history': history}
+
+    for method in (FIFO, LIFO):
+        tracker = LotTracker(method)
+        start = time.perf_counter()
+        tracker.rebuild(portfolio)
+        elapsed = time.perf_counter() - start
+        print(f"{method}: rebuilt {fill_count:,} fills in {elapsed:.2f}s "
+              f"({elapsed / fill_count * 1e6:.2f} us per fill), {len(tracker.open_lots()):,} open lots, "
+              f"realized ${tracker.realized_total:,.2f}")
+        for transaction in history:
+            transaction.pop('lot_method', None)
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,292 @@
+import os
+import re
+import sys
+import threading
+import time
+import zlib
+from collections import Counter, deque
+import numpy as np
+import pandas as pd
+import clock
+import metrics
+
+try:
+    import yfinance as yf
+except ImportError:  # Only needed for live data
+    yf = None
+
+# How long (in seconds) fetched bars are reused before asking the data source again
+HISTORY_TTL = 60
+
+# Cache of historical bars keyed by (symbol, period, interval)
+_history_cache = {}
+
+# Symbol recorded for calls that fetch many symbols at once
+BATCH = "(batch)"
+
+metrics.DESCRIPTIONS.update({
+    "data_calls_total": "Calls to the market data source by call site, kind and result",
+    "data_bytes_total": "Size of the data returned by the market data source",
+})
+
+
+class CallAccounting:
+    """Data source calls per call site and symbol, in total and over a rolling window.
+
+    Every call records where in the app it came from (the first function
+    outside this module), the symbol, how long it took, how much data came
+    back and whether it failed. Lookups answered from the cache are counted
+    too, so the hit rate of each call site shows how well HISTORY_TTL fits.
+    "Bytes" is the in-memory size of what the source returned, yfinance does
+    not expose the size on the wire.
+    """
+
+    def __init__(self, window=60, timefunc=time.monotonic):
+        self.window = window
+        self.timefunc = timefunc
+        self.recent = deque()   # (time, site, symbol, kind, seconds, size, error, cached)
+        self.totals = {}        # (site, symbol, kind) -> [calls, cached, errors, seconds, bytes]
+        self.lock = threading.Lock()
+
+    def record(self, site, symbol, kind, seconds=0.0, size=0, error=False, cached=False):
+        now = self.timefunc()
+        with self.lock:
+            self.recent.append((now, site, symbol, kind, seconds, size, error, cached))
+            self._prune(now)
+            totals = self.totals.get((site, symbol, kind))
+            if totals is None:
+                totals = self.totals[(site, symbol, kind)] = [0, 0, 0, 0.0, 0]
+            if cached:
+                totals[1] += 1
+            else:
+                totals[0] += 1
+                totals[2] += error
+                totals[3] += seconds
+                totals[4] += size
+
+    def last_window(self):
+        """Calls in the rolling window (the last minute by default) with the busiest sites and symbols"""
+        with self.lock:
+            self._prune(self.timefunc())
+            entries = list(self.recent)
+        calls = [entry for entry in entries if not entry[7]]
+        return {
+            "calls": len(calls),
+            "cached": len(entries) - len(calls),
+            "errors": sum(1 for entry in calls if entry[6]),
+            "seconds": sum(entry[4] for entry in calls),
+            "bytes": sum(entry[5] for entry in calls),
+            "by_site": Counter(entry[1] for entry in calls),
+            "by_symbol": Counter(entry[2] for entry in calls),
+        }
+
+    def report(self, by="site"):
+        """Totals since start grouped by "site", "symbol" or "kind", busiest first"""
+        position = {"site": 0, "symbol": 1, "kind": 2}[by]
+        rows = {}
+        with self.lock:
+            for key, (calls, cached, errors, seconds, size) in self.totals.items():
+                row = rows.setdefault(key[position], {"calls": 0, "cached": 0, "errors": 0, "seconds": 0.0, "bytes": 0})
+                row["calls"] += calls
+                row["cached"] += cached
+                row["errors"] += errors
+                row["seconds"] += seconds
+                row["bytes"] += size
+        return sorted(rows.items(), key=lambda item: item[1]["calls"], reverse=True)
+
+    def _prune(self, now):
+        cutoff = now - self.window
+        while self.recent and self.recent[0][0] <= cutoff:
+            self.recent.popleft()
+
+
+def format_window(view, top=2):
+    """One line for the status bar and the log"""
+    text = (f"Data calls (last min): {view['calls']}, {view['cached']} cached, {view['errors']} errors, "
+            f"{view['seconds']:.1f}s, {view['bytes'] / 1024:,.0f} KB")
+    if view['by_site']:
+        busiest = ", ".join(f"{site} {count}" for site, count in view['by_site'].most_common(top))
+        text += f" | busiest: {busiest}"
+    return text
+
+
+def log_window(top=5):
+    """Print the last minute of data source calls, if there were any"""
+    view = _accounting.last_window()
+    if view['calls'] or view['cached']:
+        print(format_window(view, top=top))
+
+
+def format_report(rows):
+    """Totals from CallAccounting.report as lines of text"""
+    return "\n".join(f"{name:<50} {row['calls']:>6} calls  {row['cached']:>6} cached  {row['errors']:>4} errors  "
+                     f"{row['seconds']:>8.2f}s  {row['bytes'] / 1024:>10,.0f} KB" for name, row in rows)
+
+
+class YFinanceSource:
+    """Live market data from Yahoo Finance"""
+
+    def history(self, symbol, period, interval):
+        return self._yf().Ticker(symbol).history(period=period, interval=interval)
+
+    def closes(self, symbols, period, interval):
+        data = self._yf().download(list(symbols), period=period, interval=interval,
+                                   group_by="column", auto_adjust=False, progress=False, threads=True)
+        closes = data['Close']
+        if not hasattr(closes, "columns"):
+            closes = closes.to_frame(symbols[0])
+        return closes
+
+    def price(self, symbol):
+        return self._yf().Ticker(symbol).info['regularMarketPrice']
+
+    def _yf(self):
+        if yf is None:
+            raise RuntimeError("Live market data needs yfinance (pip install yfinance)")
+        return yf
+
+
+class SyntheticSource:
+    """Offline stand-in for the live source: reproducible random-walk bars for any symbol.
+
+    Each symbol's prices come from its own seeded generator, so the same
+    symbol, period and interval always give the same bars.
+    """
+
+    def __init__(self, seed=0, end=None, volatility=0.02):
+        self.seed = seed
+        self.end = end              # Last bar's time (defaults to the current clock)
+        self.volatility = volatility
+
+    def history(self, symbol, period, interval):
+        count, step = _bar_count(period, interval)
+        end = pd.Timestamp(self.end if self.end is not None else clock.now()).floor(step)
+        index = pd.date_range(end=end, periods=count, freq=step)
+
+        rng = np.random.default_rng([self.seed, zlib.crc32(symbol.encode())])
+        scale = self.volatility * np.sqrt(step / pd.Timedelta("1D"))
+        start_price = 20 + zlib.crc32(symbol.encode()) % 480
+        closes = start_price * np.exp(np.cumsum(rng.normal(0, scale, count)))
+        opens = np.concatenate([[start_price], closes[:-1]])
+        spread = np.abs(rng.normal(0, scale, count)) * closes
+        return pd.DataFrame({
+            "Open": opens,
+            "High": np.maximum(opens, closes) + spread,
+            "Low": np.minimum(opens, closes) - spread,
+            "Close": closes,
+            "Volume": rng.integers(1000, 1000000, count),
+        }, index=index)
+
+    def closes(self, symbols, period, interval):
+        return pd.DataFrame({symbol: self.history(symbol, period, interval)['Close'] for symbol in symbols})
+
+    def price(self, symbol):
+        return float(self.history(symbol, "5d", "1d")['Close'].iloc[-1])
+
+
+_source = YFinanceSource()
+_accounting = CallAccounting()
+
+
+def get_source():
+    return _source
+
+
+def set_source(source):
+    """Use another data source (e.g. SyntheticSource for offline runs), returns the previous one"""
+    global _source
+    old_source = _source
+    _source = source
+    clear_cache()
+    return old_source
+
+
+def get_history(symbol, period="90d", interval="1d"):
+    """Get historical bars for a symbol, reusing cached bars while they are fresh"""
+    key = (symbol, period, interval)
+    cached = _history_cache.get(key)
+    if cached is not None and time.time() - cached[0] < HISTORY_TTL:
+        metrics.inc("history_cache_total", result="hit")
+        _accounting.record(_call_site(), symbol, "history", cached=True)
+        return cached[1]
+
+    metrics.inc("history_cache_total", result="miss")
+    data = _fetch("history", symbol, _source.history, symbol, period, interval)
+    _history_cache[key] = (time.time(), data)
+    return data
+
+
+def get_close_matrix(symbols, period="90d", interval="1d"):
+    """Download closing prices for many symbols as one symbols x time array"""
+    closes = _fetch("close_matrix", BATCH, _source.closes, symbols, period, interval)
+
+    # Keep the requested order and carry prices over bars a symbol did not trade
+    closes = closes.reindex(columns=list(symbols)).ffill()
+    return closes.to_numpy(dtype=float).T, closes.index
+
+
+def get_price(symbol):
+    """Get the latest market price of a symbol"""
+    return _fetch("price", symbol, _source.price, symbol)
+
+
+def get_accounting():
+    return _accounting
+
+
+def _fetch(kind, symbol, func, *args):
+    """Call the data source, timing it and accounting for it under the calling code"""
+    site = _call_site()
+    start = time.perf_counter()
+    try:
+        with metrics.span("fetch", kind=kind):
+            data = func(*args)
+    except Exception:
+        _accounting.record(site, symbol, kind, time.perf_counter() - start, error=True)
+        metrics.inc("data_calls_total", site=site, kind=kind, result="error")
+        raise
+    size = _payload_size(data)
+    _accounting.record(site, symbol, kind, time.perf_counter() - start, size)
+    metrics.inc("data_calls_total", site=site, kind=kind, result="ok")
+    metrics.inc("data_bytes_total", size, kind=kind)
+    return data
+
+
+def _call_site():
+    """module.function of the nearest caller outside this module"""
+    frame = sys._getframe(1)
+    while frame is not None and frame.f_code.co_filename == __file__:
+        frame = frame.f_back
+    if frame is None:
+        return "(unknown)"
+    code = frame.f_code
+    module = os.path.splitext(os.path.basename(code.co_filename))[0]
+    return f"{module}.{getattr(code, 'co_qualname', code.co_name)}"
+
+
+def _payload_size(data):
+    if hasattr(data, "memory_usage"):
+        return int(data.memory_usage(deep=True).sum())
+    return sys.getsizeof(data)
+
+
+def clear_cache():
+    """Forget all cached bars"""
+    _history_cache.clear()
+
+
+def _bar_count(period, interval):
+    """Number of bars and bar spacing for a yfinance-style period and interval ("90d", "1h")"""
+    units = {"m": "min", "h": "h", "d": "D", "wk": "W"}
+    match = re.fullmatch(r"(\d+)(m|h|d|wk|mo)", interval)
+    if not match:
+        step = pd.Timedelta("1D")
+    elif match.group(2) == "mo":
+        step = pd.Timedelta(days=30 * int(match.group(1)))   # Months are taken as 30 days
+    else:
+        step = pd.Timedelta(int(match.group(1)), units[match.group(2)])
+
+    days = {"d": 1, "wk": 7, "mo": 30, "y": 365}
+    match = re.fullmatch(r"(\d+)(d|wk|mo|y)", period)
+    span = pd.Timedelta(days=int(match.group(1)) * days[match.group(2)]) if match else pd.Timedelta(days=90)
+    return max(2, int(span / step)), step
@@ -0,0 +1,198 @@
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+import metrics
+
+metrics.DESCRIPTIONS.update({
+    "memory_bytes": "Memory measured by the profiler (traced Python allocations and process RSS)",
+    "live_objects": "Live figures, canvases, widgets and other counts tracked by the profiler",
+})
+
+
+def rss_bytes():
+    """Resident memory of this process, or None where it cannot be read"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+        # Peak, not current, but still shows growth (kilobytes on Linux, bytes on macOS)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+    except ImportError:
+        return None
+
+
+def count_live_objects():
+    """Live matplotlib Figures and Tk canvases and widgets held by Python, in one pass over the heap"""
+    classes = []
+    if "matplotlib.figure" in sys.modules:
+        classes.append(("figures", sys.modules["matplotlib.figure"].Figure))
+    if "matplotlib.backends.backend_tkagg" in sys.modules:
+        classes.append(("canvases", sys.modules["matplotlib.backends.backend_tkagg"].FigureCanvasTkAgg))
+    if "tkinter" in sys.modules:
+        classes.append(("widget_objects", sys.modules["tkinter"].Misc))
+
+    counts = {name: 0 for name, _ in classes}
+    for obj in gc.get_objects():
+        for name, cls in classes:
+            if isinstance(obj, cls):
+                counts[name] += 1
+    return counts
+
+
+def count_tk_widgets(root):
+    """Widgets alive in Tk under root, and how many of them are Toplevel windows"""
+    widgets = 0
+    toplevels = 0
+    pending = [root]
+    while pending:
+        widget = pending.pop()
+        for child in widget.winfo_children():
+            widgets += 1
+            if child.winfo_class() == "Toplevel":
+                toplevels += 1
+            pending.append(child)
+    return {"tk_widgets": widgets, "toplevels": toplevels}
+
+
+class MemoryProfiler:
+    """Periodic tracemalloc snapshots plus live object counts, with growth detection.
+
+    Each sample records traced and resident memory, the live counts and any
+    extra counters added with track(). A series is flagged as a leak when it
+    rose on most of the last `window` samples and grew by more than its
+    threshold over them. The allocation lines that grew most since the first
+    snapshot are kept to show where the memory went.
+    """
+
+    def __init__(self, window=10, frames=10, top=10, root=None):
+        self.window = window      # Samples looked at to decide whether something is growing
+        self.frames = frames      # Stack frames tracemalloc keeps per allocation
+        self.top = top            # Allocation lines in the report
+        self.root = root          # Tk root whose widgets are counted
+        self.trackers = {}        # name -> function returning a number
+        self.thresholds = {"traced_bytes": 5 * 1024 * 1024, "rss_bytes": 20 * 1024 * 1024}
+        self.samples = []         # dicts of name -> value, with "time"
+        self.baseline = None
+        self.top_growth = []
+
+    def track(self, name, func, threshold=1):
+        """Sample func() on every snapshot, e.g. the length of the transaction history"""
+        self.trackers[name] = func
+        self.thresholds[name] = threshold
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+        self.baseline = tracemalloc.take_snapshot()
+        return self.sample()
+
+    def sample(self):
+        """Take a snapshot, returns the warnings for series that keep growing"""
+        traced, peak = tracemalloc.get_traced_memory()
+        sample = {"time": time.time(), "traced_bytes": traced, "traced_peak_bytes": peak}
+        rss = rss_bytes()
+        if rss is not None:
+            sample["rss_bytes"] = rss
+        sample.update(count_live_objects())
+        if self.root is not None:
+            try:
+                sample.update(count_tk_widgets(self.root))
+            except sys.modules["tkinter"].TclError:
+                self.root = None   # The window has been destroyed, keep sampling the rest
+        for name, func in self.trackers.items():
+            try:
+                sample[name] = func()
+            except Exception as e:
+                print(f"Memory profiler could not sample {name}: {e}")
+        self.samples.append(sample)
+
+        for name, value in sample.items():
+            if name == "time":
+                continue
+            metrics.set_gauge("memory_bytes" if name.endswith("bytes") else "live_objects", value, kind=name)
+
+        if self.baseline is not None:
+            snapshot = tracemalloc.take_snapshot().filter_traces((
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, __file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+            ))
+            self.top_growth = [stat for stat in snapshot.compare_to(self.baseline, "lineno")
+                               if stat.size_diff > 0][:self.top]
+        return self.growing()
+
+    def growing(self):
+        """Series that rose on most of the last window samples by more than their threshold"""
+        recent = self.samples[-self.window:]
+        if len(recent) < 3:
+            return []
+        warnings = []
+        for name in recent[-1]:
+            if name in ("time", "traced_peak_bytes"):
+                continue
+            values = [sample[name] for sample in recent if name in sample]
+            if len(values) < 3:
+                continue
+            rises = sum(1 for before, after in zip(values, values[1:]) if after > before)
+            growth = values[-1] - values[0]
+            if rises >= 0.7 * (len(values) - 1) and growth >= self.thresholds.get(name, 1):
+                hours = (recent[-1]["time"] - recent[0]["time"]) / 3600
+                rate = growth / hours if hours else 0.0
+                warnings.append({"name": name, "growth": growth, "per_hour": rate,
+                                 "samples": len(values), "rises": rises})
+        return warnings
+
+    def report(self):
+        """The latest sample, growing series and the allocation lines that grew most"""
+        return {
+            "latest": self.samples[-1] if self.samples else {},
+            "growing": self.growing(),
+            "top_growth": [{"where": str(stat.traceback[0]), "size_diff": stat.size_diff,
+                            "count_diff": stat.count_diff} for stat in self.top_growth],
+            "samples": self.samples,
+        }
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent=4)
+
+
+def format_sample(sample):
+    """One log line for a sample"""
+    parts = [f"traced {sample['traced_bytes'] / 1048576:.1f} MB"]
+    if "rss_bytes" in sample:
+        parts.append(f"RSS {sample['rss_bytes'] / 1048576:.1f} MB")
+    parts.extend(f"{name} {value}" for name, value in sample.items()
+                 if name != "time" and not name.endswith("bytes"))
+    return "Memory: " + ", ".join(parts)
+
+
+def format_warnings(warnings):
+    lines = []
+    for warning in warnings:
+        growth = warning['growth']
+        if warning['name'].endswith("bytes"):
+            amount = f"+{growth / 1048576:.1f} MB ({warning['per_hour'] / 1048576:,.1f} MB/hour)"
+        else:
+            amount = f"+{growth:,} ({warning['per_hour']:,.1f}/hour)"
+        lines.append(f"Possible leak: {warning['name']} grew {amount}, "
+                     f"rising in {warning['rises']} of the last {warning['samples'] - 1} intervals")
+    return "\n".join(lines)
+
+
+def format_report(report):
+    lines = [format_sample(report["latest"])] if report["latest"] else []
+    if report["growing"]:
+        lines.append(format_warnings(report["growing"]))
+    if report["top_growth"]:
+        lines.append("Allocations that grew most since profiling started:")
+        lines.extend(f"  {entry['size_diff'] / 1024:>10,.1f} KB  {entry['count_diff']:>+8} blocks  {entry['where']}"
+                     for entry in report["top_growth"])
+    return "\n".join(lines)
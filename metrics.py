@@ -0,0 +1,227 @@
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Every metric name starts with this in the export
+PREFIX = "stonks_"
+
+# Histogram bucket upper bounds in seconds, from 100us to 10s
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+DESCRIPTIONS = {
+    "stage_duration_seconds": "Time spent in each hot-path stage",
+    "stage_errors_total": "Stage runs that raised an exception",
+    "history_cache_total": "Historical bar lookups answered from the cache (hit) or the data source (miss)",
+    "orders_total": "Orders executed (filled) or turned down (rejected)",
+}
+
+
+class Histogram:
+    """Counts of observations per bucket, plus their sum"""
+
+    __slots__ = ("buckets", "counts", "count", "sum")
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)   # The last slot is everything above the top bucket
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """Estimate a quantile by interpolating inside the bucket it falls in"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if seen + count >= rank and count:
+                low = self.buckets[i - 1] if i > 0 else 0.0
+                high = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+                return low + (high - low) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+
+class Metrics:
+    """Counters and latency histograms kept in memory and exported in the Prometheus text format.
+
+    Metrics are keyed by name and a sorted tuple of label pairs. Updates take a
+    lock because trading can run on event bus worker threads.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counters = {}     # (name, labels) -> value
+        self.gauges = {}       # (name, labels) -> last value set
+        self.histograms = {}   # (name, labels) -> Histogram
+        self.lock = threading.Lock()
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def set_gauge(self, name, value, **labels):
+        with self.lock:
+            self.gauges[(name, tuple(sorted(labels.items())))] = value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(self.buckets)
+            histogram.observe(value)
+
+    @contextmanager
+    def span(self, stage, **labels):
+        """Time a block as one run of a stage (fetch, indicator, render, persist, execution)"""
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.inc("stage_errors_total", stage=stage, **labels)
+            raise
+        finally:
+            self.observe("stage_duration_seconds", time.perf_counter() - start, stage=stage, **labels)
+
+    def reset(self):
+        with self.lock:
+            self.counters.clear()
+            self.gauges.clear()
+            self.histograms.clear()
+
+    def to_prometheus(self):
+        """All metrics as Prometheus text exposition format"""
+        lines = []
+        with self.lock:
+            counters = sorted(self.counters.items())
+            gauges = sorted(self.gauges.items())
+            histograms = sorted((key, (list(h.counts), h.count, h.sum)) for key, h in self.histograms.items())
+
+        described = set()
+        for metric_type, values in (("counter", counters), ("gauge", gauges)):
+            for (name, labels), value in values:
+                full_name = PREFIX + name
+                if name not in described:
+                    described.add(name)
+                    lines.append(f"# HELP {full_name} {DESCRIPTIONS.get(name, name)}")
+                    lines.append(f"# TYPE {full_name} {metric_type}")
+                lines.append(f"{full_name}{_labels(labels)} {value}")
+
+        for (name, labels), (counts, count, total) in histograms:
+            full_name = PREFIX + name
+            if name not in described:
+                described.add(name)
+                lines.append(f"# HELP {full_name} {DESCRIPTIONS.get(name, name)}")
+                lines.append(f"# TYPE {full_name} histogram")
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{full_name}_bucket{_labels(labels + (('le', repr(bound)),))} {cumulative}")
+            lines.append(f"{full_name}_bucket{_labels(labels + (('le', '+Inf'),))} {count}")
+            lines.append(f"{full_name}_sum{_labels(labels)} {total}")
+            lines.append(f"{full_name}_count{_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """Write the metrics to a file for node_exporter's textfile collector, replacing it in one step"""
+        temp_path = path + ".tmp"
+        with open(temp_path, 'w') as f:
+            f.write(self.to_prometheus())
+        os.replace(temp_path, path)
+
+    def serve(self, port=9464, host="127.0.0.1"):
+        """Serve the metrics at http://host:port/metrics from a background thread, returns the server"""
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = registry.to_prometheus().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # Scrapes would flood the console
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+        print(f"Serving metrics at http://{host}:{server.server_port}/metrics")
+        return server
+
+    def summary(self):
+        """Per stage: runs, mean, estimated p50 and p99 in seconds, and errors"""
+        with self.lock:
+            rows = {}
+            for (name, labels), histogram in self.histograms.items():
+                if name != "stage_duration_seconds":
+                    continue
+                rows[labels] = {"count": histogram.count,
+                                "mean": histogram.sum / histogram.count if histogram.count else 0.0,
+                                "p50": histogram.quantile(0.5), "p99": histogram.quantile(0.99),
+                                "errors": self.counters.get(("stage_errors_total", labels), 0)}
+        return rows
+
+
+def format_summary(summary):
+    """Stage summary as lines of text"""
+    lines = []
+    for name, row in sorted((stage_name(labels), row) for labels, row in summary.items()):
+        lines.append(f"{name:<40} {row['count']:>8} runs   mean {row['mean'] * 1000:>9.3f} ms   "
+                     f"p50 {row['p50'] * 1000:>9.3f} ms   p99 {row['p99'] * 1000:>9.3f} ms   "
+                     f"{row['errors']} errors")
+    return "\n".join(lines)
+
+
+def stage_name(labels):
+    """Summary key as text, the stage first then its other labels ("persist op=save")"""
+    labels = dict(labels)
+    stage = labels.pop("stage", "")
+    return " ".join([stage] + [f"{key}={value}" for key, value in sorted(labels.items())])
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in labels)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + "}"
+
+
+# The registry the app's modules report to
+_metrics = Metrics()
+
+
+def get_metrics():
+    return _metrics
+
+
+def span(stage, **labels):
+    """Time a block as one run of a stage on the shared registry"""
+    return _metrics.span(stage, **labels)
+
+
+def inc(name, amount=1, **labels):
+    _metrics.inc(name, amount, **labels)
+
+
+def set_gauge(name, value, **labels):
+    _metrics.set_gauge(name, value, **labels)
+
+
+def observe(name, value, **labels):
+    _metrics.observe(name, value, **labels)
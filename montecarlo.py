@@ -0,0 +1,136 @@
+import argparse
+import json
+import time
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+
+# Result of a Monte Carlo run
+#   values        - simulated portfolio value at the horizon, one per path
+#   initial_value - portfolio value today (cash plus holdings)
+#   var / es      - value at risk and expected shortfall per confidence level, as positive losses
+SimulationResult = namedtuple("SimulationResult", [
+    "values", "initial_value", "mean", "percentiles", "var", "es", "elapsed",
+])
+
+
+def _cholesky(cov):
+    """Cholesky factor of a covariance matrix, nudging the diagonal if it is not positive definite"""
+    jitter = 0.0
+    for _ in range(10):
+        try:
+            return np.linalg.cholesky(cov + jitter * np.eye(len(cov)))
+        except np.linalg.LinAlgError:
+            jitter = max(jitter * 10, 1e-12)
+    raise ValueError("Covariance matrix of returns is not positive definite")
+
+
+def simulate(shares, prices, cash, returns, paths=100000, horizon=10, confidence=(0.95, 0.99),
+             seed=None, chunk_size=20000):
+    """Simulate correlated price paths and return the distribution of portfolio value.
+
+    returns is a (days, symbols) array of historical daily log returns whose
+    mean and covariance drive the simulated paths. Paths are generated in
+    chunks so memory stays bounded however many paths are asked for. Raises
+    ValueError when there are fewer than two days of returns to estimate from.
+    """
+    start = time.perf_counter()
+    shares = np.asarray(shares, dtype=float)
+    prices = np.asarray(prices, dtype=float)
+
+    initial_value = cash + float(shares @ prices)
+    rng = np.random.default_rng(seed)
+    values = np.empty(paths)
+
+    if len(shares):
+        returns = np.asarray(returns, dtype=float).reshape(-1, len(shares))
+        if len(returns) < 2:
+            raise ValueError(f"Need at least 2 days of returns to estimate their covariance, got {len(returns)}")
+        mean = returns.mean(axis=0)
+        cov = np.atleast_2d(np.cov(returns, rowvar=False))
+        factor = _cholesky(cov)
+
+        for first in range(0, paths, chunk_size):
+            count = min(chunk_size, paths - first)
+            # (paths, days, symbols) of correlated daily log returns
+            shocks = rng.standard_normal((count, horizon, len(shares))) @ factor.T + mean
+            terminal_prices = prices * np.exp(shocks.sum(axis=1))
+            values[first:first + count] = cash + terminal_prices @ shares
+    else:
+        values[:] = cash
+
+    losses = initial_value - values
+    var = {}
+    es = {}
+    for level in confidence:
+        var[level] = float(np.quantile(losses, level))
+        es[level] = float(losses[losses >= var[level]].mean())
+
+    percentiles = dict(zip((1, 5, 25, 50, 75, 95, 99), np.percentile(values, [1, 5, 25, 50, 75, 95, 99])))
+    return SimulationResult(values, initial_value, float(values.mean()), percentiles, var, es,
+                            time.perf_counter() - start)
+
+
+def historical_returns(symbols, period="1y"):
+    """Daily log returns for each symbol from the history cache, aligned on common dates"""
+    import market_data
+
+    closes = {}
+    for symbol in symbols:
+        closes[symbol] = market_data.get_history(symbol, period=period)['Close']
+    closes = pd.DataFrame(closes).dropna()
+    if len(closes) < 3:
+        raise ValueError(f"Only {len(closes)} days of prices common to {', '.join(symbols)}, "
+                         f"at least 3 are needed for 2 days of returns")
+    returns = np.diff(np.log(closes.to_numpy(dtype=float)), axis=0)
+    return returns, closes.iloc[-1].to_numpy(dtype=float)
+
+
+def simulate_portfolio(portfolio, paths=100000, horizon=10, period="1y", seed=None):
+    """Run the simulation on a portfolio dict as stored in portfolio.json"""
+    symbols = list(portfolio['stocks'])
+    shares = [portfolio['stocks'][symbol]['shares'] for symbol in symbols]
+
+    if symbols:
+        returns, last_closes = historical_returns(symbols, period)
+        # Prefer the latest quotes the app stored, fall back to the last close
+        prices = [portfolio['stocks'][symbol].get('current_price') or close
+                  for symbol, close in zip(symbols, last_closes)]
+    else:
+        returns, prices = np.empty((0, 0)), []
+
+    return simulate(shares, prices, portfolio['cash_balance'], returns, paths, horizon, seed=seed)
+
+
+def format_result(result, horizon):
+    """Summarize a simulation result as text"""
+    lines = [
+        f"Current value:   ${result.initial_value:,.2f}",
+        f"Expected value:  ${result.mean:,.2f} in {horizon} trading days",
+        f"5th-95th pct:    ${result.percentiles[5]:,.2f} - ${result.percentiles[95]:,.2f}",
+    ]
+    for level in sorted(result.var):
+        lines.append(f"VaR {level:.0%}:         ${result.var[level]:,.2f}")
+        lines.append(f"ES {level:.0%}:          ${result.es[level]:,.2f}")
+    lines.append(f"Simulated {len(result.values):,} paths in {result.elapsed:.2f}s")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Monte Carlo stress test of the fake portfolio")
+    parser.add_argument("--portfolio", default="portfolio.json")
+    parser.add_argument("--paths", type=int, default=100000)
+    parser.add_argument("--horizon", type=int, default=10, help="Trading days to simulate")
+    parser.add_argument("--period", default="1y", help="History used for returns")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    with open(args.portfolio, 'r') as f:
+        portfolio = json.load(f)
+
+    result = simulate_portfolio(portfolio, args.paths, args.horizon, args.period, args.seed)
+    print(format_result(result, args.horizon))
+
+
+if __name__ == "__main__":
+    main()
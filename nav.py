@@ -0,0 +1,140 @@
+import argparse
+import json
+import time
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+import backtest
+
+# Account value over time, one entry per bar
+#   times    - the bar timestamps the curve was computed for
+#   cash     - cash balance after each bar
+#   holdings - market value of all positions at each bar's close
+#   nav      - cash plus holdings
+EquityCurve = namedtuple("EquityCurve", ["times", "cash", "holdings", "nav"])
+
+
+def history_arrays(history):
+    """Transaction history as arrays: times in seconds, symbols, signed share changes and cash changes"""
+    dates = pd.to_datetime(pd.Series([transaction['date'] for transaction in history], dtype=object),
+                           format="%Y-%m-%d %H:%M:%S", errors="coerce")
+    # Dates are written in local time, which bar_seconds assumes for naive timestamps
+    seconds = backtest.bar_seconds(pd.DatetimeIndex(dates), len(history))
+
+    sign = np.array([1.0 if transaction['type'].endswith("BUY") else -1.0 for transaction in history])
+    shares = sign * np.array([transaction['shares'] for transaction in history], dtype=float)
+    cash = -sign * np.array([transaction['total'] for transaction in history], dtype=float)
+    symbols = np.array([transaction['symbol'] for transaction in history], dtype=object)
+    return seconds, symbols, shares, cash
+
+
+def equity_curve(history, cash_balance, closes, times, symbols):
+    """Rebuild account value at every bar from the transaction history.
+
+    closes is a symbols x bars array of closing prices and times the bar
+    timestamps. A trade counts from the bar it happened in (trades before the
+    first bar count from the first bar), the starting cash is worked back from
+    today's balance, and positions come from a cumulative sum of share changes
+    per bar, so the whole curve is a handful of array operations.
+    """
+    return equity_curve_from_arrays(history_arrays(history), cash_balance, closes, times, symbols)
+
+
+def equity_curve_from_arrays(arrays, cash_balance, closes, times, symbols):
+    """equity_curve() for history already turned into arrays by history_arrays()"""
+    closes = np.asarray(closes, dtype=float).reshape(len(symbols), -1)
+    bar_count = closes.shape[1]
+    bar_times = backtest.bar_seconds(times, bar_count)
+    trade_times, trade_symbols, share_changes, cash_changes = arrays
+
+    # Bar each trade falls in, trades with unreadable dates are counted from the first bar
+    bars = np.searchsorted(bar_times, trade_times, side="right") - 1
+    bars = np.clip(np.nan_to_num(bars, nan=0), 0, bar_count - 1).astype(np.intp)
+    rows = pd.Index(list(symbols)).get_indexer(trade_symbols)
+    known = rows >= 0
+
+    position_changes = np.zeros(closes.shape)
+    np.add.at(position_changes, (rows[known], bars[known]), share_changes[known])
+    positions = np.cumsum(position_changes, axis=1)
+    holdings = np.nansum(positions * closes, axis=0)
+
+    initial_cash = cash_balance - cash_changes.sum()
+    cash = initial_cash + np.cumsum(np.bincount(bars, weights=cash_changes, minlength=bar_count))
+    return EquityCurve(times, cash, holdings, cash + holdings)
+
+
+def price_matrix(symbols, period="1y", interval="1d"):
+    """Closing prices of symbols from the history cache, aligned on common bars"""
+    import market_data
+
+    closes = {}
+    for symbol in symbols:
+        closes[symbol] = market_data.get_history(symbol, period=period, interval=interval)['Close']
+    closes = pd.DataFrame(closes, columns=list(symbols)).sort_index().ffill()
+    return closes.to_numpy(dtype=float).T, closes.index
+
+
+def portfolio_equity(portfolio, period="90d", interval="1d"):
+    """Equity curve of a portfolio dict over the last period of cached bars"""
+    history = portfolio['transaction_history']
+    symbols = sorted({transaction['symbol'] for transaction in history})
+    if not symbols:
+        return None
+    closes, index = price_matrix(symbols, period, interval)
+    return equity_curve(history, portfolio['cash_balance'], closes, index, symbols)
+
+
+def benchmark(symbol_count=500, years=5, trade_count=100000, seed=1):
+    """Time a rebuild of a multi-year, multi-symbol curve from synthetic trades"""
+    rng = np.random.default_rng(seed)
+    index = pd.bdate_range("2020-01-01", periods=years * 252)
+    symbols = [f"SYM{i}" for i in range(symbol_count)]
+    closes = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, (symbol_count, len(index))), axis=1))
+
+    days = np.sort(rng.integers(0, len(index), trade_count))
+    picks = rng.integers(0, symbol_count, trade_count)
+    history = [{
+        'date': index[day].strftime("%Y-%m-%d 12:00:00"),
+        'type': "BUY",
+        'symbol': symbols[pick],
+        'shares': 1,
+        'price': closes[pick, day],
+        'total': closes[pick, day],
+    } for day, pick in zip(days, picks)]
+    cash = 1e9 - sum(transaction['total'] for transaction in history)
+
+    start = time.perf_counter()
+    curve = equity_curve(history, cash, closes, index, symbols)
+    elapsed = time.perf_counter() - start
+
+    print(f"Symbols:       {symbol_count:,}")
+    print(f"Bars:          {len(index):,}")
+    print(f"Transactions:  {trade_count:,}")
+    print(f"Final value:   ${curve.nav[-1]:,.2f}")
+    print(f"Rebuilt in:    {elapsed * 1000:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild the account value over time from a portfolio file")
+    parser.add_argument("portfolio", nargs="?", default="portfolio.json")
+    parser.add_argument("--period", default="1y")
+    parser.add_argument("--interval", default="1d")
+    parser.add_argument("--benchmark", action="store_true", help="Time a rebuild on synthetic data instead")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark()
+        return
+
+    with open(args.portfolio, 'r') as f:
+        portfolio = json.load(f)
+    curve = portfolio_equity(portfolio, args.period, args.interval)
+    if curve is None:
+        print("No transactions yet.")
+        return
+    for when, value in zip(curve.times, curve.nav):
+        print(f"{when:%Y-%m-%d %H:%M}  ${value:,.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+import heapq
+import itertools
+import random
+import time
+import execution
+import portfolio_store
+
+# Order types
+LIMIT = "LIMIT"
+STOP = "STOP"
+STOP_LIMIT = "STOP_LIMIT"
+
+# Order states
+OPEN = "OPEN"
+FILLED = "FILLED"
+CANCELLED = "CANCELLED"
+REJECTED = "REJECTED"
+
+
+class Order:
+    """A resting limit, stop or stop-limit order"""
+
+    __slots__ = ("id", "symbol", "side", "order_type", "quantity", "limit_price", "stop_price",
+                 "status", "triggered", "fill_price")
+
+    def __init__(self, order_id, symbol, side, order_type, quantity, limit_price=None, stop_price=None):
+        self.id = order_id
+        self.symbol = symbol
+        self.side = side              # "BUY" or "SELL"
+        self.order_type = order_type
+        self.quantity = quantity
+        self.limit_price = limit_price
+        self.stop_price = stop_price
+        self.status = OPEN
+        self.triggered = False        # Stop-limit orders become limit orders once triggered
+        self.fill_price = None
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "symbol": self.symbol,
+            "side": self.side,
+            "order_type": self.order_type,
+            "quantity": self.quantity,
+            "limit_price": self.limit_price,
+            "stop_price": self.stop_price,
+            "triggered": self.triggered,
+        }
+
+
+class SymbolBook:
+    """Open orders of one symbol, kept in four heaps so a quote only touches crossed orders.
+
+    Each heap has the order that triggers first at the top:
+      buy_limits  - fill when price <= limit, highest limit first
+      sell_limits - fill when price >= limit, lowest limit first
+      buy_stops   - trigger when price >= stop, lowest stop first
+      sell_stops  - trigger when price <= stop, highest stop first
+    """
+
+    def __init__(self):
+        self.buy_limits = []
+        self.sell_limits = []
+        self.buy_stops = []
+        self.sell_stops = []
+
+    def add(self, order, seq):
+        if order.order_type == LIMIT or order.triggered:
+            if order.side == "BUY":
+                heapq.heappush(self.buy_limits, (-order.limit_price, seq, order))
+            else:
+                heapq.heappush(self.sell_limits, (order.limit_price, seq, order))
+        else:
+            if order.side == "BUY":
+                heapq.heappush(self.buy_stops, (order.stop_price, seq, order))
+            else:
+                heapq.heappush(self.sell_stops, (-order.stop_price, seq, order))
+
+    def pop_crossed(self, price):
+        """Remove and return the stop orders triggered by a quote"""
+        stops = _pop_while(self.buy_stops, lambda key: key <= price)
+        stops += _pop_while(self.sell_stops, lambda key: -key >= price)
+        return stops
+
+    def pop_limits(self, price):
+        """Remove and return the limit orders a quote can fill"""
+        limits = _pop_while(self.buy_limits, lambda key: -key >= price)
+        limits += _pop_while(self.sell_limits, lambda key: key <= price)
+        return limits
+
+
+def _pop_while(heap, crossed):
+    """Pop orders off a heap while the top one is crossed, skipping cancelled ones"""
+    popped = []
+    while heap:
+        key, _, order = heap[0]
+        if order.status != OPEN:
+            heapq.heappop(heap)  # Cancelled while resting
+            continue
+        if not crossed(key):
+            break
+        heapq.heappop(heap)
+        popped.append(order)
+    return popped
+
+
+class OrderBook:
+    """Resting orders for all symbols, filled through the same portfolio update path as market orders"""
+
+    def __init__(self, executor):
+        self.executor = executor      # ExecutionEngine that applies the fills
+        self.log = print
+        self.books = {}
+        self.orders = {}              # id -> open Order
+        self._ids = itertools.count(1)
+        self._seq = itertools.count()
+
+    def place(self, symbol, side, order_type, quantity, limit_price=None, stop_price=None):
+        """Place a resting order and return it"""
+        if side not in ("BUY", "SELL"):
+            raise ValueError(f"Unknown side: {side}")
+        if quantity <= 0:
+            raise ValueError("Quantity must be positive")
+        if order_type in (LIMIT, STOP_LIMIT) and (limit_price is None or limit_price <= 0):
+            raise ValueError("A limit price is required")
+        if order_type in (STOP, STOP_LIMIT) and (stop_price is None or stop_price <= 0):
+            raise ValueError("A stop price is required")
+        if order_type not in (LIMIT, STOP, STOP_LIMIT):
+            raise ValueError(f"Unknown order type: {order_type}")
+
+        order = Order(next(self._ids), symbol, side, order_type, quantity, limit_price, stop_price)
+        self._add(order)
+        return order
+
+    def cancel(self, order_id):
+        """Cancel an open order, returns False if it was not open"""
+        order = self.orders.pop(order_id, None)
+        if order is None:
+            return False
+        order.status = CANCELLED  # Its heap entry is dropped when it reaches the top
+        return True
+
+    def open_orders(self, symbol=None):
+        """Open orders, optionally for one symbol"""
+        return [order for order in self.orders.values() if symbol is None or order.symbol == symbol]
+
+    def symbols(self):
+        """Symbols that have open orders"""
+        return {order.symbol for order in self.orders.values()}
+
+    def on_quote(self, symbol, price):
+        """Fill every order crossed by a new quote and return the filled orders.
+
+        Only crossed orders are popped, so a quote costs O(k log n) for k
+        triggered orders out of n resting ones.
+        """
+        book = self.books.get(symbol)
+        if book is None:
+            return []
+
+        # Triggered stops fill at market, triggered stop-limits start resting as limits
+        crossed = []
+        for order in book.pop_crossed(price):
+            if order.order_type == STOP_LIMIT:
+                order.triggered = True
+                book.add(order, next(self._seq))
+            else:
+                crossed.append(order)
+        crossed += book.pop_limits(price)
+        if not crossed:
+            return []
+
+        # All fills of one quote go to the portfolio as a single batch
+        requests = []
+        for order in crossed:
+            self.orders.pop(order.id, None)
+            label = "STOP LIMIT" if order.order_type == STOP_LIMIT else order.order_type
+            requests.append(execution.OrderRequest(order.symbol, order.side, order.quantity, price,
+                                                   f"{label} {order.side}", 0.0))
+        orders_by_request = {id(request): order for request, order in zip(requests, crossed)}
+
+        result = self.executor.execute(requests)
+        for request, reason in result.rejected:
+            order = orders_by_request[id(request)]
+            order.status = REJECTED
+            self.log(f"Order {order.id}: {reason}")
+
+        filled = []
+        for request, order in zip(requests, crossed):
+            if order.status == OPEN:
+                order.status = FILLED
+                order.fill_price = price
+                filled.append(order)
+                self.log(f"Order {order.id}: {request.trade_type} {order.quantity} shares of {order.symbol} at ${price:.2f}")
+        return filled
+
+    def to_dicts(self):
+        """Open orders as plain dicts for saving with the portfolio"""
+        return [order.to_dict() for order in self.orders.values()]
+
+    def load(self, order_dicts):
+        """Replace the open orders with previously saved ones"""
+        self.books = {}
+        self.orders = {}
+        highest_id = 0
+        for data in order_dicts:
+            order = Order(data['id'], data['symbol'], data['side'], data['order_type'],
+                          data['quantity'], data.get('limit_price'), data.get('stop_price'))
+            order.triggered = data.get('triggered', False)
+            self._add(order)
+            highest_id = max(highest_id, order.id)
+        self._ids = itertools.count(highest_id + 1)
+
+    def _add(self, order):
+        self.orders[order.id] = order
+        self.books.setdefault(order.symbol, SymbolBook()).add(order, next(self._seq))
+
+
+def benchmark(order_count=100000, quote_count=1000, seed=1):
+    """Time quote matching with many resting orders against a plain scan of every order"""
+    rng = random.Random(seed)
+    portfolio = portfolio_store.new_portfolio(1e12)
+    portfolio['stocks']["BENCH"] = {'shares': 10 ** 9, 'avg_price': 100.0}
+    book = OrderBook(execution.ExecutionEngine(portfolio))
+    book.log = lambda message: None
+
+    # Resting orders on both sides of the starting price of 100
+    for _ in range(order_count):
+        side = rng.choice(("BUY", "SELL"))
+        order_type = rng.choice((LIMIT, STOP, STOP_LIMIT))
+        distance = rng.uniform(0.01, 50)
+        if order_type == LIMIT:
+            level = 100 - distance if side == "BUY" else 100 + distance
+            book.place("BENCH", side, LIMIT, 1, limit_price=level)
+        else:
+            stop = 100 + distance if side == "BUY" else 100 - distance
+            limit = stop + 0.5 if side == "BUY" else stop - 0.5
+            book.place("BENCH", side, order_type, 1, limit_price=limit, stop_price=stop)
+
+    price = 100.0
+    quotes = []
+    for _ in range(quote_count):
+        price = min(max(price + rng.gauss(0, 0.05), 1.0), 200.0)
+        quotes.append(price)
+
+    # Reference: check every open order on every quote
+    orders = book.open_orders("BENCH")
+    sample = quotes[:20]
+    start = time.perf_counter()
+    for quote in sample:
+        crossed = [order for order in orders
+                   if (order.side == "BUY" and (order.stop_price or 0) <= quote <= (order.limit_price or 1e18))
+                   or (order.side == "SELL" and (order.stop_price or 1e18) >= quote >= (order.limit_price or 0))]
+    scan_seconds = (time.perf_counter() - start) / len(sample)
+
+    start = time.perf_counter()
+    fills = 0
+    for quote in quotes:
+        fills += len(book.on_quote("BENCH", quote))
+    heap_seconds = (time.perf_counter() - start) / quote_count
+
+    print(f"Open orders:      {order_count:,}")
+    print(f"Quotes:           {quote_count:,}  fills: {fills:,}  still open: {len(book.orders):,}")
+    print(f"Heap matching:    {heap_seconds * 1e6:.1f} us per quote")
+    print(f"Full scan:        {scan_seconds * 1e6:.1f} us per quote")
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,250 @@
+import json
+import os
+from contextlib import contextmanager
+import clock
+import metrics
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+DEFAULT_FILE = "portfolio.json"
+DEFAULT_BALANCE = 100000.00
+
+
+def new_portfolio(initial_balance=DEFAULT_BALANCE):
+    """Create a new portfolio with default values"""
+    return {
+        "cash_balance": initial_balance,
+        "stocks": {},
+        "transaction_history": []
+    }
+
+
+def record_buy(portfolio, symbol, quantity, price, trade_type="BUY", commission=None):
+    """Add bought shares to a portfolio, deduct the cash and log the transaction"""
+    total_cost = quantity * price
+    stocks = portfolio['stocks']
+
+    if symbol in stocks:
+        # Update existing position with a new average price
+        current_shares = stocks[symbol]['shares']
+        current_avg_price = stocks[symbol]['avg_price']
+        new_shares = current_shares + quantity
+        stocks[symbol]['shares'] = new_shares
+        stocks[symbol]['avg_price'] = ((current_shares * current_avg_price) + total_cost) / new_shares
+    else:
+        stocks[symbol] = {
+            'shares': quantity,
+            'avg_price': price
+        }
+
+    portfolio['cash_balance'] -= total_cost
+    return _log_transaction(portfolio, trade_type, symbol, quantity, price, total_cost, commission)
+
+
+def record_sell(portfolio, symbol, quantity, price, trade_type="SELL", commission=None):
+    """Remove sold shares from a portfolio, add the cash and log the transaction"""
+    total_value = quantity * price
+    stocks = portfolio['stocks']
+
+    if quantity == stocks[symbol]['shares']:
+        # Remove the stock if selling all shares
+        del stocks[symbol]
+    else:
+        stocks[symbol]['shares'] -= quantity
+
+    portfolio['cash_balance'] += total_value
+    return _log_transaction(portfolio, trade_type, symbol, quantity, price, total_value, commission)
+
+
+def _log_transaction(portfolio, trade_type, symbol, quantity, price, total, commission):
+    transaction = {
+        'date': clock.now().strftime("%Y-%m-%d %H:%M:%S"),
+        'type': trade_type,
+        'symbol': symbol,
+        'shares': quantity,
+        'price': price,
+        'total': total
+    }
+    if commission is not None:
+        transaction['commission'] = commission
+    portfolio['transaction_history'].append(transaction)
+    return transaction
+
+
+class PortfolioStore:
+    """Portfolio file shared by the GUI and the headless auto-trader.
+
+    Loading and saving happen under an exclusive lock on a ".lock" file next
+    to the portfolio. A save first checks whether another process has written
+    the file since this one last read or wrote it. If so, the other process's
+    new transactions, open orders and settings are merged in before writing,
+    so neither side's changes are lost.
+    """
+
+    def __init__(self, path=DEFAULT_FILE, initial_balance=DEFAULT_BALANCE):
+        self.path = path
+        self.initial_balance = initial_balance
+        self.signature = None   # (mtime, size) of the file when we last read or wrote it
+        self.synced = 0         # Length of the transaction history both sides had at that point
+        self.synced_extras = {}  # Open orders and settings as of that point, to tell which side changed them
+
+    @contextmanager
+    def locked(self):
+        """Hold the cross-process lock on the portfolio file"""
+        with open(self.path + ".lock", 'a+') as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            else:
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+                else:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def load(self):
+        """Load the portfolio from file or create a new one"""
+        with self.locked():
+            portfolio = self._read()
+            if portfolio is None:
+                portfolio = new_portfolio(self.initial_balance)
+                self._write(portfolio)
+            return portfolio
+
+    def save(self, portfolio):
+        """Save the portfolio, merging in trades another process saved since we last synced.
+
+        Returns True when the portfolio was changed by a merge, so the caller
+        can rebuild whatever it derives from it.
+        """
+        with self.locked():
+            merged = False
+            if self.signature is not None and self._signature() not in (None, self.signature):
+                merged = self._merge(portfolio)
+            self._write(portfolio)
+            return merged
+
+    def changed(self):
+        """Check whether another process has written the file since we last read or wrote it"""
+        signature = self._signature()
+        return signature is not None and signature != self.signature
+
+    def _read(self):
+        try:
+            with metrics.span("persist", op="load"), open(self.path, 'r') as f:
+                portfolio = json.load(f)
+        except (OSError, ValueError):
+            return None
+        self._synced_with(portfolio)
+        return portfolio
+
+    def _write(self, portfolio):
+        """Replace the file in one step so readers never see half of it"""
+        temp_path = self.path + ".tmp"
+        with metrics.span("persist", op="save"):
+            with open(temp_path, 'w') as f:
+                json.dump(portfolio, f, indent=4)
+            os.replace(temp_path, self.path)
+        self._synced_with(portfolio)
+
+    def _synced_with(self, portfolio):
+        self.signature = self._signature()
+        self.synced = len(portfolio['transaction_history'])
+        self.synced_extras = json.loads(json.dumps(_extras(portfolio)))
+
+    def _merge(self, portfolio):
+        """Rebase our unsaved changes onto the file's portfolio, in place.
+
+        Our new transactions are applied on top of the file's. Open orders and
+        settings keep the file's value unless we changed them since we synced.
+        Returns True when anything from the file made it into the portfolio.
+        """
+        history = portfolio['transaction_history']
+        if len(history) < self.synced:
+            return False    # The portfolio was reset here, it replaces the file as it is
+        on_disk = self._read_unlocked()
+        if on_disk is None:
+            return False
+
+        theirs = on_disk['transaction_history'][self.synced:]
+        for transaction in history[self.synced:]:
+            apply_transaction(on_disk, transaction)
+
+        ours = _extras(portfolio)
+        for key in set(ours) | set(_extras(on_disk)):
+            if ours.get(key) != self.synced_extras.get(key):
+                # Changed here since we synced, ours wins
+                if key in ours:
+                    on_disk[key] = ours[key]
+                else:
+                    on_disk.pop(key, None)
+
+        merged = bool(theirs) or _extras(on_disk) != ours
+        portfolio.clear()
+        portfolio.update(on_disk)
+        if merged:
+            print(f"Merged changes saved by another process ({len(theirs)} transactions).")
+        return merged
+
+    def _read_unlocked(self):
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _signature(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+
+def _extras(portfolio):
+    """Everything in a portfolio besides the trades, e.g. open orders"""
+    return {key: value for key, value in portfolio.items()
+            if key not in ("cash_balance", "stocks", "transaction_history")}
+
+
+def apply_transaction(portfolio, transaction):
+    """Apply an already logged transaction to another copy of the portfolio and append it.
+
+    A sale of more shares than the copy holds is cut to what it holds, and
+    dropped when it holds none. Returns the transaction as applied, or None.
+    """
+    symbol = transaction['symbol']
+    shares = transaction['shares']
+    stocks = portfolio['stocks']
+    if transaction['type'].endswith("BUY"):
+        position = stocks.get(symbol)
+        if position is None:
+            stocks[symbol] = {'shares': shares, 'avg_price': transaction['price']}
+        else:
+            total_shares = position['shares'] + shares
+            position['avg_price'] = (position['shares'] * position['avg_price'] + transaction['total']) / total_shares
+            position['shares'] = total_shares
+        portfolio['cash_balance'] -= transaction['total']
+    else:
+        position = stocks.get(symbol)
+        held = position['shares'] if position else 0
+        if shares > held:
+            # Both processes sold the same shares, only what was left can be sold and paid for
+            print(f"Warning: both processes sold {symbol}, this sale of {shares} shares is cut to the {held} left")
+            if not held:
+                return None
+            transaction = dict(transaction, shares=held, total=held * transaction['price'])
+        if held == transaction['shares']:
+            del stocks[symbol]
+        else:
+            position['shares'] -= transaction['shares']
+        portfolio['cash_balance'] += transaction['total']
+    portfolio['transaction_history'].append(transaction)
+    return transaction
@@ -0,0 +1,158 @@
+import argparse
+import time
+import numpy as np
+import analytics
+import auto_trader
+import backtest
+import clock
+import events
+import execution
+import lots
+import metrics
+import portfolio_store
+import strategies
+
+
+class Replay:
+    """Feeds historical bars onto the event bus, as live quotes would arrive, at a multiple of real time.
+
+    Bars are paced by the typical spacing between them rather than their
+    timestamps, so nights and weekends in the file do not stall the replay.
+    When a SteppedClock is given it is moved to each bar's time before the bar
+    is published, so trades are dated and daily limits counted in market time.
+    """
+
+    def __init__(self, bus, symbol, bars, speed=1000.0, timefunc=time.perf_counter, market_clock=None):
+        self.bus = bus
+        self.symbol = symbol
+        self.speed = speed          # Multiple of real time, None replays as fast as possible
+        self.timefunc = timefunc
+        self.market_clock = market_clock
+
+        # Files with only a Close column replay as flat bars
+        self.bars = bars.copy()
+        for column in ("Open", "High", "Low"):
+            if column not in self.bars:
+                self.bars[column] = self.bars['Close']
+        if "Volume" not in self.bars:
+            self.bars["Volume"] = 0
+
+        self.times = backtest.bar_seconds(bars.index, len(bars))
+        self.interval = float(np.median(np.diff(self.times))) if len(bars) > 1 else 0.0
+        if not self.interval > 0:
+            self.interval = 60.0    # One bar or mostly repeated timestamps, pace as one-minute bars
+        self.columns = [self.bars[column].to_numpy(dtype=float)
+                        for column in ("Open", "High", "Low", "Close", "Volume")]
+
+        self.position = 0           # Bars published so far
+        self.price = None
+        self.started = None
+        self.finished = None
+
+    @property
+    def done(self):
+        return self.position >= len(self.times)
+
+    def due(self):
+        """Number of bars that should have been published by now"""
+        if self.speed is None:
+            return len(self.times)
+        elapsed = self.timefunc() - self.started
+        return min(len(self.times), int(elapsed * self.speed / self.interval) + 1)
+
+    def next_delay(self):
+        """Seconds of real time until the next bar is due"""
+        if self.speed is None or self.done:
+            return 0.0
+        due_at = self.started + self.position * self.interval / self.speed
+        return max(0.0, due_at - self.timefunc())
+
+    def step(self, max_ticks=None):
+        """Publish every bar that is due, at most max_ticks of them, and return how many were published"""
+        if self.started is None:
+            self.started = self.timefunc()
+
+        end = self.due()
+        if max_ticks is not None:
+            end = min(end, self.position + max_ticks)
+
+        opens, highs, lows, closes, volumes = self.columns
+        index = self.bars.index
+        for i in range(self.position, end):
+            if self.market_clock is not None:
+                self.market_clock.set(self.times[i])
+            self.price = closes[i]
+            self.bus.publish(events.QuoteTick(self.symbol, closes[i], self.times[i]))
+            self.bus.publish(events.BarClosed(self.symbol, index[i], opens[i], highs[i], lows[i],
+                                              closes[i], volumes[i]))
+        published = end - self.position
+        self.position = end
+
+        if self.done and self.finished is None:
+            self.finished = self.timefunc()
+        return published
+
+    def ticks_per_second(self):
+        """Bars published per second of real time so far"""
+        if self.started is None:
+            return 0.0
+        elapsed = (self.finished or self.timefunc()) - self.started
+        return self.position / elapsed if elapsed > 0 else 0.0
+
+    def run(self, sleepfunc=time.sleep):
+        """Publish every bar, sleeping between them to keep to the replay speed"""
+        while not self.done:
+            self.step()
+            delay = self.next_delay()
+            if delay > 0:
+                sleepfunc(delay)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay historical bars through the auto-trader")
+    parser.add_argument("csv", help="CSV file with a date column and a Close column")
+    parser.add_argument("--symbol", default="REPLAY")
+    parser.add_argument("--speed", type=float, default=0, help="Multiple of real time, 0 for as fast as possible")
+    parser.add_argument("--strategy", default="ma_crossover", choices=sorted(strategies.STRATEGIES))
+    parser.add_argument("--quantity", type=int, default=10)
+    parser.add_argument("--max-investment", type=float, default=10000.0)
+    parser.add_argument("--cash", type=float, default=100000.0)
+    args = parser.parse_args()
+
+    bars = backtest.load_csv(args.csv)
+    market_clock = clock.SteppedClock(backtest.bar_seconds(bars.index, len(bars))[0])
+    clock.set_clock(market_clock)
+    bus = events.EventBus()
+    executor = execution.ExecutionEngine(portfolio_store.new_portfolio(args.cash), bus=bus,
+                                         lots=lots.LotTracker())
+    trader = auto_trader.AutoTrader(executor, args.symbol.upper(), auto_quantity=args.quantity,
+                                    max_investment=args.max_investment,
+                                    strategy=strategies.get_strategy(args.strategy))
+    performance = analytics.PerformanceTracker()
+
+    def on_quote(event):
+        executor.risk.on_price(event.symbol, event.price)
+        executor.lots.on_price(event.symbol, event.price)
+        performance.on_value(executor.portfolio['cash_balance'] + executor.lots.value_total, event.time)
+
+    bus.subscribe(events.QuoteTick, on_quote, name="valuation")
+    bus.subscribe(events.OrderFilled, lambda event: performance.on_fill(event.transaction), name="analytics")
+    bus.subscribe(events.BarClosed, trader.on_bar, name="auto-trader")
+
+    replay = Replay(bus, trader.symbol, bars, speed=args.speed or None, market_clock=market_clock)
+    replay.run()
+
+    portfolio = executor.portfolio
+    holdings = sum(position['shares'] for position in portfolio['stocks'].values()) * (replay.price or 0.0)
+    print(f"Bars replayed:  {replay.position:,}")
+    print(f"Ticks/second:   {replay.ticks_per_second():,.0f}")
+    print(f"Trades:         {len(portfolio['transaction_history'])}")
+    print(f"Realized P&L:   ${executor.lots.realized_total:,.2f}")
+    print(f"Final value:    ${portfolio['cash_balance'] + holdings:,.2f}")
+    print(analytics.format_summary(performance.summary()))
+    print("Stage timings:")
+    print(metrics.format_summary(metrics.get_metrics().summary()))
+
+
+if __name__ == "__main__":
+    main()
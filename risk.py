@@ -0,0 +1,174 @@
+import clock
+from collections import deque, namedtuple
+from datetime import datetime
+
+# Portfolio-level limits, None means no limit
+#   max_order_value     - value of a single order
+#   max_symbol_exposure - value held in one symbol after the order
+#   max_gross_exposure  - total absolute value of all positions after the order
+#   max_net_exposure    - long minus short value of all positions after the order
+#   max_daily_trades    - trades of any kind in the rolling window
+RiskLimits = namedtuple("RiskLimits", ["max_order_value", "max_symbol_exposure", "max_gross_exposure",
+                                       "max_net_exposure", "max_daily_trades"])
+RiskLimits.__new__.__defaults__ = (None,) * len(RiskLimits._fields)
+
+
+class PendingOrders:
+    """Orders accepted earlier in a batch but not filled yet, so later checks in the batch count them"""
+
+    __slots__ = ("shares", "exposure", "gross_change", "net_change", "trades", "total_trades")
+
+    def __init__(self):
+        self.shares = {}          # symbol -> change in shares
+        self.exposure = {}        # symbol -> exposure after the pending orders
+        self.gross_change = 0.0
+        self.net_change = 0.0
+        self.trades = {}          # (symbol, trade type) -> pending trades
+        self.total_trades = 0
+
+
+class RiskManager:
+    """Pre-trade checks backed by running exposure totals and rolling trade counts.
+
+    Exposures are updated as fills and quotes arrive, and trade counts live in
+    deques that drop old trades from the left, so every check is O(1) no matter
+    how long the transaction history is.
+    """
+
+    def __init__(self, limits=None, window_seconds=86400, timefunc=clock.timestamp):
+        self.limits = limits or RiskLimits()
+        self.window_seconds = window_seconds
+        self.timefunc = timefunc
+        self.shares = {}
+        self.prices = {}
+        self.exposure = {}
+        self.gross_exposure = 0.0
+        self.net_exposure = 0.0
+        self.windows = {}         # (symbol, trade type) -> deque of trade times
+        self.all_trades = deque()  # times of every trade
+
+    def check(self, symbol, side, quantity, price, trade_type=None, max_order_value=None, max_trades=None,
+              pending=None):
+        """Return (ok, reason) for a proposed order.
+
+        max_order_value and max_trades are the caller's own limits (for example
+        one auto-trader's max investment and daily cap), checked on top of the
+        portfolio-level limits. max_trades counts trades of trade_type in this symbol.
+        pending holds the orders accepted earlier in the same batch (see reserve).
+        """
+        now = self.timefunc()
+        value = quantity * price
+        limits = self.limits
+
+        for limit in (max_order_value, limits.max_order_value):
+            if limit is not None and value > limit:
+                return False, f"Cost exceeds max investment limit (${value:.2f} > ${limit:.2f})"
+
+        pending = pending or PendingOrders()
+        if max_trades is not None:
+            count = self.trade_count(symbol, trade_type or side, now) + pending.trades.get((symbol, trade_type or side), 0)
+            if count >= max_trades:
+                return False, f"{'Buy' if side == 'BUY' else 'Sell'} limit reached for the day."
+
+        if limits.max_daily_trades is not None:
+            self._prune(self.all_trades, now)
+            if len(self.all_trades) + pending.total_trades >= limits.max_daily_trades:
+                return False, "Portfolio trade limit reached for the day."
+
+        old_exposure, new_exposure, gross, net = self._projected(symbol, side, quantity, price, pending)
+
+        if side == "BUY":
+            if limits.max_symbol_exposure is not None and abs(new_exposure) > limits.max_symbol_exposure:
+                return False, f"Exposure to {symbol} would exceed ${limits.max_symbol_exposure:.2f}"
+            if limits.max_gross_exposure is not None and gross > limits.max_gross_exposure:
+                return False, f"Gross exposure would exceed ${limits.max_gross_exposure:.2f}"
+            if limits.max_net_exposure is not None and abs(net) > limits.max_net_exposure:
+                return False, f"Net exposure would exceed ${limits.max_net_exposure:.2f}"
+        return True, None
+
+    def reserve(self, pending, symbol, side, quantity, price, trade_type=None):
+        """Add an accepted order to the batch's pending orders"""
+        old_exposure, new_exposure, _, _ = self._projected(symbol, side, quantity, price, pending)
+        pending.shares[symbol] = pending.shares.get(symbol, 0) + (quantity if side == "BUY" else -quantity)
+        pending.exposure[symbol] = new_exposure
+        pending.gross_change += abs(new_exposure) - abs(old_exposure)
+        pending.net_change += new_exposure - old_exposure
+        key = (symbol, trade_type or side)
+        pending.trades[key] = pending.trades.get(key, 0) + 1
+        pending.total_trades += 1
+
+    def _projected(self, symbol, side, quantity, price, pending):
+        """Exposure to the symbol before and after the order, valued at the order price, and the totals after it"""
+        change = quantity if side == "BUY" else -quantity
+        old_exposure = pending.exposure.get(symbol, self.exposure.get(symbol, 0.0))
+        new_exposure = (self.shares.get(symbol, 0) + pending.shares.get(symbol, 0) + change) * price
+        gross = self.gross_exposure + pending.gross_change - abs(old_exposure) + abs(new_exposure)
+        net = self.net_exposure + pending.net_change - old_exposure + new_exposure
+        return old_exposure, new_exposure, gross, net
+
+    def trade_count(self, symbol, trade_type, now=None):
+        """Trades of one type in one symbol within the rolling window"""
+        window = self.windows.get((symbol, trade_type))
+        if not window:
+            return 0
+        self._prune(window, self.timefunc() if now is None else now)
+        return len(window)
+
+    def on_fill(self, transaction, when=None):
+        """Update the totals and windows after a trade"""
+        when = self.timefunc() if when is None else when
+        symbol = transaction['symbol']
+        change = transaction['shares'] if transaction['type'].endswith("BUY") else -transaction['shares']
+        self.shares[symbol] = self.shares.get(symbol, 0) + change
+        self.on_price(symbol, transaction['price'])
+        if self.shares[symbol] == 0:
+            self._set_exposure(symbol, 0.0)
+            del self.shares[symbol]
+
+        self.windows.setdefault((symbol, transaction['type']), deque()).append(when)
+        self.all_trades.append(when)
+
+    def on_price(self, symbol, price):
+        """Revalue one symbol's exposure at a new price"""
+        self.prices[symbol] = price
+        if symbol in self.shares:
+            self._set_exposure(symbol, self.shares[symbol] * price)
+
+    def rebuild(self, portfolio):
+        """Recompute everything from a portfolio, e.g. after it was reloaded from disk"""
+        self.shares = {}
+        self.exposure = {}
+        self.gross_exposure = 0.0
+        self.net_exposure = 0.0
+        for symbol, position in portfolio['stocks'].items():
+            self.shares[symbol] = position['shares']
+            price = self.prices.get(symbol) or position.get('current_price') or position['avg_price']
+            self.on_price(symbol, price)
+
+        # Only the trades still inside the window, found by walking back from the newest
+        self.windows = {}
+        self.all_trades = deque()
+        cutoff = self.timefunc() - self.window_seconds
+        for transaction in reversed(portfolio['transaction_history']):
+            try:
+                when = datetime.strptime(transaction['date'], "%Y-%m-%d %H:%M:%S").timestamp()
+            except (KeyError, ValueError):
+                continue
+            if when <= cutoff:
+                break
+            self.windows.setdefault((transaction['symbol'], transaction['type']), deque()).appendleft(when)
+            self.all_trades.appendleft(when)
+
+    def _set_exposure(self, symbol, exposure):
+        old = self.exposure.get(symbol, 0.0)
+        self.gross_exposure += abs(exposure) - abs(old)
+        self.net_exposure += exposure - old
+        if exposure:
+            self.exposure[symbol] = exposure
+        else:
+            self.exposure.pop(symbol, None)
+
+    def _prune(self, window, now):
+        cutoff = now - self.window_seconds
+        while window and window[0] <= cutoff:
+            window.popleft()
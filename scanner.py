@@ -0,0 +1,92 @@
+import argparse
+import os
+import time
+from collections import namedtuple
+import numpy as np
+import signals
+import strategies
+
+# Result of scanning a watchlist on its latest bar
+#   buy / sell   - lists of (symbol, strength), strongest first
+#   bullish / bearish - symbols in a trend without a fresh crossover
+#   scan_seconds - time spent evaluating the indicators
+ScanResult = namedtuple("ScanResult", ["buy", "sell", "bullish", "bearish", "scan_seconds"])
+
+
+def scan(symbols, closes, strategy=None):
+    """Evaluate a strategy's rules for every symbol in one vectorized pass"""
+    if strategy is None:
+        strategy = strategies.MACrossoverStrategy()
+
+    start = time.perf_counter()
+    closes = np.asarray(closes, dtype=float)
+
+    # Only the bars the strategy needs to judge the last bar
+    result = strategy.run({'Close': closes[:, -strategy.lookback:]})
+    codes = result.codes[:, -1]
+    strength = np.nan_to_num(result.strength[:, -1])
+    trend = result.trend[:, -1]
+
+    bullish = (trend > 0) & (codes == signals.HOLD_CODE)
+    bearish = (trend < 0) & (codes == signals.HOLD_CODE)
+    elapsed = time.perf_counter() - start
+
+    symbols = np.asarray(symbols)
+    order = np.argsort(-strength)
+    ranked_codes = codes[order]
+    buy = [(symbols[i], float(strength[i])) for i in order[ranked_codes == signals.BUY_CODE]]
+    sell = [(symbols[i], float(strength[i])) for i in order[ranked_codes == signals.SELL_CODE]]
+    return ScanResult(buy, sell, symbols[bullish].tolist(), symbols[bearish].tolist(), elapsed)
+
+
+def load_watchlist(path):
+    """Read one symbol per line from a watchlist file, ignoring blanks and # comments"""
+    symbols = []
+    with open(path, 'r') as f:
+        for line in f:
+            symbol = line.split("#")[0].strip().upper()
+            if symbol and symbol not in symbols:
+                symbols.append(symbol)
+    return symbols
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scan a watchlist for trading signals")
+    parser.add_argument("watchlist", help="File with one symbol per line, or a comma separated list")
+    parser.add_argument("--period", default="1y")
+    parser.add_argument("--interval", default="1d")
+    parser.add_argument("--strategy", default="ma_crossover", choices=sorted(strategies.STRATEGIES))
+    parser.add_argument("--short", type=int, default=20)
+    parser.add_argument("--long", type=int, default=50)
+    args = parser.parse_args()
+
+    import market_data
+
+    if os.path.exists(args.watchlist):
+        symbols = load_watchlist(args.watchlist)
+    else:
+        symbols = [s.strip().upper() for s in args.watchlist.split(",") if s.strip()]
+
+    start = time.perf_counter()
+    closes, _ = market_data.get_close_matrix(symbols, period=args.period, interval=args.interval)
+    load_seconds = time.perf_counter() - start
+
+    if args.strategy == "ma_crossover":
+        strategy = strategies.MACrossoverStrategy(args.short, args.long)
+    else:
+        strategy = strategies.get_strategy(args.strategy)
+    result = scan(symbols, closes, strategy)
+
+    print(f"BUY candidates ({len(result.buy)}):")
+    for symbol, strength in result.buy:
+        print(f"  {symbol:<8} strength {strength:.4f}")
+    print(f"SELL candidates ({len(result.sell)}):")
+    for symbol, strength in result.sell:
+        print(f"  {symbol:<8} strength {strength:.4f}")
+    print(f"Bullish trend: {len(result.bullish)}  Bearish trend: {len(result.bearish)}")
+    print(f"Loaded {closes.shape[0]} symbols x {closes.shape[1]} bars in {load_seconds:.2f}s, "
+          f"scanned in {result.scan_seconds * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
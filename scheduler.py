@@ -0,0 +1,97 @@
+import heapq
+import itertools
+import clock
+
+
+class HeapScheduler:
+    """One scheduler for many repeating jobs, kept in a heap ordered by due time.
+
+    Adding or rescheduling a job costs O(log n). Cancelled or replaced jobs are
+    left in the heap and skipped when they come up, so cancelling is O(1).
+    """
+
+    def __init__(self, timefunc=clock.timestamp, sleepfunc=clock.sleep):
+        self.timefunc = timefunc
+        self.sleepfunc = sleepfunc
+        self._heap = []
+        self._jobs = {}   # key -> (interval, callback, generation)
+        self._counter = itertools.count()
+        self._running = False
+
+    def schedule(self, key, interval, callback, first_delay=0):
+        """Run callback every interval seconds under key, replacing any job with the same key"""
+        generation = next(self._counter)
+        self._jobs[key] = (interval, callback, generation)
+        heapq.heappush(self._heap, (self.timefunc() + first_delay, generation, key))
+
+    def cancel(self, key):
+        """Stop the job registered under key"""
+        self._jobs.pop(key, None)
+
+    def clear(self):
+        """Stop all jobs"""
+        self._jobs.clear()
+        self._heap = []
+
+    def __len__(self):
+        return len(self._jobs)
+
+    def __contains__(self, key):
+        return key in self._jobs
+
+    def next_delay(self):
+        """Seconds until the next job is due (None when nothing is scheduled)"""
+        self._drop_stale()
+        if not self._heap:
+            return None
+        return max(0.0, self._heap[0][0] - self.timefunc())
+
+    def run_pending(self):
+        """Run every job that is due now and queue its next run, returns how many ran"""
+        ran = 0
+        now = self.timefunc()
+        while self._heap and self._heap[0][0] <= now:
+            due, generation, key = heapq.heappop(self._heap)
+            job = self._jobs.get(key)
+            if job is None or job[2] != generation:
+                continue  # Cancelled or replaced
+
+            interval, callback, _ = job
+            # Queue the next run first so a slow callback does not drift the schedule,
+            # runs missed while the process was busy are skipped rather than replayed
+            next_due = due + interval
+            if next_due <= now:
+                next_due = now + interval
+            next_generation = next(self._counter)
+            self._jobs[key] = (interval, callback, next_generation)
+            heapq.heappush(self._heap, (next_due, next_generation, key))
+
+            try:
+                callback()
+            except Exception as e:
+                print(f"Scheduled job {key} failed: {e}")
+            ran += 1
+        return ran
+
+    def run(self):
+        """Run jobs until stop() is called or no jobs are left"""
+        self._running = True
+        while self._running:
+            delay = self.next_delay()
+            if delay is None:
+                break
+            if delay > 0:
+                self.sleepfunc(delay)
+            self.run_pending()
+
+    def stop(self):
+        """Make run() return after the current job"""
+        self._running = False
+
+    def _drop_stale(self):
+        while self._heap:
+            _, generation, key = self._heap[0]
+            job = self._jobs.get(key)
+            if job is not None and job[2] == generation:
+                return
+            heapq.heappop(self._heap)
@@ -0,0 +1,82 @@
+from collections import namedtuple
+import numpy as np
+
+# Signal actions
+BUY = "BUY"
+SELL = "SELL"
+HOLD = "HOLD"
+
+# Action codes used in signal arrays
+BUY_CODE = 1
+HOLD_CODE = 0
+SELL_CODE = -1
+
+# A trading signal for one bar, produced by the indicator layer.
+#   action   - BUY, SELL or HOLD
+#   strength - relative gap between the fast and slow averages (0 when unknown)
+#   source   - name of the indicator that produced the signal
+#   bar_time - timestamp of the bar the signal was computed on
+#   trend    - "bullish", "bearish" or "neutral" (used for display only)
+#   reason   - short human readable explanation
+Signal = namedtuple("Signal", ["action", "strength", "source", "bar_time", "trend", "reason"])
+
+
+def moving_average(values, window):
+    """Trailing simple moving average along the last axis, NaN until the window is full"""
+    values = np.asarray(values, dtype=float)
+    result = np.full(values.shape, np.nan)
+    if values.shape[-1] < window:
+        return result
+
+    # Rolling sums from a single cumulative sum instead of a Python loop
+    csum = np.cumsum(values, axis=-1)
+    result[..., window - 1] = csum[..., window - 1]
+    result[..., window:] = csum[..., window:] - csum[..., :-window]
+    result[..., window - 1:] /= window
+    return result
+
+
+def crossover_codes(fast, slow):
+    """Return BUY_CODE where fast crosses above slow, SELL_CODE where it crosses below"""
+    fast = np.asarray(fast, dtype=float)
+    slow = np.asarray(slow, dtype=float)
+    codes = np.zeros(fast.shape, dtype=np.int8)
+
+    # Compare each bar with the previous one (NaN comparisons are False)
+    above_now = fast[..., 1:] > slow[..., 1:]
+    below_now = fast[..., 1:] < slow[..., 1:]
+    was_not_above = fast[..., :-1] <= slow[..., :-1]
+    was_not_below = fast[..., :-1] >= slow[..., :-1]
+
+    codes[..., 1:][above_now & was_not_above] = BUY_CODE
+    codes[..., 1:][below_now & was_not_below] = SELL_CODE
+    return codes
+
+
+def rsi(values, period=14):
+    """Relative strength index along the last axis using simple averages of gains and losses"""
+    values = np.asarray(values, dtype=float)
+    result = np.full(values.shape, np.nan)
+    if values.shape[-1] <= period:
+        return result
+
+    deltas = np.diff(values, axis=-1)
+    avg_gain = moving_average(np.clip(deltas, 0, None), period)
+    avg_loss = moving_average(np.clip(-deltas, 0, None), period)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        result[..., 1:] = np.where(avg_loss == 0, 100.0, 100 - 100 / (1 + avg_gain / avg_loss))
+    result[..., 1:][np.isnan(avg_gain)] = np.nan
+    return result
+
+
+def describe_signal(signal):
+    """Turn a signal into the recommendation text shown in the app"""
+    if signal.bar_time is None:
+        return f"RECOMMENDATION: {signal.reason}"
+    if signal.action != HOLD:
+        return f"RECOMMENDATION: {signal.action} ({signal.reason})"
+    if signal.trend == "bullish":
+        return "RECOMMENDATION: HOLD/BUY (Bullish trend)"
+    if signal.trend == "bearish":
+        return "RECOMMENDATION: HOLD/SELL (Bearish trend)"
+    return "RECOMMENDATION: HOLD (Neutral trend)"
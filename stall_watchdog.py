@@ -0,0 +1,193 @@
+import sys
+import threading
+import time
+import traceback
+import tkinter
+from collections import Counter
+import metrics
+
+DESCRIPTIONS = {
+    "event_loop_lag_seconds": "How late the Tk heartbeat ran, i.e. how long the event loop was blocked",
+    "ui_stalls_total": "Event loop stalls longer than the watchdog threshold",
+}
+metrics.DESCRIPTIONS.update(DESCRIPTIONS)
+
+# Frames from these files say nothing about which app code was blocking
+_SKIP_FILES = ("tkinter", "stall_watchdog.py", "threading.py")
+
+
+class StallWatchdog:
+    """Finds what blocks the Tk event loop.
+
+    A heartbeat scheduled with after() measures how late the loop gets to it.
+    Every Tk callback (button commands, bindings and after() jobs) is wrapped
+    to time it and to know which one is running. A sampler thread grabs the
+    main thread's stack while the heartbeat is overdue, so each stall is blamed
+    on the callback and the lines of code that were running during it.
+    """
+
+    def __init__(self, threshold=0.2, heartbeat=0.05, sample_interval=0.02, stack_depth=6):
+        self.threshold = threshold              # Seconds the loop may be blocked before it counts as a stall
+        self.heartbeat = heartbeat              # Seconds between heartbeats
+        self.sample_interval = sample_interval  # Seconds between stack samples during a stall
+        self.stack_depth = stack_depth
+        self.root = None
+        self.main_thread = threading.get_ident()
+        self.active = []            # Names of the callbacks running on the main thread, innermost last
+        self.callbacks = {}         # name -> [calls, total seconds, max seconds]
+        self.stalls = {}            # name -> [stalls, total seconds, max seconds, Counter of stacks]
+        self.samples = []           # (callback, stack) sampled during the current stall
+        self.lock = threading.Lock()
+        self.last_beat = None
+        self.running = False
+        self._original_wrapper = None
+
+    def install(self):
+        """Wrap Tk callbacks, call this before the widgets are created"""
+        if self._original_wrapper is not None:
+            return
+        watchdog = self
+        original = self._original_wrapper = tkinter.CallWrapper
+
+        class TimedCallWrapper(original):
+            def __call__(self, *args):
+                return watchdog._run(self, original.__call__, args)
+
+        tkinter.CallWrapper = TimedCallWrapper
+
+    def uninstall(self):
+        if self._original_wrapper is not None:
+            tkinter.CallWrapper = self._original_wrapper
+            self._original_wrapper = None
+
+    def start(self, root):
+        """Start the heartbeat on root's event loop and the stack sampler thread"""
+        self.root = root
+        self.main_thread = threading.get_ident()
+        self.running = True
+        self.last_beat = time.perf_counter()
+        root.after(int(self.heartbeat * 1000), self._beat)
+        threading.Thread(target=self._sample, name="stall-watchdog", daemon=True).start()
+
+    def stop(self):
+        self.running = False
+
+    def _run(self, wrapper, call, args):
+        name = describe_callback(wrapper.func)
+        self.active.append(name)
+        start = time.perf_counter()
+        try:
+            return call(wrapper, *args)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.active.pop()
+            stats = self.callbacks.get(name)
+            if stats is None:
+                stats = self.callbacks[name] = [0, 0.0, 0.0]
+            stats[0] += 1
+            stats[1] += elapsed
+            stats[2] = max(stats[2], elapsed)
+
+    def _beat(self):
+        if not self.running:
+            return
+        now = time.perf_counter()
+        lag = max(0.0, now - self.last_beat - self.heartbeat)
+        self.last_beat = now
+        metrics.observe("event_loop_lag_seconds", lag)
+        if lag > self.threshold:
+            self._record_stall(lag)
+        self.root.after(int(self.heartbeat * 1000), self._beat)
+
+    def _record_stall(self, lag):
+        with self.lock:
+            samples = self.samples
+            self.samples = []
+        # Blame the callback seen in most samples (nothing sampled means it was very short)
+        names = Counter(name for name, _ in samples)
+        name = names.most_common(1)[0][0] if names else "(not sampled)"
+        stats = self.stalls.get(name)
+        if stats is None:
+            stats = self.stalls[name] = [0, 0.0, 0.0, Counter()]
+        stats[0] += 1
+        stats[1] += lag
+        stats[2] = max(stats[2], lag)
+        stats[3].update(stack for sample_name, stack in samples if sample_name == name)
+        metrics.inc("ui_stalls_total")
+        print(f"UI stalled for {lag * 1000:.0f} ms in {name}")
+
+    def _sample(self):
+        while self.running:
+            time.sleep(self.sample_interval)
+            overdue = time.perf_counter() - self.last_beat - self.heartbeat
+            if overdue < self.threshold:
+                continue
+            frame = sys._current_frames().get(self.main_thread)
+            if frame is None:
+                continue
+            try:
+                name = self.active[-1]
+            except IndexError:
+                name = "(outside callbacks)"
+            stack = self._stack(frame)
+            with self.lock:
+                self.samples.append((name, stack))
+
+    def _stack(self, frame):
+        """The innermost app frames of a stack as 'file:line in function' strings, outermost first"""
+        lines = []
+        for entry in reversed(traceback.extract_stack(frame)):
+            if any(skip in entry.filename for skip in _SKIP_FILES):
+                continue
+            lines.append(f"{entry.filename.rsplit('/', 1)[-1]}:{entry.lineno} in {entry.name}")
+            if len(lines) == self.stack_depth:
+                break
+        return tuple(reversed(lines))
+
+    def report(self, limit=10):
+        """Worst stalls and slowest callbacks, ranked by total time"""
+        stalls = sorted(self.stalls.items(), key=lambda item: item[1][1], reverse=True)[:limit]
+        callbacks = sorted(self.callbacks.items(), key=lambda item: item[1][2], reverse=True)[:limit]
+        return {
+            "stalls": [{"callback": name, "count": count, "total": total, "max": worst,
+                        "stacks": [{"samples": samples, "stack": list(stack)}
+                                   for stack, samples in stacks.most_common(3)]}
+                       for name, (count, total, worst, stacks) in stalls],
+            "slowest_callbacks": [{"callback": name, "calls": calls, "total": total, "max": worst,
+                                   "mean": total / calls}
+                                  for name, (calls, total, worst) in callbacks],
+        }
+
+
+def format_report(report):
+    """Watchdog report as lines of text"""
+    lines = ["UI stalls (ranked by total time blocked):"]
+    if not report["stalls"]:
+        lines.append("  none")
+    for rank, stall in enumerate(report["stalls"], 1):
+        lines.append(f"{rank:>3}. {stall['callback']}: {stall['count']} stalls, "
+                     f"{stall['total']:.2f}s total, worst {stall['max'] * 1000:.0f} ms")
+        for sampled in stall["stacks"]:
+            lines.append(f"       {sampled['samples']} samples:")
+            lines.extend(f"         {line}" for line in sampled["stack"])
+    lines.append("Slowest callbacks:")
+    for callback in report["slowest_callbacks"]:
+        lines.append(f"     {callback['callback']:<60} {callback['calls']:>6} calls   "
+                     f"mean {callback['mean'] * 1000:>8.1f} ms   max {callback['max'] * 1000:>8.1f} ms")
+    return "\n".join(lines)
+
+
+def describe_callback(func):
+    """A readable name for a Tk callback, looking through the wrappers after() adds"""
+    # after() registers a local callit() closure around the real function
+    code = getattr(func, "__code__", None)
+    if code is not None and code.co_name == "callit" and func.__closure__:
+        cells = dict(zip(code.co_freevars, func.__closure__))
+        if "func" in cells:
+            func = cells["func"].cell_contents
+
+    name = getattr(func, "__qualname__", None) or repr(func)
+    code = getattr(func, "__code__", None)
+    if "<lambda>" in name and code is not None:
+        name = f"{name} ({code.co_filename.rsplit('/', 1)[-1]}:{code.co_firstlineno})"
+    return name
@@ -0,0 +1,157 @@
+from collections import namedtuple
+import numpy as np
+import metrics
+import signals
+
+# Output of Strategy.evaluate. Every array has the same shape as bars['Close'].
+#   codes    - BUY_CODE, SELL_CODE or HOLD_CODE per bar
+#   strength - how strong the signal is (0 when there is nothing to say)
+#   trend    - +1 bullish, -1 bearish, 0 neutral (used for display)
+StrategySignals = namedtuple("StrategySignals", ["codes", "strength", "trend"])
+
+
+def compute_indicator(name, closes):
+    """Compute a named indicator (MA<n> or RSI<n>) over the last axis of closes"""
+    if name.startswith("MA") and name[2:].isdigit():
+        return signals.moving_average(closes, int(name[2:]))
+    if name.startswith("RSI") and name[3:].isdigit():
+        return signals.rsi(closes, int(name[3:]))
+    raise ValueError(f"Unknown indicator: {name}")
+
+
+class Strategy:
+    """Base class for trading strategies.
+
+    A strategy lists the indicators it needs in `indicators` and implements
+    `evaluate(bars)`, where bars maps 'Close' and each indicator name to arrays
+    shaped (time,) or (symbols, time). The same evaluate runs for the live
+    trader, the backtester and the scanner.
+    """
+
+    name = "strategy"
+    indicators = ()
+    reasons = {signals.BUY_CODE: "Buy signal", signals.SELL_CODE: "Sell signal"}
+
+    @property
+    def lookback(self):
+        """Number of bars needed to evaluate the last bar"""
+        return 2
+
+    def evaluate(self, bars):
+        """Return StrategySignals for every bar"""
+        raise NotImplementedError
+
+    def run(self, bars):
+        """Compute the declared indicators and evaluate the strategy on them"""
+        with metrics.span("indicator", strategy=self.name):
+            bars = dict(bars)
+            for name in self.indicators:
+                if name not in bars:
+                    bars[name] = compute_indicator(name, bars['Close'])
+            return self.evaluate(bars)
+
+    def latest(self, data):
+        """Evaluate the last bar of a DataFrame of bars and return a Signal"""
+        if data is None or len(data) < self.lookback:
+            return signals.Signal(signals.HOLD, 0.0, self.name, None, "neutral",
+                                  "Insufficient data for analysis")
+
+        closes = data['Close'].to_numpy(dtype=float)[-self.lookback:]
+        return self.latest_closes(closes, data.index[-1])
+
+    def latest_closes(self, closes, bar_time=None):
+        """Evaluate the last of at least lookback closing prices and return a Signal"""
+        if len(closes) < self.lookback:
+            return signals.Signal(signals.HOLD, 0.0, self.name, bar_time, "neutral",
+                                  "Insufficient data for analysis")
+
+        result = self.run({'Close': np.asarray(closes, dtype=float)[-self.lookback:]})
+        code = int(result.codes[-1])
+        strength = float(np.nan_to_num(result.strength[-1]))
+        trend = {1: "bullish", -1: "bearish"}.get(int(result.trend[-1]), "neutral")
+
+        if code == signals.BUY_CODE:
+            return signals.Signal(signals.BUY, strength, self.name, bar_time, trend, self.reasons[code])
+        if code == signals.SELL_CODE:
+            return signals.Signal(signals.SELL, strength, self.name, bar_time, trend, self.reasons[code])
+        return signals.Signal(signals.HOLD, strength, self.name, bar_time, trend, f"{trend.capitalize()} trend")
+
+
+class MACrossoverStrategy(Strategy):
+    """Buy when the fast moving average crosses above the slow one, sell when it crosses below"""
+
+    def __init__(self, short_window=20, long_window=50):
+        self.short_window = short_window
+        self.long_window = long_window
+        self.fast_name = f"MA{short_window}"
+        self.slow_name = f"MA{long_window}"
+        self.name = f"{self.fast_name}/{self.slow_name} crossover"
+        self.indicators = (self.fast_name, self.slow_name)
+        self.reasons = {
+            signals.BUY_CODE: f"{self.fast_name} crossed above {self.slow_name}",
+            signals.SELL_CODE: f"{self.fast_name} crossed below {self.slow_name}",
+        }
+
+    @property
+    def lookback(self):
+        return self.long_window + 1
+
+    def evaluate(self, bars):
+        closes = bars['Close']
+        fast = bars[self.fast_name]
+        slow = bars[self.slow_name]
+        codes = signals.crossover_codes(fast, slow)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            strength = np.abs(fast - slow) / slow
+
+        trend = np.zeros(codes.shape, dtype=np.int8)
+        trend[(closes > fast) & (fast > slow)] = 1
+        trend[(closes < fast) & (fast < slow)] = -1
+        return StrategySignals(codes, strength, trend)
+
+
+class RSIStrategy(Strategy):
+    """Buy when RSI climbs back above the oversold level, sell when it drops below overbought"""
+
+    def __init__(self, period=14, oversold=30, overbought=70):
+        self.period = period
+        self.oversold = oversold
+        self.overbought = overbought
+        self.rsi_name = f"RSI{period}"
+        self.name = f"{self.rsi_name} reversal"
+        self.indicators = (self.rsi_name,)
+        self.reasons = {
+            signals.BUY_CODE: f"{self.rsi_name} rose above {oversold}",
+            signals.SELL_CODE: f"{self.rsi_name} fell below {overbought}",
+        }
+
+    @property
+    def lookback(self):
+        return self.period + 2
+
+    def evaluate(self, bars):
+        rsi = bars[self.rsi_name]
+        codes = np.zeros(rsi.shape, dtype=np.int8)
+        codes[..., 1:][(rsi[..., :-1] <= self.oversold) & (rsi[..., 1:] > self.oversold)] = signals.BUY_CODE
+        codes[..., 1:][(rsi[..., :-1] >= self.overbought) & (rsi[..., 1:] < self.overbought)] = signals.SELL_CODE
+
+        strength = np.abs(rsi - 50) / 50
+        trend = np.zeros(codes.shape, dtype=np.int8)
+        trend[rsi > 50] = 1
+        trend[rsi < 50] = -1
+        return StrategySignals(codes, strength, trend)
+
+
+# Strategies that can be picked by name from the command line or a config file
+STRATEGIES = {
+    "ma_crossover": MACrossoverStrategy,
+    "rsi": RSIStrategy,
+}
+
+
+def get_strategy(name="ma_crossover", **params):
+    """Create a registered strategy by name"""
+    if name not in STRATEGIES:
+        raise ValueError(f"Unknown strategy: {name}")
+    return STRATEGIES[name](**params)
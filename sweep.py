@@ -0,0 +1,135 @@
+import argparse
+import itertools
+import os
+import time
+from multiprocessing import Pool, shared_memory
+import numpy as np
+import pandas as pd
+import backtest
+
+# Price data attached from shared memory in each worker process
+_shared = {}
+
+
+def build_grid(short_windows, long_windows, quantities, max_investments, daily_caps):
+    """Build every backtest configuration from lists of parameter values"""
+    grid = []
+    for short_window, long_window, quantity, max_investment, daily_cap in itertools.product(
+            short_windows, long_windows, quantities, max_investments, daily_caps):
+        # The fast average has to be shorter than the slow one
+        if short_window >= long_window:
+            continue
+        grid.append({
+            "short_window": short_window,
+            "long_window": long_window,
+            "auto_quantity": quantity,
+            "max_investment": max_investment,
+            "max_daily_buys": daily_cap,
+            "max_daily_sells": daily_cap,
+        })
+    return grid
+
+
+def _init_worker(shm_name, count):
+    """Attach a worker to the shared price block instead of receiving a pickled copy"""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    bars = np.ndarray((2, count), dtype=np.float64, buffer=shm.buf)
+    _shared["shm"] = shm  # Keep the block mapped for the life of the worker
+    _shared["closes"] = bars[0]
+    _shared["seconds"] = bars[1]
+
+
+def _run_config(args):
+    """Run one configuration against the shared prices and keep only the summary"""
+    params, initial_cash = args
+    result = backtest.run_backtest(_shared["closes"], _shared["seconds"],
+                                   initial_cash=initial_cash, **params)
+    row = dict(params)
+    row["total_return"] = result.total_return
+    row["max_drawdown"] = result.max_drawdown
+    row["trade_count"] = result.trade_count
+    row["final_equity"] = float(result.equity[-1]) if len(result.equity) else initial_cash
+    return row
+
+
+def run_sweep(closes, times, grid, initial_cash=100000.0, processes=None):
+    """Backtest every configuration in the grid on a process pool and rank the results"""
+    closes = np.asarray(closes, dtype=np.float64)
+    seconds = backtest.bar_seconds(times, len(closes))
+    processes = processes or os.cpu_count() or 1
+
+    # Copy the prices into shared memory once, workers map the same pages
+    shm = shared_memory.SharedMemory(create=True, size=max(closes.nbytes * 2, 1))
+    try:
+        bars = np.ndarray((2, len(closes)), dtype=np.float64, buffer=shm.buf)
+        bars[0] = closes
+        bars[1] = seconds
+
+        tasks = [(params, initial_cash) for params in grid]
+        chunksize = max(1, len(tasks) // (processes * 8))
+        with Pool(processes, initializer=_init_worker, initargs=(shm.name, len(closes))) as pool:
+            rows = list(pool.imap_unordered(_run_config, tasks, chunksize=chunksize))
+        del bars
+    finally:
+        shm.close()
+        shm.unlink()
+
+    results = pd.DataFrame(rows)
+    if results.empty:
+        return results
+
+    # Best return first, shallower drawdown breaks ties
+    results = results.sort_values(["total_return", "max_drawdown"], ascending=[False, False])
+    results.insert(0, "rank", range(1, len(results) + 1))
+    return results.reset_index(drop=True)
+
+
+def _int_list(text):
+    return [int(value) for value in text.split(",")]
+
+
+def _float_list(text):
+    return [float(value) for value in text.split(",")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep auto-trading parameters over historical bars")
+    parser.add_argument("symbol", nargs="?", help="Stock symbol to download bars for")
+    parser.add_argument("--csv", help="Read bars from a local CSV file instead")
+    parser.add_argument("--period", default="10y")
+    parser.add_argument("--interval", default="1d")
+    parser.add_argument("--short", type=_int_list, default=[5, 10, 20, 30])
+    parser.add_argument("--long", type=_int_list, default=[30, 50, 100, 200])
+    parser.add_argument("--quantity", type=_int_list, default=[1, 10, 50])
+    parser.add_argument("--max-investment", type=_float_list, default=[5000.0, 10000.0, 50000.0])
+    parser.add_argument("--daily-cap", type=_int_list, default=[1, 5, 10])
+    parser.add_argument("--cash", type=float, default=100000.0)
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--top", type=int, default=20, help="How many ranked rows to print")
+    parser.add_argument("--output", help="Save the full ranked table to this CSV file")
+    args = parser.parse_args()
+
+    if args.csv:
+        data = backtest.load_csv(args.csv)
+    elif args.symbol:
+        import market_data
+        data = market_data.get_history(args.symbol.upper(), period=args.period, interval=args.interval)
+    else:
+        parser.error("Give a symbol or --csv")
+
+    grid = build_grid(args.short, args.long, args.quantity, args.max_investment, args.daily_cap)
+
+    start = time.perf_counter()
+    results = run_sweep(data['Close'].to_numpy(), data.index, grid, args.cash, args.processes)
+    elapsed = time.perf_counter() - start
+
+    print(f"Ran {len(grid)} configurations on {len(data)} bars in {elapsed:.2f}s")
+    print(results.head(args.top).to_string(index=False))
+
+    if args.output:
+        results.to_csv(args.output, index=False)
+        print(f"Saved results to {args.output}")
+
+
+if __name__ == "__main__":
+    main()